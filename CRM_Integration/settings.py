@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'file_synch.middleware.RequestMetricsMiddleware',
+    'file_synch.middleware.ReadReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,13 +78,70 @@ WSGI_APPLICATION = 'CRM_Integration.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# SQLite tuning for the web process and Celery workers writing concurrently.
+# WAL lets readers run while a sync writes; synchronous=NORMAL is durable in
+# WAL mode except for the last commits on power loss; mmap serves reads from
+# the page cache. SQLITE_BUSY_TIMEOUT is how long (seconds) a writer waits for
+# the lock before raising "database is locked".
+SQLITE_JOURNAL_MODE = config('SQLITE_JOURNAL_MODE', default='WAL')
+SQLITE_SYNCHRONOUS = config('SQLITE_SYNCHRONOUS', default='NORMAL')
+SQLITE_MMAP_SIZE = config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int)
+SQLITE_BUSY_TIMEOUT = config('SQLITE_BUSY_TIMEOUT', default=20, cast=int)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Wait for a competing writer (parallel syncs, Celery) instead of
+            # failing, and take the write lock up front so two transactions
+            # never deadlock upgrading from a read lock
+            'timeout': SQLITE_BUSY_TIMEOUT,
+            'transaction_mode': 'IMMEDIATE',
+            # Run on every new connection
+            'init_command': (
+                f'PRAGMA journal_mode={SQLITE_JOURNAL_MODE};'
+                f'PRAGMA synchronous={SQLITE_SYNCHRONOUS};'
+                f'PRAGMA mmap_size={SQLITE_MMAP_SIZE};'
+                f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT * 1000};'
+            ),
+        },
     }
 }
 
+# Optional extra databases, routed by file_synch.routers.DatabaseRouter.
+# LOG_DATABASE_NAME moves sync logs into their own SQLite file so log inserts
+# never wait on the sync engine's write lock. READ_REPLICA_NAME serves
+# read-only API requests from a replica, or from a snapshot of the main
+# database kept current with `manage.py refresh_read_replica`.
+LOG_DATABASE_NAME = config('LOG_DATABASE_NAME', default='')
+READ_REPLICA_NAME = config('READ_REPLICA_NAME', default='')
+
+if LOG_DATABASE_NAME:
+    DATABASES['logs'] = {**DATABASES['default'], 'NAME': LOG_DATABASE_NAME}
+
+if READ_REPLICA_NAME:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': READ_REPLICA_NAME,
+        'OPTIONS': {
+            'timeout': SQLITE_BUSY_TIMEOUT,
+            'init_command': (
+                f'PRAGMA mmap_size={SQLITE_MMAP_SIZE};'
+                'PRAGMA query_only=1;'
+            ),
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['file_synch.routers.DatabaseRouter']
+# GET/HEAD requests under these paths read from the replica, when configured,
+# except under the excluded ones. The available files view decides whether to
+# refresh the CRM snapshot from its timestamp, so a lagging replica would
+# trigger a refresh against the primary on every request.
+READ_REPLICA_PATHS = ['/api/']
+READ_REPLICA_EXCLUDED_PATHS = ['/api/available-files/']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -184,3 +243,131 @@ CELERY_ACCEPT_CONTENT = ['json']
 CRM_API_KEY = config('CRM_API_KEY')
 HUBSPOT_API_KEY = config('HUBSPOT_API_KEY')
 ZOHO_API_KEY=config('ZOHO_API_KEY')
+# Key for each provider's default account, and for any CRMAccount saved
+# without one of its own
+CRM_PROVIDER_API_KEYS = {
+    'hubspot': HUBSPOT_API_KEY,
+    'zoho': ZOHO_API_KEY,
+}
+
+# Full syncs save a checkpoint every SYNC_BATCH_SIZE deals. A non-zero
+# SYNC_TIME_BUDGET (seconds) makes a task stop at the next checkpoint once the
+# budget is spent and re-enqueue itself to continue from there.
+SYNC_BATCH_SIZE = config('SYNC_BATCH_SIZE', default=50, cast=int)
+SYNC_TIME_BUDGET = config('SYNC_TIME_BUDGET', default=0, cast=int)
+# A completed full sync deletes the deals and files the CRM stopped listing,
+# unless that would remove more than this fraction of the provider's deals or
+# files, which more likely means a broken CRM response than a mass deletion.
+SYNC_SWEEP_MAX_FRACTION = config('SYNC_SWEEP_MAX_FRACTION', default=0.5, cast=float)
+# File listings are fetched from the CRM by SYNC_FETCH_WORKERS threads while
+# the sync writes earlier deals. At most SYNC_FETCH_QUEUE_SIZE listings wait
+# to be written, so a slow database pauses the fetching rather than growing
+# memory. 0 workers fetches each listing when its deal is written. For a CRM
+# that lists files for many deals per call (FILES_BATCH_SIZE), each queued
+# listing is one such batch.
+SYNC_FETCH_WORKERS = config('SYNC_FETCH_WORKERS', default=4, cast=int)
+SYNC_FETCH_QUEUE_SIZE = config('SYNC_FETCH_QUEUE_SIZE', default=16, cast=int)
+
+# CRM change notifications at /api/webhooks/hubspot/ and /api/webhooks/zoho/.
+# HubSpot requests are checked against the app's client secret (signature v3),
+# Zoho ones against the token the notification channel was enabled with; with
+# no secret set, that provider's webhook is rejected. A deal's events are
+# collected for WEBHOOK_COALESCE_SECONDS after its first one, then synced once.
+# A deal whose targeted sync fails is retried after another window, and given
+# up on, with an error logged, after WEBHOOK_MAX_ATTEMPTS failures.
+HUBSPOT_WEBHOOK_SECRET = config('HUBSPOT_WEBHOOK_SECRET', default='')
+ZOHO_WEBHOOK_TOKEN = config('ZOHO_WEBHOOK_TOKEN', default='')
+WEBHOOK_COALESCE_SECONDS = config('WEBHOOK_COALESCE_SECONDS', default=30, cast=int)
+WEBHOOK_MAX_ATTEMPTS = config('WEBHOOK_MAX_ATTEMPTS', default=5, cast=int)
+
+# Serve /api/stats/ from the incrementally maintained file_stats table instead
+# of aggregating file_metadata on every request.
+STATS_FROM_TABLE = config('STATS_FROM_TABLE', default=False, cast=bool)
+
+# Response cache for the read endpoints: '' (off), 'lru' (per-process) or
+# 'django' (the RESPONSE_CACHE_ALIAS entry in CACHES, e.g. Redis). Entries are
+# keyed on each provider's data generation, so no TTL is needed.
+RESPONSE_CACHE_BACKEND = config('RESPONSE_CACHE_BACKEND', default='')
+RESPONSE_CACHE_MAX_ENTRIES = config('RESPONSE_CACHE_MAX_ENTRIES', default=512, cast=int)
+RESPONSE_CACHE_ALIAS = config('RESPONSE_CACHE_ALIAS', default='default')
+
+# AvailableFilesView serves a per-provider snapshot of the CRM's files. Older
+# snapshots are refreshed in the background, and by Celery beat.
+AVAILABLE_FILES_TTL = config('AVAILABLE_FILES_TTL', default=300, cast=int)
+
+# Concurrent CRM requests per account made by the async snapshot refresh
+CRM_MAX_CONCURRENCY = config('CRM_MAX_CONCURRENCY', default=8, cast=int)
+
+# Cache shared by every web and Celery process. It holds the CRM circuit
+# breakers, call quotas and webhook locks, and the 'django' response cache, so
+# all processes must use the same server: set CACHE_URL to a Redis database,
+# e.g. redis://localhost:6379/2. Without it each process gets its own
+# in-memory cache, and the file_synch.W001 system check warns about it.
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# Per-provider circuit breaker around CRM API calls, shared by every worker
+# through the cache. CRM_CIRCUIT_FAILURES transient errors or calls slower than
+# CRM_CIRCUIT_SLOW_CALL_SECONDS in a row open it: calls then fail at once and
+# syncs reschedule themselves. The cooldown starts at CRM_CIRCUIT_COOLDOWN
+# seconds and doubles each time a probe call fails, up to CRM_CIRCUIT_MAX_COOLDOWN.
+CRM_CIRCUIT_FAILURES = config('CRM_CIRCUIT_FAILURES', default=5, cast=int)
+CRM_CIRCUIT_SLOW_CALL_SECONDS = config('CRM_CIRCUIT_SLOW_CALL_SECONDS', default=30, cast=float)
+CRM_CIRCUIT_COOLDOWN = config('CRM_CIRCUIT_COOLDOWN', default=60, cast=int)
+CRM_CIRCUIT_MAX_COOLDOWN = config('CRM_CIRCUIT_MAX_COOLDOWN', default=3600, cast=int)
+# Transient CRM errors are retried up to CRM_RETRY_ATTEMPTS times, with full
+# jitter exponential backoff from CRM_RETRY_BASE_DELAY seconds, or after the
+# CRM's Retry-After. Longer hints than CRM_RETRY_MAX_DELAY open the circuit.
+CRM_RETRY_ATTEMPTS = config('CRM_RETRY_ATTEMPTS', default=3, cast=int)
+CRM_RETRY_BASE_DELAY = config('CRM_RETRY_BASE_DELAY', default=0.5, cast=float)
+CRM_RETRY_MAX_DELAY = config('CRM_RETRY_MAX_DELAY', default=30, cast=float)
+
+# compact_change_log keeps the latest /api/changes/ entry per deal and file,
+# and drops delete entries after CHANGE_LOG_TOMBSTONE_DAYS. Consumers further
+# behind than that get 410 and must read the feed again from since=0.
+CHANGE_LOG_TOMBSTONE_DAYS = config('CHANGE_LOG_TOMBSTONE_DAYS', default=7, cast=int)
+
+CELERY_BEAT_SCHEDULE = {
+    'refresh-available-files': {
+        'task': 'file_synch.tasks.refresh_stale_snapshots_task',
+        'schedule': AVAILABLE_FILES_TTL,
+    },
+    'compact-change-log': {
+        'task': 'file_synch.tasks.compact_change_log_task',
+        'schedule': 24 * 60 * 60,
+    },
+}
+
+# Dotted path to a file_synch.search.BaseSearchBackend subclass for the files
+# and deals search. Empty picks SQLite FTS5 on SQLite, substring search elsewhere.
+SEARCH_BACKEND = config('SEARCH_BACKEND', default='')
+
+# Route the read endpoints to their async views (file_synch.async_views).
+# Only worth enabling when serving through ASGI (uvicorn, daphne, ...).
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
+
+# Queries each endpoint (by URL name) should need in the steady state. Requests
+# over budget are logged; with QUERY_BUDGET_ENFORCE they raise instead, which
+# fails the test that made them.
+QUERY_BUDGETS = {
+    'crm-providers': 2,
+    'deals': 3,
+    'files': 3,
+    'available-files': 3,
+    'sync-logs': 3,  # 2, plus provider names when logs have their own database
+    'stats': 2,
+    'changes': 4,
+}
+QUERY_BUDGET_ENFORCE = config('QUERY_BUDGET_ENFORCE', default=False, cast=bool)
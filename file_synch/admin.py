@@ -1,8 +1,14 @@
 from django.contrib import admin
-from .models import CRMProvider, Deal, FileMetadata, SyncLog
+from .models import AvailableFile, ChangeLogEntry, CRMAccount, CRMProvider, Deal, FileMetadata, FileStats, PendingDealSync, SyncCheckpoint, SyncLog
 
 # Register all models with default admin
 admin.site.register(CRMProvider)
+admin.site.register(CRMAccount)
 admin.site.register(Deal)
 admin.site.register(FileMetadata)
-admin.site.register(SyncLog)
\ No newline at end of file
+admin.site.register(SyncLog)
+admin.site.register(SyncCheckpoint)
+admin.site.register(FileStats)
+admin.site.register(AvailableFile)
+admin.site.register(ChangeLogEntry)
+admin.site.register(PendingDealSync)
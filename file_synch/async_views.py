@@ -0,0 +1,152 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+
+from file_synch.services.circuit_breaker import CRMUnavailable
+from file_synch.services.snapshot_service import AvailableFilesSnapshot
+from file_synch.services.stats_service import build_stats
+from .cache import acache_response
+from .filters import InvalidOrdering
+from .pagination import InvalidCursor, apaginate_queryset
+from .serializers import DEAL_PROJECTION, FILE_PROJECTION, SYNC_LOG_PROJECTION, InvalidFields, render
+from .models import CRMProvider
+from . import views
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Async variants of the read endpoints for ASGI deployments. They share query
+# building and serialization with file_synch.views and only differ in awaiting
+# the ORM, so a request waiting on the database or the CRM does not hold a thread.
+
+
+class AsyncCRMProvidersView(views.CRMProvidersView):
+    """Async API endpoint for CRM providers"""
+    
+    @acache_response('crm-providers')
+    async def get(self, request):
+        """List all CRM providers"""
+        data = [self.provider_data(p) async for p in CRMProvider.objects.all()]
+        
+        return JsonResponse({'providers': data})
+
+
+class AsyncDealsView(views.DealsView):
+    """Async API endpoint for deals"""
+    
+    @acache_response('deals')
+    async def get(self, request):
+        """List deals with optional filtering"""
+        per_page = int(request.GET.get('per_page', 20))
+        
+        try:
+            rows, fields = self.get_rows(request)
+            page_items, pagination = await apaginate_queryset(request, rows, per_page)
+        except (InvalidFields, InvalidCursor) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        return render(request, {
+            'deals': DEAL_PROJECTION.serialize(page_items, fields),
+            'pagination': pagination,
+        })
+
+
+class AsyncFilesView(views.FilesView):
+    """Async API endpoint for synced files"""
+    
+    @acache_response('files')
+    async def get(self, request):
+        per_page = int(request.GET.get('per_page', 20))
+        
+        try:
+            rows, fields = self.get_rows(request)
+            page_items, pagination = await apaginate_queryset(request, rows, per_page)
+        except (InvalidFields, InvalidOrdering, InvalidCursor) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        return render(request, {
+            'files': FILE_PROJECTION.serialize(page_items, fields),
+            'pagination': pagination,
+        })
+
+
+class AsyncAvailableFilesView(views.AvailableFilesView):
+    """Async API endpoint to list available files, refreshing the snapshot with concurrent CRM calls"""
+    
+    async def get(self, request):
+        """List available files from the provider's CRM snapshot"""
+        crm_provider_id = request.GET.get('crm_provider_id')
+        per_page = int(request.GET.get('per_page', 100))
+        
+        if not crm_provider_id:
+            return JsonResponse({'error': 'crm_provider_id is required'}, status=400)
+        
+        try:
+            crm_provider = await CRMProvider.objects.aget(id=crm_provider_id, is_active=True)
+        except CRMProvider.DoesNotExist:
+            return JsonResponse({'error': 'CRM provider not found or inactive'}, status=404)
+        
+        try:
+            snapshot = AvailableFilesSnapshot(crm_provider)
+        except ValueError:
+            return JsonResponse({'error': 'Unsupported CRM provider'}, status=400)
+        
+        try:
+            if snapshot.refreshed_at is None or request.GET.get('refresh', '').lower() in ('1', 'true'):
+                # Nothing to serve yet: build the snapshot inline
+                await snapshot.arefresh()
+            elif snapshot.is_stale():
+                await sync_to_async(snapshot.refresh_in_background)()
+        except PermissionError:
+            return JsonResponse({'error': 'CRM authentication failed'}, status=401)
+        except CRMUnavailable as e:
+            if snapshot.refreshed_at is None:
+                return views.crm_unavailable_response(e)
+        except Exception as e:
+            logger.error(f"Error fetching available files: {str(e)}")
+            return JsonResponse({'error': str(e)}, status=500)
+        
+        try:
+            page_items, pagination = await apaginate_queryset(
+                request, self.get_queryset(request, crm_provider), per_page)
+        except InvalidCursor as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        return JsonResponse(self.build_response(crm_provider, snapshot, page_items, pagination))
+
+
+class AsyncSyncLogsView(views.SyncLogsView):
+    """Async API endpoint for sync logs"""
+    
+    async def aprovider_names(self, page_items, fields):
+        if self.projection() is SYNC_LOG_PROJECTION or 'crm_provider' not in fields:
+            return
+        provider_ids = {row['crm_provider_id'] for row in page_items}
+        names = CRMProvider.objects.filter(pk__in=provider_ids).values_list('pk', 'name')
+        self.name_providers(page_items, {pk: name async for pk, name in names})
+    
+    async def get(self, request):
+        """List sync logs"""
+        per_page = int(request.GET.get('per_page', 50))
+        
+        try:
+            rows, fields = self.get_rows(request)
+            page_items, pagination = await apaginate_queryset(request, rows, per_page)
+        except (InvalidFields, InvalidCursor) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        await self.aprovider_names(page_items, fields)
+        
+        return render(request, {
+            'logs': self.projection().serialize(page_items, fields),
+            'pagination': pagination,
+        })
+
+
+class AsyncStatsView(views.StatsView):
+    """Async API endpoint for statistics"""
+    
+    @acache_response('stats')
+    async def get(self, request):
+        """Get sync statistics"""
+        rows = [row async for row in self.get_rows(request)]
+        return JsonResponse(build_stats(rows))
@@ -0,0 +1,235 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Optional, Tuple
+import hashlib
+import threading
+
+from .models import CRMProvider
+
+_local = threading.local()
+
+
+def bump_data_generation(crm_provider_id: int):
+    """Invalidate cached responses for a provider once the current transaction commits"""
+    transaction.on_commit(
+        lambda: CRMProvider.objects.filter(pk=crm_provider_id).update(
+            data_generation=F('data_generation') + 1
+        )
+    )
+
+
+@contextmanager
+def generation_batch(crm_provider_id: int):
+    """Suppress per-row generation bumps and bump once when the block exits"""
+    depth = getattr(_local, 'batch_depth', 0)
+    _local.batch_depth = depth + 1
+    try:
+        yield
+    finally:
+        _local.batch_depth = depth
+        bump_data_generation(crm_provider_id)
+
+
+def generation_bumps_suppressed() -> bool:
+    """True inside generation_batch, where writers bump once at the end"""
+    return getattr(_local, 'batch_depth', 0) > 0
+
+
+def data_generation(crm_provider_id: Optional[str] = None) -> Tuple:
+    """Generation of one provider, or of every provider when none is given"""
+    providers = CRMProvider.objects.order_by('pk')
+    if crm_provider_id and str(crm_provider_id).isdigit():
+        providers = providers.filter(pk=crm_provider_id)
+    return tuple(providers.values_list('pk', 'data_generation'))
+
+
+async def adata_generation(crm_provider_id: Optional[str] = None) -> Tuple:
+    """Async data_generation"""
+    providers = CRMProvider.objects.order_by('pk')
+    if crm_provider_id and str(crm_provider_id).isdigit():
+        providers = providers.filter(pk=crm_provider_id)
+    return tuple([row async for row in providers.values_list('pk', 'data_generation')])
+
+
+class LRUResponseCache:
+    """In-process least-recently-used cache of rendered responses"""
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+    
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    async def aget(self, key: str) -> Optional[Any]:
+        # In memory: nothing to wait on
+        return self.get(key)
+    
+    async def aset(self, key: str, value: Any):
+        self.set(key, value)
+
+
+class DjangoResponseCache:
+    """Shared cache of rendered responses backed by a Django cache alias"""
+    
+    def __init__(self, alias: str):
+        self.alias = alias
+    
+    def get(self, key: str) -> Optional[Any]:
+        return caches[self.alias].get(key)
+    
+    def set(self, key: str, value: Any):
+        # Stale generations are never read again; let the backend evict them
+        caches[self.alias].set(key, value, None)
+    
+    def clear(self):
+        caches[self.alias].clear()
+    
+    async def aget(self, key: str) -> Optional[Any]:
+        return await caches[self.alias].aget(key)
+    
+    async def aset(self, key: str, value: Any):
+        await caches[self.alias].aset(key, value, None)
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    """The configured response cache, or None when caching is off"""
+    global _response_cache
+    if _response_cache is None:
+        backend = settings.RESPONSE_CACHE_BACKEND
+        if backend == 'lru':
+            _response_cache = LRUResponseCache(settings.RESPONSE_CACHE_MAX_ENTRIES)
+        elif backend == 'django':
+            _response_cache = DjangoResponseCache(settings.RESPONSE_CACHE_ALIAS)
+    return _response_cache
+
+
+@receiver(setting_changed)
+def _reset_response_cache(setting, **kwargs):
+    global _response_cache
+    if setting.startswith('RESPONSE_CACHE'):
+        _response_cache = None
+
+
+def _response_cache_key(view_name: str, request, generation: Tuple) -> str:
+    params = sorted((key, sorted(values)) for key, values in request.GET.lists())
+    accept = request.META.get('HTTP_ACCEPT', '')
+    digest = hashlib.sha1(repr((view_name, params, accept, generation)).encode()).hexdigest()
+    return f'file_synch:response:{view_name}:{digest}'
+
+
+def response_cache_key(view_name: str, request) -> str:
+    """Key on the view, its normalized query parameters, the response format and the data generation"""
+    return _response_cache_key(view_name, request, data_generation(request.GET.get('crm_provider')))
+
+
+async def aresponse_cache_key(view_name: str, request) -> str:
+    """Async response_cache_key"""
+    return _response_cache_key(view_name, request, await adata_generation(request.GET.get('crm_provider')))
+
+
+def etag_for_key(key: str) -> str:
+    """Strong ETag: the same key always renders the same bytes"""
+    return '"%s"' % key.rsplit(':', 1)[-1]
+
+
+def _not_modified(request, etag: str) -> Optional[HttpResponse]:
+    if etag not in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        return None
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def _finish(response, etag: str):
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def cache_response(view_name: str):
+    """Answer conditional GETs and serve from the response cache while the data is unchanged"""
+    def decorator(get):
+        @wraps(get)
+        def wrapper(view, request, *args, **kwargs):
+            key = response_cache_key(view_name, request)
+            etag = etag_for_key(key)
+            
+            # Answer revalidations before touching the main query
+            not_modified = _not_modified(request, etag)
+            if not_modified is not None:
+                return not_modified
+            
+            response_cache = get_response_cache()
+            cached = response_cache.get(key) if response_cache is not None else None
+            if cached is not None:
+                content, content_type = cached
+                return _finish(HttpResponse(content, content_type=content_type), etag)
+            
+            response = get(view, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            if response_cache is not None:
+                response_cache.set(key, (response.content, response['Content-Type']))
+            return _finish(response, etag)
+        return wrapper
+    return decorator
+
+
+def acache_response(view_name: str):
+    """cache_response for async handlers"""
+    def decorator(get):
+        @wraps(get)
+        async def wrapper(view, request, *args, **kwargs):
+            key = await aresponse_cache_key(view_name, request)
+            etag = etag_for_key(key)
+            
+            not_modified = _not_modified(request, etag)
+            if not_modified is not None:
+                return not_modified
+            
+            response_cache = get_response_cache()
+            cached = await response_cache.aget(key) if response_cache is not None else None
+            if cached is not None:
+                content, content_type = cached
+                return _finish(HttpResponse(content, content_type=content_type), etag)
+            
+            response = await get(view, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            if response_cache is not None:
+                await response_cache.aset(key, (response.content, response['Content-Type']))
+            return _finish(response, etag)
+        return wrapper
+    return decorator
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# Backends whose entries other processes can't see
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Warn when the circuit breakers, call quotas and webhook locks can't be shared between processes"""
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        "The default cache is local to each process, so web and Celery workers "
+        "don't share CRM circuit breakers, call quotas or webhook locks.",
+        hint="Set CACHE_URL to a Redis database, e.g. redis://localhost:6379/2.",
+        id='file_synch.W001',
+    )]
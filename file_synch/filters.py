@@ -0,0 +1,44 @@
+from .search import get_search_backend
+
+# Sorts FilesView accepts in ?order_by= (optionally prefixed with '-'). Each
+# has an index behind it in FileMetadata.Meta.indexes.
+FILE_ORDERING_FIELDS = ('created_at', 'file_name', 'file_size', 'sync_timestamp')
+
+
+class InvalidOrdering(ValueError):
+    """Raised when ?order_by= names a sort that is not in FILE_ORDERING_FIELDS"""
+
+
+def file_ordering(order_by: str) -> str:
+    """Validate an ?order_by= value against FILE_ORDERING_FIELDS"""
+    if order_by.lstrip('-') not in FILE_ORDERING_FIELDS:
+        raise InvalidOrdering(
+            f"order_by must be one of: {', '.join(FILE_ORDERING_FIELDS)} (prefix with '-' for descending)"
+        )
+    return order_by
+
+
+def filter_files(queryset, params):
+    """Apply the FilesView query filters (deal_id, crm_provider, file_type, sync_status, search)"""
+    deal_id = params.get('deal_id')
+    crm_provider_id = params.get('crm_provider')
+    file_type = params.get('file_type')
+    sync_status = params.get('sync_status')
+    search = params.get('search', '')
+    
+    if deal_id:
+        queryset = queryset.filter(deal_id=deal_id)
+    
+    if crm_provider_id:
+        queryset = queryset.filter(crm_provider_id=crm_provider_id)
+    
+    if file_type:
+        queryset = queryset.filter(file_type=file_type)
+    
+    if sync_status:
+        queryset = queryset.filter(sync_status=sync_status)
+    
+    if search:
+        queryset = get_search_backend().search_files(queryset, search)
+    
+    return queryset
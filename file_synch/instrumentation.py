@@ -0,0 +1,125 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, Optional
+import threading
+import time
+
+# Metrics of the request being handled. A ContextVar rather than a thread
+# local so async views, and the worker threads sync_to_async hands their ORM
+# and CRM calls to, all report into the same object.
+_current = ContextVar('file_synch_request_metrics', default=None)
+_in_crm_call = ContextVar('file_synch_in_crm_call', default=False)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised, when QUERY_BUDGET_ENFORCE is on, by requests that run more queries than their budget"""
+
+
+class RequestMetrics:
+    """Query, CRM call and serialization counters for one request"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.crm_calls = 0
+        self.crm_time = 0.0
+        self.serialize_time = 0.0
+        self._lock = threading.Lock()
+    
+    def add(self, kind: str, elapsed: float):
+        with self._lock:
+            if kind == 'db':
+                self.db_queries += 1
+                self.db_time += elapsed
+            elif kind == 'crm':
+                self.crm_calls += 1
+                self.crm_time += elapsed
+            elif kind == 'serialize':
+                self.serialize_time += elapsed
+    
+    @property
+    def total_time(self) -> float:
+        return time.perf_counter() - self.started
+    
+    def server_timing(self) -> str:
+        """Server-Timing header value, durations in milliseconds"""
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_queries} queries"',
+            f'crm;dur={self.crm_time * 1000:.1f};desc="{self.crm_calls} calls"',
+            f'serialize;dur={self.serialize_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ])
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'db_queries': self.db_queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'crm_calls': self.crm_calls,
+            'crm_ms': round(self.crm_time * 1000, 2),
+            'serialize_ms': round(self.serialize_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+        }
+
+
+def current_metrics() -> Optional[RequestMetrics]:
+    return _current.get()
+
+
+@contextmanager
+def collect_metrics():
+    """Collect metrics for everything run inside the block"""
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(kind: str):
+    """Add the block's duration to the current request's metrics, if any"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(kind, time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    """connection.execute_wrapper hook timing every query"""
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+
+def install_query_recorder(connection):
+    """Attach record_query to a connection once"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def in_crm_call() -> bool:
+    """Whether this is a call made from inside another CRM API method"""
+    return _in_crm_call.get()
+
+
+def crm_call(method):
+    """Count and time a CRM API method; nested calls (super()) count once"""
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        if _in_crm_call.get():
+            return method(*args, **kwargs)
+        token = _in_crm_call.set(True)
+        try:
+            with timed('crm'):
+                return method(*args, **kwargs)
+        finally:
+            _in_crm_call.reset(token)
+    wrapper.__crm_call__ = True
+    return wrapper
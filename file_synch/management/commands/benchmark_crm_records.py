@@ -0,0 +1,81 @@
+from file_synch.services.crm_providers import CRMFile, CRMFileBatch
+from django.core.management.base import BaseCommand
+import gc
+import time
+import tracemalloc
+
+FILE_TYPES = ('pdf', 'docx', 'xlsx', 'png', 'txt')
+
+
+class DictCRMFile:
+    """CRMFile as it was before slots, with a per-instance __dict__"""
+    
+    def __init__(self, file_id, name, size, file_type, url, deal_id):
+        self.file_id = file_id
+        self.name = name
+        self.size = size
+        self.file_type = file_type
+        self.url = url
+        self.deal_id = deal_id
+
+
+def _listing(deal_id, count):
+    """Raw (file_id, name, size, file_type, url) rows, as parsed from an API response"""
+    for i in range(count):
+        file_id = f'{deal_id}_file_{i:06d}'
+        # Built per row, like strings decoded from JSON, so no two rows share them
+        yield (file_id, f'{file_id}.pdf', 1024 * (i % 900 + 1),
+               ''.join(FILE_TYPES[i % len(FILE_TYPES)]),
+               f'https://crm.example.com/files/{file_id}/download')
+
+
+class Command(BaseCommand):
+    help = 'Compare the memory held by a large file listing as objects and as a columnar CRMFileBatch'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=100000, help='Files in the listing')
+    
+    def handle(self, *args, **options):
+        count = options['files']
+        deal_id = 'bench_deal'
+        strategies = [
+            ('objects with __dict__', lambda: [DictCRMFile(*row, deal_id) for row in _listing(deal_id, count)]),
+            ('slotted CRMFile', lambda: [CRMFile(*row, deal_id) for row in _listing(deal_id, count)]),
+            ('columnar CRMFileBatch', lambda: self._batch(deal_id, count)),
+        ]
+        
+        self.stdout.write(f'{count} files')
+        sizes = {}
+        for name, build in strategies:
+            held, elapsed = self._measure(build)
+            sizes[name] = held
+            self.stdout.write(
+                f'  {name:<24} {held / 2 ** 20:8.1f} MiB  {held / count:6.0f} B/file  {elapsed * 1000:7.1f} ms'
+            )
+        
+        baseline, slotted, columnar = sizes.values()
+        self.stdout.write(self.style.SUCCESS(
+            f'Slotted records hold {1 - slotted / baseline:.0%} less, the columnar batch {1 - columnar / baseline:.0%} less'
+        ))
+    
+    @staticmethod
+    def _batch(deal_id, count):
+        batch = CRMFileBatch(deal_id)
+        for row in _listing(deal_id, count):
+            batch.append(*row)
+        return batch
+    
+    @staticmethod
+    def _measure(build):
+        """Bytes still allocated by build()'s result, and how long it took"""
+        gc.collect()
+        tracemalloc.start()
+        try:
+            started = time.perf_counter()
+            result = build()
+            elapsed = time.perf_counter() - started
+            held, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        del result
+        return held, elapsed
@@ -0,0 +1,85 @@
+from file_synch.models import CRMAccount, CRMProvider, Deal, FileMetadata
+from file_synch.serializers import FILE_PROJECTION, dumps_json
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import JsonResponse
+import time
+import uuid
+
+
+class Command(BaseCommand):
+    help = 'Compare model-instance and projection serialization of a /api/files/ page'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Rows to seed (rolled back afterwards)')
+        parser.add_argument('--per-page', type=int, default=500, help='Rows serialized per request')
+        parser.add_argument('--repeat', type=int, default=20, help='Requests timed per strategy')
+    
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._seed(options['rows'])
+            queryset = FileMetadata.objects.order_by('-created_at')
+            per_page = options['per_page']
+            
+            strategies = [
+                ('model instances + JsonResponse', lambda: self._legacy_page(queryset, per_page)),
+                ('values() projection + fast JSON', lambda: self._projection_page(queryset, per_page)),
+            ]
+            self.stdout.write(f'{per_page} rows per request, {options["repeat"]} requests each')
+            timings = {}
+            for name, strategy in strategies:
+                strategy()  # warm up
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    strategy()
+                timings[name] = (time.perf_counter() - started) / options['repeat']
+                self.stdout.write(f'  {name:<34} {timings[name] * 1000:8.2f} ms/request')
+            
+            legacy, lean = timings.values()
+            self.stdout.write(self.style.SUCCESS(f'Projection path is {legacy / lean:.1f}x faster'))
+            transaction.set_rollback(True)
+    
+    def _seed(self, rows):
+        provider = CRMProvider.objects.create(name=f'bench-{uuid.uuid4().hex[:8]}', api_endpoint='https://bench.example.com')
+        crm_account = CRMAccount.default_for(provider.pk)
+        deals = Deal.objects.bulk_create([
+            Deal(crm_provider=provider, crm_account=crm_account,
+                 crm_deal_id=f'bench_deal_{i}', deal_name=f'Bench Deal {i}')
+            for i in range(max(rows // 10, 1))
+        ])
+        FileMetadata.objects.bulk_create([
+            FileMetadata(
+                deal=deals[i % len(deals)],
+                crm_provider=provider,
+                crm_file_id=f'bench_file_{i}',
+                file_name=f'bench_file_{i}.pdf',
+                file_size=1024 * (i % 500 + 1),
+                file_type='pdf',
+                file_url=f'https://bench.example.com/files/{i}',
+                sync_status='synced',
+            )
+            for i in range(rows)
+        ], batch_size=1000)
+    
+    def _legacy_page(self, queryset, per_page):
+        """The pre-projection FilesView serialization"""
+        data = [{
+            'id': str(file.id),
+            'deal_id': file.deal.id,
+            'deal_name': file.deal.deal_name,
+            'crm_provider': file.deal.crm_provider.name,
+            'crm_file_id': file.crm_file_id,
+            'file_name': file.file_name,
+            'file_size': file.file_size,
+            'file_size_mb': round(file.file_size / (1024 * 1024), 2),
+            'file_type': file.file_type,
+            'sync_status': file.sync_status,
+            'sync_timestamp': file.sync_timestamp.isoformat() if file.sync_timestamp else None,
+            'created_at': file.created_at.isoformat(),
+        } for file in queryset.select_related('deal__crm_provider')[:per_page]]
+        return JsonResponse({'files': data}).content
+    
+    def _projection_page(self, queryset, per_page):
+        fields = FILE_PROJECTION.select(None)
+        rows = FILE_PROJECTION.values(queryset, fields)[:per_page]
+        return dumps_json({'files': FILE_PROJECTION.serialize(rows, fields)})
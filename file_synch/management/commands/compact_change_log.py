@@ -0,0 +1,19 @@
+from file_synch.services.change_log_service import compact_change_log
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Drop change log entries superseded by a later change, and expired delete entries'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tombstone-days',
+            type=int,
+            help='Keep delete entries this many days (default: CHANGE_LOG_TOMBSTONE_DAYS)',
+        )
+    
+    def handle(self, *args, **options):
+        removed = compact_change_log(options['tombstone_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {removed["superseded"]} superseded and {removed["expired"]} expired change log entries'
+        ))
@@ -0,0 +1,101 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.utils import timezone
+from file_synch.filters import FILE_ORDERING_FIELDS
+from file_synch.models import CRMProvider
+from file_synch.pagination import CursorPaginator, encode_cursor
+from file_synch.views import AvailableFilesView, ChangesView, DealsView, FilesView, StatsView, SyncLogsView
+import re
+import uuid
+
+PAGE_SIZE = 20
+
+# Plan lines that mean a whole table is read, or rows are sorted after reading
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'^SCAN (\w+)$'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+SORT_PATTERNS = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY'),
+    'postgresql': re.compile(r'^\s*(?:->\s*)?Sort\b'),
+}
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN each read endpoint's query shapes and report full table scans and unindexed sorts"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not only flagged ones')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error when any shape is flagged')
+    
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in FULL_SCAN_PATTERNS:
+            raise CommandError(f'No plan parser for {vendor}')
+        
+        flagged = 0
+        for name, queryset in self._shapes():
+            plan = queryset.explain()
+            issues = self._issues(vendor, plan)
+            if issues:
+                flagged += 1
+                self.stdout.write(self.style.ERROR(f'✗ {name}: {"; ".join(issues)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✓ {name}'))
+            if issues or options['verbose_plans']:
+                for line in plan.splitlines():
+                    self.stdout.write(f'      {line}')
+        
+        summary = f'{flagged} query shape(s) flagged'
+        if flagged and options['fail']:
+            raise CommandError(summary)
+        self.stdout.write(summary)
+    
+    def _issues(self, vendor, plan):
+        issues = []
+        for line in plan.splitlines():
+            # Drop SQLite's "id parent notused" columns and tree-drawing characters
+            step = re.sub(r'^[\d\s|`-]*', '', line).strip()
+            full_scan = FULL_SCAN_PATTERNS[vendor].search(step)
+            if full_scan:
+                issues.append(f'full scan of {full_scan.group(1)}')
+            if SORT_PATTERNS[vendor].search(step):
+                issues.append('sort without an index')
+        return issues
+    
+    def _shapes(self):
+        """(name, queryset) for each page query the read endpoints can run"""
+        factory = RequestFactory()
+        provider = CRMProvider.objects.first() or CRMProvider(pk=1)
+        cursor = encode_cursor(timezone.now(), uuid.uuid4())
+        
+        def page(view, query):
+            rows, fields = view.get_rows(factory.get('/', query))
+            return rows[:PAGE_SIZE]
+        
+        def cursor_page(view, query):
+            rows, fields = view.get_rows(factory.get('/', query))
+            return CursorPaginator(rows, PAGE_SIZE)._after(cursor)
+        
+        files, deals, logs = FilesView(), DealsView(), SyncLogsView()
+        yield 'files', page(files, {})
+        yield 'files ?cursor=', cursor_page(files, {})
+        for field in FILE_ORDERING_FIELDS:
+            for order_by in (field, f'-{field}'):
+                yield f'files ?order_by={order_by}', page(files, {'order_by': order_by})
+        for param, value in [('crm_provider', provider.pk), ('deal_id', 1),
+                             ('sync_status', 'synced'), ('file_type', 'pdf')]:
+            yield f'files ?{param}=', page(files, {param: value})
+            yield f'files ?{param}=&cursor=', cursor_page(files, {param: value})
+        yield 'deals', page(deals, {})
+        yield 'deals ?crm_provider=', page(deals, {'crm_provider': provider.pk})
+        yield 'sync-logs', page(logs, {})
+        yield 'sync-logs ?level=', page(logs, {'level': 'error'})
+        yield 'sync-logs ?crm_provider=', page(logs, {'crm_provider': provider.pk})
+        yield 'available-files', AvailableFilesView().get_queryset(factory.get('/'), provider)[:PAGE_SIZE]
+        yield 'stats ?crm_provider=', StatsView().get_rows(factory.get('/', {'crm_provider': provider.pk}))
+        changes = ChangesView()
+        yield 'changes ?since=', changes.get_entries(factory.get('/'), 1)[:PAGE_SIZE]
+        yield 'changes ?crm_provider=&since=', changes.get_entries(
+            factory.get('/', {'crm_provider': provider.pk}), 1)[:PAGE_SIZE]
@@ -0,0 +1,51 @@
+from file_synch.filters import filter_files
+from file_synch.services.export_service import EXPORT_FORMATS, export_files, export_queryset
+from django.core.management.base import BaseCommand
+import sys
+
+
+class Command(BaseCommand):
+    help = 'Export file metadata as NDJSON or CSV with constant memory'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=list(EXPORT_FORMATS),
+            default='ndjson',
+            help='Output format',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='File to write to (default: stdout)',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Gzip the output',
+        )
+        parser.add_argument('--deal-id', type=str, help='Only files of this deal (database id)')
+        parser.add_argument('--crm-provider', type=str, help='Only files of this CRM provider (database id)')
+        parser.add_argument('--file-type', type=str, help='Only files of this type')
+        parser.add_argument('--sync-status', type=str, help='Only files with this sync status')
+        parser.add_argument('--search', type=str, default='', help='Only files whose name matches')
+    
+    def handle(self, *args, **options):
+        queryset = filter_files(export_queryset(), {
+            'deal_id': options['deal_id'],
+            'crm_provider': options['crm_provider'],
+            'file_type': options['file_type'],
+            'sync_status': options['sync_status'],
+            'search': options['search'],
+        })
+        chunks = export_files(queryset, options['format'], options['gzip'])
+        
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f'Exported files to {options["output"]}'))
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+import statistics
+import time
+
+
+class Command(BaseCommand):
+    help = 'Fire concurrent GET requests at a running server and report throughput and latency'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('url', nargs='+', help='URL(s) to request, cycled through in order')
+        parser.add_argument('--requests', type=int, default=500, help='Total requests to send')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+    
+    def handle(self, *args, **options):
+        urls = options['url']
+        total = options['requests']
+        concurrency = options['concurrency']
+        if total < 1 or concurrency < 1:
+            raise CommandError('--requests and --concurrency must be at least 1')
+        
+        self.stdout.write(f'{total} requests, {concurrency} concurrent, against {", ".join(urls)}')
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(
+                lambda i: self._fetch(urls[i % len(urls)], options['timeout']),
+                range(total),
+            ))
+        elapsed = time.perf_counter() - started
+        
+        latencies = sorted(latency for ok, latency in results if ok)
+        errors = total - len(latencies)
+        self.stdout.write(f'  Throughput: {total / elapsed:8.1f} req/s ({elapsed:.2f} s total)')
+        if latencies:
+            self.stdout.write(f'  Latency p50: {self._percentile(latencies, 50) * 1000:8.1f} ms')
+            self.stdout.write(f'  Latency p95: {self._percentile(latencies, 95) * 1000:8.1f} ms')
+            self.stdout.write(f'  Latency p99: {self._percentile(latencies, 99) * 1000:8.1f} ms')
+            self.stdout.write(f'  Latency mean: {statistics.mean(latencies) * 1000:7.1f} ms')
+        if errors:
+            self.stdout.write(self.style.ERROR(f'  Failed requests: {errors}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('  All requests succeeded'))
+    
+    def _fetch(self, url, timeout):
+        """(succeeded, seconds) for one GET"""
+        started = time.perf_counter()
+        try:
+            with urlopen(Request(url, headers={'Accept': 'application/json'}), timeout=timeout) as response:
+                response.read()
+                ok = response.status == 200
+        except (HTTPError, URLError, OSError):
+            ok = False
+        return ok, time.perf_counter() - started
+    
+    @staticmethod
+    def _percentile(values, percent):
+        index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+        return values[index]
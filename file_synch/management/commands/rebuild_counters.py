@@ -0,0 +1,30 @@
+from file_synch.models import CRMProvider
+from file_synch.services.stats_service import rebuild_counters
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized deal and provider counters from the data'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--provider',
+            type=str,
+            help='Only rebuild counters for this CRM provider name',
+        )
+    
+    def handle(self, *args, **options):
+        provider = None
+        if options['provider']:
+            try:
+                provider = CRMProvider.objects.get(name__iexact=options['provider'])
+            except CRMProvider.DoesNotExist:
+                self.stdout.write(
+                    self.style.ERROR(f'Provider "{options["provider"]}" not found')
+                )
+                return
+        
+        updated = rebuild_counters(provider)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt counters for {updated["deals"]} deal(s) and {updated["providers"]} provider(s)'
+        ))
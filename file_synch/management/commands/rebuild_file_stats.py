@@ -0,0 +1,28 @@
+from file_synch.models import CRMProvider
+from file_synch.services.stats_service import rebuild_file_stats
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Recompute the file_stats table behind /api/stats/ from file metadata'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--provider',
+            type=str,
+            help='Only rebuild stats for this CRM provider name',
+        )
+    
+    def handle(self, *args, **options):
+        provider = None
+        if options['provider']:
+            try:
+                provider = CRMProvider.objects.get(name__iexact=options['provider'])
+            except CRMProvider.DoesNotExist:
+                self.stdout.write(
+                    self.style.ERROR(f'Provider "{options["provider"]}" not found')
+                )
+                return
+        
+        buckets = rebuild_file_stats(provider)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt file stats: {buckets} bucket(s)'))
@@ -0,0 +1,11 @@
+from file_synch.search import get_search_backend
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for file and deal names (run after VACUUM)'
+    
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search index ({type(backend).__name__})'))
@@ -0,0 +1,44 @@
+from file_synch.routers import REPLICA_DB
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+import os
+import sqlite3
+import time
+
+
+class Command(BaseCommand):
+    help = 'Copy the main SQLite database to READ_REPLICA_NAME as a consistent snapshot'
+    
+    def handle(self, *args, **options):
+        if REPLICA_DB not in connections:
+            raise CommandError('No read replica configured, set READ_REPLICA_NAME')
+        source = connections[DEFAULT_DB_ALIAS]
+        if source.vendor != 'sqlite':
+            raise CommandError(f'Snapshots are only for SQLite; use {source.vendor} replication instead')
+        
+        started = time.perf_counter()
+        target = str(connections.settings[REPLICA_DB]['NAME'])
+        self.copy(source, target)
+        connections[REPLICA_DB].close()
+        self.stdout.write(self.style.SUCCESS(
+            f'Snapshot written to {target} in {time.perf_counter() - started:.2f}s'
+        ))
+    
+    @staticmethod
+    def copy(source, target):
+        """Back up `source` into a new file and swap it in for `target`.
+        
+        Open replica connections keep reading the old file until they reconnect.
+        """
+        partial = f'{target}.partial'
+        if os.path.exists(partial):
+            os.remove(partial)
+        source.ensure_connection()
+        snapshot = sqlite3.connect(partial)
+        try:
+            source.connection.backup(snapshot)
+            # Rollback journal, so no -wal file outlives the swap
+            snapshot.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            snapshot.close()
+        os.replace(partial, target)
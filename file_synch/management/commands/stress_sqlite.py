@@ -0,0 +1,198 @@
+from file_synch.management.commands.sync_crm_files import _init_worker
+from file_synch.models import CRMProvider
+from file_synch.services.crm_providers import BaseCRMService, CRMDeal, CRMFile, CRMFileBatch
+from file_synch.services.sync_service import FileSyncService
+from file_synch.views import DealsView, FilesView, StatsView
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import RequestFactory
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import time
+
+PROVIDER_PREFIX = 'stress-writer-'
+
+
+class SyntheticCRMService(BaseCRMService):
+    """In-memory CRM whose file sizes change every round, so each sync writes"""
+    
+    def __init__(self, name, num_deals, files_per_deal):
+        super().__init__('stress', 'https://stress.example.com')
+        self.name = name
+        self.num_deals = num_deals
+        self.files_per_deal = files_per_deal
+        self.round = 0
+    
+    def authenticate(self):
+        return True
+    
+    def get_deals(self):
+        return [CRMDeal(f'{self.name}_deal_{i}', f'{self.name} deal {i}', 1000, 'proposal')
+                for i in range(self.num_deals)]
+    
+    def get_files_for_deal(self, deal_id):
+        return [
+            CRMFile(f'{deal_id}_file_{i}', f'{deal_id}_file_{i}.pdf', 1024 * (i + 1) + self.round % 2,
+                    'pdf', f'https://stress.example.com/files/{deal_id}/{i}', deal_id)
+            for i in range(self.files_per_deal)
+        ]
+    
+    def get_file_batch_for_deal(self, deal_id):
+        batch = CRMFileBatch(deal_id)
+        for i in range(self.files_per_deal):
+            batch.append(f'{deal_id}_file_{i}', f'{deal_id}_file_{i}.pdf', 1024 * (i + 1) + self.round % 2,
+                         'pdf', f'https://stress.example.com/files/{deal_id}/{i}')
+        return batch
+    
+    def download_file(self, file_url):
+        return b''
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, round(percent / 100 * (len(values) - 1)))] if values else 0.0
+
+
+def _run_writer(provider_id, seconds, num_deals, files_per_deal):
+    """Sync one provider repeatedly for `seconds`, timing how long each BEGIN waits for the write lock"""
+    lock_waits = []
+    
+    def time_begin(execute, sql, params, many, context):
+        if not sql.startswith('BEGIN'):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            lock_waits.append(time.perf_counter() - started)
+    
+    provider = CRMProvider.objects.get(pk=provider_id)
+    crm_service = SyntheticCRMService(provider.name, num_deals, files_per_deal)
+    syncs = files_written = locked = 0
+    deadline = time.monotonic() + seconds
+    try:
+        with connection.execute_wrapper(time_begin):
+            while time.monotonic() < deadline:
+                crm_service.round += 1
+                try:
+                    results = FileSyncService(provider, crm_service).sync_all_files(resume=False)
+                except Exception as e:
+                    locked += 'locked' in str(e)
+                    continue
+                syncs += 1
+                files_written += results['files_synced'] + results['files_updated']
+                locked += sum('locked' in error for error in results['errors'])
+    finally:
+        connections.close_all()
+    return {'syncs': syncs, 'files_written': files_written, 'locked': locked, 'lock_waits': lock_waits}
+
+
+class Command(BaseCommand):
+    help = 'Run concurrent sync writers and API readers against the database and report lock waits'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Sync writer processes')
+        parser.add_argument('--readers', type=int, default=8, help='API reader threads')
+        parser.add_argument('--seconds', type=float, default=10, help='How long to run')
+        parser.add_argument('--deals', type=int, default=20, help='Deals per writer')
+        parser.add_argument('--files-per-deal', type=int, default=10, help='Files per deal')
+        parser.add_argument('--keep', action='store_true', help='Keep the stress providers and their data')
+    
+    def handle(self, *args, **options):
+        if options['writers'] < 1 and options['readers'] < 1:
+            raise CommandError('Need at least one writer or reader')
+        
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        self.stdout.write(
+            f"{options['writers']} writer(s), {options['readers']} reader(s) for {options['seconds']:g}s "
+            f"(journal_mode={journal_mode})"
+        )
+        
+        CRMProvider.objects.filter(name__startswith=PROVIDER_PREFIX).delete()
+        providers = [
+            CRMProvider.objects.create(name=f'{PROVIDER_PREFIX}{i}', api_endpoint='https://stress.example.com')
+            for i in range(options['writers'])
+        ]
+        connections.close_all()
+        
+        try:
+            writer_results, reader_results = self._run(providers, options)
+        finally:
+            if not options['keep']:
+                CRMProvider.objects.filter(name__startswith=PROVIDER_PREFIX).delete()
+        
+        self._report_writers(writer_results, options['seconds'])
+        self._report_readers(reader_results, options['seconds'])
+    
+    def _run(self, providers, options):
+        seconds = options['seconds']
+        writer_pool = ProcessPoolExecutor(max_workers=len(providers), initializer=_init_worker) if providers else None
+        try:
+            writers = [
+                writer_pool.submit(_run_writer, provider.pk, seconds, options['deals'], options['files_per_deal'])
+                for provider in providers
+            ]
+            with ThreadPoolExecutor(max_workers=max(options['readers'], 1)) as reader_pool:
+                readers = [reader_pool.submit(self._run_reader, seconds) for _ in range(options['readers'])]
+                reader_results = [reader.result() for reader in readers]
+            writer_results = [writer.result() for writer in writers]
+        finally:
+            if writer_pool:
+                writer_pool.shutdown()
+        return writer_results, reader_results
+    
+    def _run_reader(self, seconds):
+        """Call the read views in a loop, as the web process would"""
+        factory = RequestFactory()
+        endpoints = [
+            (FilesView.as_view(), '/api/files/', {'per_page': 50}),
+            (FilesView.as_view(), '/api/files/', {'cursor': '', 'sync_status': 'synced'}),
+            (DealsView.as_view(), '/api/deals/', {}),
+            (StatsView.as_view(), '/api/stats/', {}),
+        ]
+        latencies, errors = [], 0
+        deadline = time.monotonic() + seconds
+        try:
+            while time.monotonic() < deadline:
+                view, path, params = endpoints[len(latencies) % len(endpoints)]
+                started = time.perf_counter()
+                try:
+                    response = view(factory.get(path, params))
+                    errors += response.status_code != 200
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connections.close_all()
+        return {'latencies': latencies, 'errors': errors}
+    
+    def _report_writers(self, results, seconds):
+        if not results:
+            return
+        lock_waits = [wait for result in results for wait in result['lock_waits']]
+        files_written = sum(result['files_written'] for result in results)
+        locked = sum(result['locked'] for result in results)
+        self.stdout.write('Writers:')
+        self.stdout.write(f"  Syncs completed:   {sum(result['syncs'] for result in results)}")
+        self.stdout.write(f'  Files written:     {files_written} ({files_written / seconds:.0f}/s)')
+        self.stdout.write(
+            f'  Lock waits:        {len(lock_waits)} transactions, total {sum(lock_waits):.2f}s, '
+            f'p95 {_percentile(lock_waits, 95) * 1000:.1f} ms, max {max(lock_waits, default=0) * 1000:.1f} ms'
+        )
+        style = self.style.ERROR if locked else self.style.SUCCESS
+        self.stdout.write(style(f'  "database is locked": {locked}'))
+    
+    def _report_readers(self, results, seconds):
+        if not results:
+            return
+        latencies = [latency for result in results for latency in result['latencies']]
+        errors = sum(result['errors'] for result in results)
+        self.stdout.write('Readers:')
+        self.stdout.write(f'  Requests:          {len(latencies)} ({len(latencies) / seconds:.0f}/s)')
+        self.stdout.write(
+            f'  Latency:           p50 {_percentile(latencies, 50) * 1000:.1f} ms, '
+            f'p95 {_percentile(latencies, 95) * 1000:.1f} ms, max {max(latencies, default=0) * 1000:.1f} ms'
+        )
+        style = self.style.ERROR if errors else self.style.SUCCESS
+        self.stdout.write(style(f'  Errors:            {errors}'))
@@ -1,7 +1,38 @@
 
-from file_synch.models import CRMProvider
+from file_synch.models import CRMAccount, CRMProvider
 from file_synch.services.sync_service import FileSyncService
 from django.core.management.base import BaseCommand
+from django.db import connections
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import time
+import django
+
+
+def _init_worker():
+    """Give each pool process its own DB connections instead of the parent's"""
+    django.setup()
+    connections.close_all()
+
+
+def _sync_account(account_id, file_ids=None, time_budget=None, resume=True, sweep_max_fraction=None,
+                  verify=False):
+    """Run one account's sync inside a pool process"""
+    started = time.monotonic()
+    account = CRMAccount.objects.select_related('crm_provider').get(id=account_id)
+    try:
+        sync_service = FileSyncService(account.crm_provider, crm_account=account)
+        if file_ids:
+            results = sync_service.sync_specific_files(file_ids)
+        else:
+            results = sync_service.sync_all_files(
+                time_budget=time_budget, resume=resume, sweep_max_fraction=sweep_max_fraction, verify=verify,
+            )
+        return str(account), results, None, time.monotonic() - started
+    except Exception as e:
+        return str(account), None, str(e), time.monotonic() - started
+    finally:
+        connections.close_all()
+
 
 
 class Command(BaseCommand):
@@ -18,11 +49,43 @@ class Command(BaseCommand):
             action='store_true',
             help='Sync from all active providers',
         )
+        parser.add_argument(
+            '--account',
+            type=str,
+            help='Only sync the provider\'s account with this name; by default every active account',
+        )
         parser.add_argument(
             '--files',
             nargs='+',
             help='Specific file IDs to sync',
         )
+        parser.add_argument(
+            '--time-budget',
+            type=int,
+            help='Stop a full sync at the next checkpoint after this many seconds',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore any saved checkpoint and start the full sync from the first deal',
+        )
+        parser.add_argument(
+            '--parallel',
+            type=int,
+            default=1,
+            metavar='N',
+            help='Sync up to N accounts at once, each in its own process',
+        )
+        parser.add_argument(
+            '--force-sweep',
+            action='store_true',
+            help='Delete deals and files missing from the CRM even past SYNC_SWEEP_MAX_FRACTION',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='List and diff every deal\'s files, including deals the CRM reports unchanged',
+        )
     
     def handle(self, *args, **options):
         if options['all']:
@@ -41,17 +104,30 @@ class Command(BaseCommand):
             )
             return
         
-        for provider in providers:
-            self.stdout.write(f'Syncing files from {provider.name}...')
+        accounts = [account for provider in providers for account in CRMAccount.active_for(provider)]
+        if options['account']:
+            accounts = [account for account in accounts if account.name == options['account']]
+            if not accounts:
+                self.stdout.write(
+                    self.style.ERROR(f'Account "{options["account"]}" not found or inactive')
+                )
+                return
+        
+        if options['parallel'] > 1:
+            self._sync_in_parallel(accounts, options)
+            return
+        
+        for account in accounts:
+            self.stdout.write(f'Syncing files from {account}...')
             
             try:
-                sync_service = FileSyncService(provider)
+                sync_service = FileSyncService(account.crm_provider, crm_account=account)
                 
                 if options['files']:
                     results = sync_service.sync_specific_files(options['files'])
                     self.stdout.write(
                         self.style.SUCCESS(
-                            f'Selective sync completed for {provider.name}: '
+                            f'Selective sync completed for {account}: '
                             f'{results["files_synced"]} synced, '
                             f'{results["files_updated"]} updated, '
                             f'{results["files_failed"]} failed'
@@ -59,22 +135,99 @@ class Command(BaseCommand):
                     )
                 else:
                     # Full sync
-                    results = sync_service.sync_all_files()
+                    results = sync_service.sync_all_files(
+                        time_budget=options['time_budget'],
+                        resume=not options['restart'],
+                        sweep_max_fraction=self._sweep_max_fraction(options),
+                        verify=options['verify'],
+                    )
+                    if results['resumed_from']:
+                        self.stdout.write(f'Resumed after deal {results["resumed_from"]}')
+                    status = 'completed' if results['completed'] else 'paused at checkpoint'
                     self.stdout.write(
                         self.style.SUCCESS(
-                            f'Full sync completed for {provider.name}: '
-                            f'{results["deals_processed"]} deals, '
+                            f'Full sync {status} for {account}: '
+                            f'{results["deals_processed"]} deals ({results["deals_skipped"]} unchanged), '
                             f'{results["files_synced"]} files synced, '
                             f'{results["files_updated"]} files updated, '
                             f'{results["files_failed"]} files failed'
                         )
                     )
+                    sweep = results.get('sweep')
+                    if sweep and sweep['skipped']:
+                        self.stdout.write(self.style.WARNING(f'Sweep skipped: {sweep["skipped"]}'))
+                    elif sweep:
+                        self.stdout.write(
+                            f'Removed {sweep["deals_removed"]} deals and {sweep["files_removed"]} files '
+                            f'no longer in {account}'
+                        )
                 
                 if results['errors']:
                     for error in results['errors']:
                         self.stdout.write(self.style.WARNING(f'Warning: {error}'))
-                        
+            
             except Exception as e:
                 self.stdout.write(
-                    self.style.ERROR(f'Sync failed for {provider.name}: {str(e)}')
+                    self.style.ERROR(f'Sync failed for {account}: {str(e)}')
                 )
+    
+    @staticmethod
+    def _sweep_max_fraction(options):
+        return 1.0 if options['force_sweep'] else None
+    
+    def _sync_in_parallel(self, accounts, options):
+        """Sync accounts in a process pool and print a consolidated summary"""
+        workers = min(options['parallel'], len(accounts)) or 1
+        self.stdout.write(f'Syncing {len(accounts)} account(s) with {workers} worker process(es)...')
+        
+        # Child processes must not reuse the parent's open connections
+        connections.close_all()
+        outcomes = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [
+                pool.submit(_sync_account, account.id, options['files'],
+                            options['time_budget'], not options['restart'],
+                            self._sweep_max_fraction(options), options['verify'])
+                for account in accounts
+            ]
+            for done, future in enumerate(as_completed(futures), start=1):
+                name, results, error, elapsed = future.result()
+                outcomes.append((name, results, error, elapsed))
+                if error:
+                    self.stdout.write(self.style.ERROR(
+                        f'[{done}/{len(futures)}] Sync failed for {name} after {elapsed:.1f}s: {error}'
+                    ))
+                else:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'[{done}/{len(futures)}] {name} finished in {elapsed:.1f}s'
+                    ))
+        
+        self._write_summary(sorted(outcomes))
+    
+    def _write_summary(self, outcomes):
+        """Print one row per account with its sync counters"""
+        header = ('Account', 'Status', 'Deals', 'Synced', 'Updated', 'Failed', 'Errors', 'Time (s)')
+        rows = []
+        for name, results, error, elapsed in outcomes:
+            if error:
+                rows.append((name, 'failed', '-', '-', '-', '-', '1', f'{elapsed:.1f}'))
+                continue
+            status = 'paused' if results.get('completed') is False else 'done'
+            rows.append((
+                name,
+                status,
+                str(results.get('deals_processed', '-')),
+                str(results['files_synced']),
+                str(results['files_updated']),
+                str(results['files_failed']),
+                str(len(results['errors'])),
+                f'{elapsed:.1f}',
+            ))
+        
+        widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+        line = '  '.join('{:<%d}' % width for width in widths)
+        self.stdout.write('')
+        self.stdout.write(line.format(*header).rstrip())
+        self.stdout.write('  '.join('-' * width for width in widths))
+        for row in rows:
+            self.stdout.write(line.format(*row).rstrip())
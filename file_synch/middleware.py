@@ -0,0 +1,104 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from .instrumentation import QueryBudgetExceeded, collect_metrics, install_query_recorder
+from .routers import REPLICA_DB, replica_reads
+
+from contextlib import nullcontext
+import json
+import logging
+
+logger = logging.getLogger('file_synch.requests')
+
+
+class RequestMetricsMiddleware:
+    """Counts queries, CRM calls and serialization time per request.
+    
+    Reports them in a Server-Timing header and one structured log line per
+    request, and checks the query count against QUERY_BUDGETS.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self._install()
+        with collect_metrics() as metrics:
+            response = self.get_response(request)
+        return self._report(request, response, metrics)
+    
+    async def __acall__(self, request):
+        with collect_metrics() as metrics:
+            response = await self.get_response(request)
+        return self._report(request, response, metrics)
+    
+    @staticmethod
+    def _install():
+        # New connections get the recorder from the connection_created signal;
+        # this covers ones opened before the app was ready
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+    
+    def _report(self, request, response, metrics):
+        response['Server-Timing'] = metrics.server_timing()
+        
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.url_name if match else None
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            **metrics.as_dict(),
+        }
+        logger.info(json.dumps(record), extra={'metrics': record})
+        
+        budget = settings.QUERY_BUDGETS.get(endpoint)
+        if budget is not None and metrics.db_queries > budget:
+            message = f'{endpoint} ran {metrics.db_queries} queries, budget is {budget}'
+            if settings.QUERY_BUDGET_ENFORCE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+class ReadReplicaMiddleware:
+    """Serves GET and HEAD requests under READ_REPLICA_PATHS from the read replica.
+    
+    Paths under READ_REPLICA_EXCLUDED_PATHS stay on the primary. Reads switch back to the primary for the rest of the request after its
+    first write. Does nothing unless a 'replica' database is configured.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self._reads(request):
+            return self.get_response(request)
+    
+    async def __acall__(self, request):
+        with self._reads(request):
+            return await self.get_response(request)
+    
+    @staticmethod
+    def _reads(request):
+        if (REPLICA_DB in connections and request.method in ('GET', 'HEAD')
+                and request.path.startswith(tuple(settings.READ_REPLICA_PATHS))
+                and not request.path.startswith(tuple(settings.READ_REPLICA_EXCLUDED_PATHS))):
+            return replica_reads()
+        return nullcontext()
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_deal_id', models.CharField(max_length=100)),
+                ('deals_completed', models.PositiveIntegerField(default=0)),
+                ('results', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('crm_provider', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sync_checkpoint', to='file_synch.crmprovider')),
+            ],
+            options={
+                'db_table': 'sync_checkpoints',
+            },
+        ),
+    ]
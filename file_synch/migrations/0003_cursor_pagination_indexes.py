@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0002_sync_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(fields=['created_at', 'id'], name='deals_created_0cfd05_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filemetadata',
+            index=models.Index(fields=['created_at', 'id'], name='file_metada_created_142886_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synclog',
+            index=models.Index(fields=['created_at', 'id'], name='sync_logs_created_7e7e48_idx'),
+        ),
+    ]
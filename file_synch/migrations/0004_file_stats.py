@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_file_stats(apps, schema_editor):
+    FileMetadata = apps.get_model('file_synch', 'FileMetadata')
+    FileStats = apps.get_model('file_synch', 'FileStats')
+    rows = FileMetadata.objects.values('deal__crm_provider_id', 'file_type', 'sync_status').annotate(
+        count=Count('id'),
+        size=Sum('file_size'),
+    ).order_by()
+    FileStats.objects.bulk_create([
+        FileStats(
+            crm_provider_id=row['deal__crm_provider_id'],
+            file_type=row['file_type'],
+            sync_status=row['sync_status'],
+            file_count=row['count'],
+            total_size=row['size'] or 0,
+        )
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0003_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_type', models.CharField(max_length=10)),
+                ('sync_status', models.CharField(max_length=10)),
+                ('file_count', models.BigIntegerField(default=0)),
+                ('total_size', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('crm_provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='file_stats', to='file_synch.crmprovider')),
+            ],
+            options={
+                'db_table': 'file_stats',
+                'unique_together': {('crm_provider', 'file_type', 'sync_status')},
+            },
+        ),
+        migrations.RunPython(populate_file_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0004_file_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crmprovider',
+            name='data_generation',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
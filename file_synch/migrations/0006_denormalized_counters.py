@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:34
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    CRMProvider = apps.get_model('file_synch', 'CRMProvider')
+    Deal = apps.get_model('file_synch', 'Deal')
+    FileMetadata = apps.get_model('file_synch', 'FileMetadata')
+    files = FileMetadata.objects.filter(deal=OuterRef('pk')).order_by().values('deal')
+    provider_deals = Deal.objects.filter(crm_provider=OuterRef('pk')).order_by().values('crm_provider')
+    Deal.objects.update(
+        files_count=Coalesce(Subquery(files.annotate(n=Count('id')).values('n')), Value(0)),
+        total_file_size=Coalesce(
+            Subquery(files.annotate(size=Sum('file_size')).values('size')),
+            Value(0),
+            output_field=IntegerField(),
+        ),
+    )
+    CRMProvider.objects.update(
+        deals_count=Coalesce(Subquery(provider_deals.annotate(n=Count('id')).values('n')), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0005_provider_data_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crmprovider',
+            name='deals_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='deal',
+            name='files_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='deal',
+            name='total_file_size',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
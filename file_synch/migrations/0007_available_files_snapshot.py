@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0006_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crmprovider',
+            name='available_files_refreshed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='AvailableFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('crm_deal_id', models.CharField(max_length=100)),
+                ('deal_name', models.CharField(max_length=255)),
+                ('crm_file_id', models.CharField(max_length=100)),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_size', models.BigIntegerField()),
+                ('file_type', models.CharField(max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('crm_provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='available_files', to='file_synch.crmprovider')),
+            ],
+            options={
+                'db_table': 'available_files',
+                'indexes': [models.Index(fields=['crm_provider', 'created_at', 'id'], name='available_f_crm_pro_fc360f_idx'), models.Index(fields=['crm_provider', 'file_type'], name='available_f_crm_pro_707d20_idx')],
+                'unique_together': {('crm_provider', 'crm_deal_id', 'crm_file_id')},
+            },
+        ),
+    ]
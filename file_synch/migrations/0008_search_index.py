@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:40
+
+from django.db import migrations
+
+from ._search_index import install_sqlite_fts, uninstall_sqlite_fts
+
+
+def install_search_index(apps, schema_editor):
+    install_sqlite_fts(schema_editor.connection)
+
+
+def uninstall_search_index(apps, schema_editor):
+    uninstall_sqlite_fts(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0007_available_files_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+from ._search_index import install_sqlite_fts
+
+
+def populate_file_provider(apps, schema_editor):
+    Deal = apps.get_model('file_synch', 'Deal')
+    FileMetadata = apps.get_model('file_synch', 'FileMetadata')
+    FileMetadata.objects.update(crm_provider_id=Subquery(
+        Deal.objects.filter(pk=OuterRef('deal_id')).values('crm_provider_id')[:1]
+    ))
+
+
+def reinstall_search_index(apps, schema_editor):
+    # Making crm_provider NOT NULL rebuilds file_metadata on SQLite, dropping the FTS triggers
+    install_sqlite_fts(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0008_search_index'),
+    ]
+
+    operations = [
+        # Run last when migrating backwards, after the table rebuilds below
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_index),
+        migrations.RemoveIndex(
+            model_name='filemetadata',
+            name='file_metada_file_ty_7c102c_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='filemetadata',
+            name='file_metada_sync_st_ee70ab_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='synclog',
+            name='sync_logs_level_91bf52_idx',
+        ),
+        migrations.AddField(
+            model_name='filemetadata',
+            name='crm_provider',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='files', to='file_synch.crmprovider'),
+        ),
+        migrations.RunPython(populate_file_provider, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='filemetadata',
+            name='crm_provider',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='files', to='file_synch.crmprovider'),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(fields=['crm_provider', 'created_at', 'id'], name='deals_crm_pro_cd776c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filemetadata',
+            index=models.Index(fields=['file_size'], name='file_metada_file_si_aa633d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filemetadata',
+            index=models.Index(fields=['crm_provider', 'created_at', 'id'], name='file_metada_crm_pro_f1ef02_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filemetadata',
+            index=models.Index(fields=['deal', 'created_at', 'id'], name='file_metada_deal_id_a3240d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filemetadata',
+            index=models.Index(fields=['sync_status', 'created_at', 'id'], name='file_metada_sync_st_2105c9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filemetadata',
+            index=models.Index(fields=['file_type', 'created_at', 'id'], name='file_metada_file_ty_884006_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synclog',
+            index=models.Index(fields=['level', 'created_at', 'id'], name='sync_logs_level_6dac90_idx'),
+        ),
+        migrations.RunPython(reinstall_search_index, reinstall_search_index),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0009_file_provider_and_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='synclog',
+            name='crm_provider',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='file_synch.crmprovider'),
+        ),
+        migrations.AlterField(
+            model_name='synclog',
+            name='file_metadata',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='file_synch.filemetadata'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:58
+
+from django.db import migrations, models
+
+from ._search_index import install_sqlite_fts
+
+
+def reinstall_search_index(apps, schema_editor):
+    # Adding a column with a default rebuilds deals and file_metadata on SQLite, dropping the FTS triggers
+    install_sqlite_fts(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0010_sync_log_detached_references'),
+    ]
+
+    operations = [
+        # Run last when migrating backwards, after the table rebuilds below
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_index),
+        migrations.AddField(
+            model_name='crmprovider',
+            name='sync_generation',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='deal',
+            name='seen_generation',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='filemetadata',
+            name='seen_generation',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(fields=['crm_provider', 'seen_generation'], name='deals_crm_pro_95c2b8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filemetadata',
+            index=models.Index(fields=['crm_provider', 'seen_generation'], name='file_metada_crm_pro_bf2c4c_idx'),
+        ),
+        migrations.RunPython(reinstall_search_index, reinstall_search_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0011_sync_generations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crmprovider',
+            name='change_log_horizon',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(choices=[('deal', 'Deal'), ('file', 'File')], max_length=10)),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=10)),
+                ('object_id', models.CharField(max_length=36)),
+                ('crm_id', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('crm_provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='file_synch.crmprovider')),
+            ],
+            options={
+                'db_table': 'change_log',
+                'indexes': [models.Index(fields=['crm_provider', 'id'], name='change_log_crm_pro_1b3f65_idx'), models.Index(fields=['entity', 'object_id', 'id'], name='change_log_entity_878fac_idx'), models.Index(fields=['action', 'created_at'], name='change_log_action_798388_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0012_change_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingDealSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('crm_deal_id', models.CharField(max_length=100)),
+                ('first_event_at', models.DateTimeField()),
+                ('last_event_at', models.DateTimeField()),
+                ('crm_provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_deal_syncs', to='file_synch.crmprovider')),
+            ],
+            options={
+                'db_table': 'pending_deal_syncs',
+                'indexes': [models.Index(fields=['crm_provider', 'first_event_at'], name='pending_dea_crm_pro_5e7d26_idx')],
+                'unique_together': {('crm_provider', 'crm_deal_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:16
+
+from django.db import migrations, models
+
+from ._search_index import install_sqlite_fts
+
+
+def reinstall_search_index(apps, schema_editor):
+    # Adding a column with a default rebuilds deals on SQLite, dropping its FTS triggers
+    install_sqlite_fts(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0013_pending_deal_syncs'),
+    ]
+
+    operations = [
+        # Run last when migrating backwards, after the table rebuilds below
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_index),
+        migrations.AddField(
+            model_name='deal',
+            name='files_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='deal',
+            name='files_marker',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(reinstall_search_index, reinstall_search_index),
+    ]
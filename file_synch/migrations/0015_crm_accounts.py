@@ -0,0 +1,104 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from ._search_index import install_sqlite_fts
+
+
+def reinstall_search_index(apps, schema_editor):
+    # Adding crm_account rebuilds deals on SQLite, dropping its FTS triggers
+    install_sqlite_fts(schema_editor.connection)
+
+
+def create_default_accounts(apps, schema_editor):
+    """Give each provider a default account owning its deals, checkpoint and sync generation"""
+    CRMProvider = apps.get_model('file_synch', 'CRMProvider')
+    CRMAccount = apps.get_model('file_synch', 'CRMAccount')
+    Deal = apps.get_model('file_synch', 'Deal')
+    SyncCheckpoint = apps.get_model('file_synch', 'SyncCheckpoint')
+    for crm_provider in CRMProvider.objects.all():
+        account = CRMAccount.objects.create(
+            crm_provider=crm_provider, name='default', sync_generation=crm_provider.sync_generation,
+        )
+        Deal.objects.filter(crm_provider=crm_provider).update(crm_account=account)
+        SyncCheckpoint.objects.filter(crm_provider=crm_provider).update(crm_account=account)
+
+
+def restore_provider_generations(apps, schema_editor):
+    CRMProvider = apps.get_model('file_synch', 'CRMProvider')
+    CRMAccount = apps.get_model('file_synch', 'CRMAccount')
+    for account in CRMAccount.objects.filter(name='default'):
+        CRMProvider.objects.filter(pk=account.crm_provider_id).update(sync_generation=account.sync_generation)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0014_deal_files_digest'),
+    ]
+
+    operations = [
+        # Run last when migrating backwards, after the table rebuilds below
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_index),
+        migrations.CreateModel(
+            name='CRMAccount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('api_key', models.CharField(blank=True, max_length=255)),
+                ('is_active', models.BooleanField(default=True)),
+                ('requests_per_minute', models.PositiveIntegerField(default=0)),
+                ('sync_generation', models.PositiveBigIntegerField(default=0, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('crm_provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accounts', to='file_synch.crmprovider')),
+            ],
+            options={
+                'db_table': 'crm_accounts',
+                'unique_together': {('crm_provider', 'name')},
+            },
+        ),
+        migrations.AddField(
+            model_name='deal',
+            name='crm_account',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='deals', to='file_synch.crmaccount'),
+        ),
+        migrations.AddField(
+            model_name='synccheckpoint',
+            name='crm_account',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sync_checkpoint', to='file_synch.crmaccount'),
+        ),
+        migrations.RunPython(create_default_accounts, restore_provider_generations),
+        migrations.RemoveField(
+            model_name='crmprovider',
+            name='sync_generation',
+        ),
+        migrations.AlterField(
+            model_name='deal',
+            name='crm_account',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='deals', to='file_synch.crmaccount'),
+        ),
+        migrations.AlterField(
+            model_name='synccheckpoint',
+            name='crm_account',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sync_checkpoint', to='file_synch.crmaccount'),
+        ),
+        migrations.AlterField(
+            model_name='synccheckpoint',
+            name='crm_provider',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_checkpoints', to='file_synch.crmprovider'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='deal',
+            unique_together={('crm_account', 'crm_deal_id')},
+        ),
+        migrations.RemoveIndex(
+            model_name='deal',
+            name='deals_crm_pro_95c2b8_idx',
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(fields=['crm_account', 'seen_generation'], name='deals_crm_acc_105346_idx'),
+        ),
+        migrations.RunPython(reinstall_search_index, reinstall_search_index),
+    ]
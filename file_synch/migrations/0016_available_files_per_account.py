@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def clear_snapshots(apps, schema_editor):
+    """Snapshot rows don't record their account; drop them and let the next request refresh"""
+    AvailableFile = apps.get_model('file_synch', 'AvailableFile')
+    CRMProvider = apps.get_model('file_synch', 'CRMProvider')
+    AvailableFile.objects.all().delete()
+    CRMProvider.objects.update(available_files_refreshed_at=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0015_crm_accounts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='availablefile',
+            name='crm_account',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='available_files', to='file_synch.crmaccount'),
+        ),
+        migrations.RunPython(clear_snapshots, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='availablefile',
+            name='crm_account',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='available_files', to='file_synch.crmaccount'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='availablefile',
+            unique_together={('crm_provider', 'crm_account', 'crm_deal_id', 'crm_file_id')},
+        ),
+    ]
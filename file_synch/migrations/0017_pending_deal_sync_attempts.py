@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_synch', '0016_available_files_per_account'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingdealsync',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# SQLite FTS5 tables and triggers as migration 0008 created them. Frozen here,
+# rather than imported from file_synch.search, so later changes to the live
+# search code don't change what these migrations do. Not a migration: the
+# loader skips modules whose names start with an underscore.
+
+INSTALL_SQL = [
+    'DROP TRIGGER IF EXISTS file_metadata_fts_ai',
+    'DROP TRIGGER IF EXISTS file_metadata_fts_ad',
+    'DROP TRIGGER IF EXISTS file_metadata_fts_au',
+    'DROP TABLE IF EXISTS file_metadata_fts',
+    "CREATE VIRTUAL TABLE file_metadata_fts USING fts5(file_name, content='file_metadata', "
+    "content_rowid='rowid', tokenize='unicode61')",
+    'CREATE TRIGGER file_metadata_fts_ai AFTER INSERT ON file_metadata BEGIN '
+    'INSERT INTO file_metadata_fts(rowid, file_name) VALUES (new.rowid, new.file_name); END',
+    'CREATE TRIGGER file_metadata_fts_ad AFTER DELETE ON file_metadata BEGIN '
+    "INSERT INTO file_metadata_fts(file_metadata_fts, rowid, file_name) VALUES ('delete', old.rowid, old.file_name); END",
+    'CREATE TRIGGER file_metadata_fts_au AFTER UPDATE OF file_name ON file_metadata BEGIN '
+    "INSERT INTO file_metadata_fts(file_metadata_fts, rowid, file_name) VALUES ('delete', old.rowid, old.file_name); "
+    'INSERT INTO file_metadata_fts(rowid, file_name) VALUES (new.rowid, new.file_name); END',
+    "INSERT INTO file_metadata_fts(file_metadata_fts) VALUES ('rebuild')",
+    'DROP TRIGGER IF EXISTS deals_fts_ai',
+    'DROP TRIGGER IF EXISTS deals_fts_ad',
+    'DROP TRIGGER IF EXISTS deals_fts_au',
+    'DROP TABLE IF EXISTS deals_fts',
+    "CREATE VIRTUAL TABLE deals_fts USING fts5(deal_name, crm_deal_id, content='deals', "
+    "content_rowid='id', tokenize='unicode61')",
+    'CREATE TRIGGER deals_fts_ai AFTER INSERT ON deals BEGIN '
+    'INSERT INTO deals_fts(rowid, deal_name, crm_deal_id) VALUES (new.id, new.deal_name, new.crm_deal_id); END',
+    'CREATE TRIGGER deals_fts_ad AFTER DELETE ON deals BEGIN '
+    "INSERT INTO deals_fts(deals_fts, rowid, deal_name, crm_deal_id) "
+    "VALUES ('delete', old.id, old.deal_name, old.crm_deal_id); END",
+    'CREATE TRIGGER deals_fts_au AFTER UPDATE OF deal_name, crm_deal_id ON deals BEGIN '
+    "INSERT INTO deals_fts(deals_fts, rowid, deal_name, crm_deal_id) "
+    "VALUES ('delete', old.id, old.deal_name, old.crm_deal_id); "
+    'INSERT INTO deals_fts(rowid, deal_name, crm_deal_id) VALUES (new.id, new.deal_name, new.crm_deal_id); END',
+    "INSERT INTO deals_fts(deals_fts) VALUES ('rebuild')",
+]
+
+UNINSTALL_SQL = [
+    'DROP TRIGGER IF EXISTS file_metadata_fts_ai',
+    'DROP TRIGGER IF EXISTS file_metadata_fts_ad',
+    'DROP TRIGGER IF EXISTS file_metadata_fts_au',
+    'DROP TABLE IF EXISTS file_metadata_fts',
+    'DROP TRIGGER IF EXISTS deals_fts_ai',
+    'DROP TRIGGER IF EXISTS deals_fts_ad',
+    'DROP TRIGGER IF EXISTS deals_fts_au',
+    'DROP TABLE IF EXISTS deals_fts',
+]
+
+
+def _execute(conn, statements):
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def install_sqlite_fts(conn):
+    """(Re)create the FTS5 tables and triggers and rebuild them; needed again after a table rebuild"""
+    _execute(conn, INSTALL_SQL)
+
+
+def uninstall_sqlite_fts(conn):
+    _execute(conn, UNINSTALL_SQL)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 import uuid
@@ -6,6 +7,16 @@ class CRMProvider(models.Model):
     name = models.CharField(max_length=100, unique=True)
     api_endpoint = models.URLField()
     is_active = models.BooleanField(default=True)
+    # Bumped after every committed change to this provider's data; read
+    # endpoints key their cached responses on it
+    data_generation = models.PositiveBigIntegerField(default=0, editable=False)
+    # Denormalized; maintained by the sync engine, see rebuild_counters
+    deals_count = models.PositiveIntegerField(default=0, editable=False)
+    # When the AvailableFile snapshot for this provider was last rebuilt
+    available_files_refreshed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Highest change_log id among this provider's delete entries dropped by
+    # compact_change_log; a feed cursor below it may have missed deletions
+    change_log_horizon = models.PositiveBigIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -14,23 +25,85 @@ class CRMProvider(models.Model):
     class Meta:
         db_table = 'crm_providers'
 
+class CRMAccount(models.Model):
+    """One set of CRM credentials under a provider; each account's deals are synced separately"""
+    DEFAULT_NAME = 'default'
+    
+    crm_provider = models.ForeignKey(CRMProvider, on_delete=models.CASCADE, related_name='accounts')
+    name = models.CharField(max_length=100)
+    # Blank: the provider's key from CRM_PROVIDER_API_KEYS, else CRM_API_KEY
+    api_key = models.CharField(max_length=255, blank=True)
+    is_active = models.BooleanField(default=True)
+    # CRM calls per minute across every worker syncing this account; 0 for no quota
+    requests_per_minute = models.PositiveIntegerField(default=0)
+    # Generation of the account's latest full sync; it stamps the deals and
+    # files it sees and then deletes the account's rows stamped with older ones
+    sync_generation = models.PositiveBigIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['crm_provider', 'name']
+        db_table = 'crm_accounts'
+    
+    def __str__(self):
+        if self.name == self.DEFAULT_NAME:
+            return self.crm_provider.name
+        return f"{self.crm_provider.name}/{self.name}"
+    
+    @classmethod
+    def default_for(cls, crm_provider_id: int) -> 'CRMAccount':
+        """The provider's default account, which uses the API key from settings"""
+        return cls.objects.get_or_create(crm_provider_id=crm_provider_id, name=cls.DEFAULT_NAME)[0]
+    
+    @classmethod
+    def active_for(cls, crm_provider: CRMProvider) -> list:
+        """The provider's active accounts; a provider with none configured gets the default one"""
+        accounts = list(cls.objects.filter(crm_provider=crm_provider, is_active=True).select_related('crm_provider'))
+        if not accounts and not cls.objects.filter(crm_provider=crm_provider).exists():
+            accounts = [cls.default_for(crm_provider.pk)]
+        return accounts
+    
+    def get_api_key(self) -> str:
+        return (self.api_key
+                or settings.CRM_PROVIDER_API_KEYS.get(self.crm_provider.name.lower())
+                or settings.CRM_API_KEY)
+
 class Deal(models.Model):
     crm_provider = models.ForeignKey(CRMProvider, on_delete=models.CASCADE)
+    # Deal ids are only unique within one CRM account
+    crm_account = models.ForeignKey(CRMAccount, on_delete=models.CASCADE, related_name='deals', editable=False)
     crm_deal_id = models.CharField(max_length=100)
     deal_name = models.CharField(max_length=255)
     deal_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     deal_stage = models.CharField(max_length=100, null=True, blank=True)
+    # Denormalized; maintained by the sync engine, see rebuild_counters
+    files_count = models.PositiveIntegerField(default=0, editable=False)
+    total_file_size = models.BigIntegerField(default=0, editable=False)
+    # crm_account.sync_generation of the last full sync that saw this deal
+    seen_generation = models.PositiveBigIntegerField(default=0, editable=False)
+    # Digest of the CRM file listing last written in full, and the provider's
+    # change marker at the time; blank until the sync finds the rows match it
+    files_digest = models.CharField(max_length=64, blank=True, default='', editable=False)
+    files_marker = models.CharField(max_length=255, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        unique_together = ['crm_provider', 'crm_deal_id']
+        unique_together = ['crm_account', 'crm_deal_id']
         indexes = [
             models.Index(fields=['crm_provider', 'crm_deal_id']),
             models.Index(fields=['deal_name']),
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['crm_provider', 'created_at', 'id']),
+            models.Index(fields=['crm_account', 'seen_generation']),
         ]
         db_table = 'deals'
     
+    def save(self, *args, **kwargs):
+        if self.crm_account_id is None and self.crm_provider_id is not None:
+            self.crm_account = CRMAccount.default_for(self.crm_provider_id)
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"{self.deal_name} ({self.crm_provider.name})"
 
@@ -55,6 +128,8 @@ class FileMetadata(models.Model):
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     deal = models.ForeignKey(Deal, on_delete=models.CASCADE, related_name='files')
+    # Denormalized from deal.crm_provider so provider filters skip the join
+    crm_provider = models.ForeignKey(CRMProvider, on_delete=models.CASCADE, related_name='files', editable=False)
     crm_file_id = models.CharField(max_length=100)
     file_name = models.CharField(max_length=255)
     file_size = models.BigIntegerField()  # Size in bytes
@@ -62,20 +137,34 @@ class FileMetadata(models.Model):
     file_url = models.URLField()
     sync_status = models.CharField(max_length=10, choices=SYNC_STATUS, default='pending')
     sync_timestamp = models.DateTimeField(null=True, blank=True)
+    # crm_account.sync_generation of the last full sync that saw this file
+    seen_generation = models.PositiveBigIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ['deal', 'crm_file_id']
         indexes = [
-            models.Index(fields=['file_type']),
-            models.Index(fields=['sync_status']),
             models.Index(fields=['sync_timestamp']),
             models.Index(fields=['deal', 'crm_file_id']),
             models.Index(fields=['file_name']),
+            models.Index(fields=['file_size']),
+            models.Index(fields=['created_at', 'id']),
+            # Each FilesView filter followed by the default sort, so a filtered
+            # page (and its cursor) is read straight off the index
+            models.Index(fields=['crm_provider', 'created_at', 'id']),
+            models.Index(fields=['deal', 'created_at', 'id']),
+            models.Index(fields=['sync_status', 'created_at', 'id']),
+            models.Index(fields=['file_type', 'created_at', 'id']),
+            models.Index(fields=['crm_provider', 'seen_generation']),
         ]
         db_table = 'file_metadata'
     
+    def save(self, *args, **kwargs):
+        if self.crm_provider_id is None and self.deal_id is not None:
+            self.crm_provider_id = self.deal.crm_provider_id
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"{self.file_name} - {self.deal.deal_name}"
 
@@ -86,15 +175,140 @@ class SyncLog(models.Model):
         ('error', 'Error'),
     ]
     
-    crm_provider = models.ForeignKey(CRMProvider, on_delete=models.CASCADE)
+    # Logs may live in their own database (see file_synch.routers), so these
+    # are plain ids there: no FK constraint, and no cascade from the main
+    # database. Deleting a provider deletes its logs in signals.py.
+    crm_provider = models.ForeignKey(CRMProvider, on_delete=models.DO_NOTHING, db_constraint=False)
     level = models.CharField(max_length=10, choices=LOG_LEVELS)
     message = models.TextField()
-    file_metadata = models.ForeignKey(FileMetadata, on_delete=models.CASCADE, null=True, blank=True)
+    file_metadata = models.ForeignKey(
+        FileMetadata, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         indexes = [
             models.Index(fields=['crm_provider', 'created_at']),
-            models.Index(fields=['level']),
+            models.Index(fields=['level', 'created_at', 'id']),
+            models.Index(fields=['created_at', 'id']),
+        ]
+        db_table = 'sync_logs'
+
+class SyncCheckpoint(models.Model):
+    """Progress marker for an interrupted full sync, saved at batch boundaries"""
+    crm_provider = models.ForeignKey(CRMProvider, on_delete=models.CASCADE, related_name='sync_checkpoints')
+    crm_account = models.OneToOneField(CRMAccount, on_delete=models.CASCADE, related_name='sync_checkpoint')
+    last_deal_id = models.CharField(max_length=100)
+    deals_completed = models.PositiveIntegerField(default=0)
+    results = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'sync_checkpoints'
+    
+    def save(self, *args, **kwargs):
+        if self.crm_account_id is None and self.crm_provider_id is not None:
+            self.crm_account = CRMAccount.default_for(self.crm_provider_id)
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.crm_account} @ {self.last_deal_id} ({self.deals_completed} deals)"
+
+
+class FileStats(models.Model):
+    """Running file count and size per provider, file type and sync status"""
+    crm_provider = models.ForeignKey(CRMProvider, on_delete=models.CASCADE, related_name='file_stats')
+    file_type = models.CharField(max_length=10)
+    sync_status = models.CharField(max_length=10)
+    file_count = models.BigIntegerField(default=0)
+    total_size = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['crm_provider', 'file_type', 'sync_status']
+        db_table = 'file_stats'
+    
+    def __str__(self):
+        return f"{self.crm_provider.name} {self.file_type}/{self.sync_status}: {self.file_count}"
+
+
+class AvailableFile(models.Model):
+    """Snapshot of a file the CRM offers, refreshed periodically instead of per request"""
+    crm_provider = models.ForeignKey(CRMProvider, on_delete=models.CASCADE, related_name='available_files')
+    crm_account = models.ForeignKey(CRMAccount, on_delete=models.CASCADE, related_name='available_files')
+    crm_deal_id = models.CharField(max_length=100)
+    deal_name = models.CharField(max_length=255)
+    crm_file_id = models.CharField(max_length=100)
+    file_name = models.CharField(max_length=255)
+    file_size = models.BigIntegerField()
+    file_type = models.CharField(max_length=10)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['crm_provider', 'crm_account', 'crm_deal_id', 'crm_file_id']
+        indexes = [
+            models.Index(fields=['crm_provider', 'created_at', 'id']),
+            models.Index(fields=['crm_provider', 'file_type']),
         ]
-        db_table = 'sync_logs'
\ No newline at end of file
+        db_table = 'available_files'
+    
+    def __str__(self):
+        return f"{self.file_name} ({self.crm_provider.name})"
+
+
+class ChangeLogEntry(models.Model):
+    """A deal or file the sync engine created, updated or deleted, served by /api/changes/"""
+    ENTITIES = [
+        ('deal', 'Deal'),
+        ('file', 'File'),
+    ]
+    
+    ACTIONS = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('deleted', 'Deleted'),
+    ]
+    
+    # The id is the feed cursor: AUTOINCREMENT on SQLite, so ids only grow
+    # and entries come back in the order they were written
+    crm_provider = models.ForeignKey(CRMProvider, on_delete=models.CASCADE, related_name='changes')
+    entity = models.CharField(max_length=10, choices=ENTITIES)
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    # Deal or FileMetadata pk, as plain values: delete entries outlive the row
+    object_id = models.CharField(max_length=36)
+    crm_id = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['crm_provider', 'id']),
+            # compact_change_log looks for a later entry per object
+            models.Index(fields=['entity', 'object_id', 'id']),
+            models.Index(fields=['action', 'created_at']),
+        ]
+        db_table = 'change_log'
+    
+    def __str__(self):
+        return f"{self.entity} {self.object_id} {self.action}"
+
+
+class PendingDealSync(models.Model):
+    """A deal with CRM webhook events waiting to be synced; one row however many events arrive"""
+    crm_provider = models.ForeignKey(CRMProvider, on_delete=models.CASCADE, related_name='pending_deal_syncs')
+    crm_deal_id = models.CharField(max_length=100)
+    # The deal is synced WEBHOOK_COALESCE_SECONDS after its first event
+    first_event_at = models.DateTimeField()
+    last_event_at = models.DateTimeField()
+    # Failed targeted syncs; the deal is dropped after WEBHOOK_MAX_ATTEMPTS
+    attempts = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['crm_provider', 'crm_deal_id']
+        indexes = [
+            models.Index(fields=['crm_provider', 'first_event_at']),
+        ]
+        db_table = 'pending_deal_syncs'
+    
+    def __str__(self):
+        return f"{self.crm_deal_id} ({self.crm_provider.name})"
@@ -0,0 +1,179 @@
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import hashlib
+import json
+from math import ceil
+
+COUNT_CACHE_TTL = 60  # seconds an exact total is reused in cursor mode
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded or does not fit the request"""
+
+
+def encode_cursor(created_at, pk) -> str:
+    """Opaque cursor for the row at (created_at, pk)"""
+    raw = json.dumps([created_at.isoformat(), str(pk)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    """Inverse of encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, pk = json.loads(raw)
+        created_at = parse_datetime(created_at)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if created_at is None:
+        raise InvalidCursor('Invalid cursor')
+    return created_at, pk
+
+
+class CursorPaginator:
+    """Keyset pagination over (created_at, id), with no COUNT and no OFFSET"""
+
+    def __init__(self, queryset, per_page: int, descending: bool = True):
+        self.descending = descending
+        if descending:
+            self.queryset = queryset.order_by('-created_at', '-pk')
+        else:
+            self.queryset = queryset.order_by('created_at', 'pk')
+        self.per_page = per_page
+
+    def _after(self, cursor: Optional[str]):
+        queryset = self.queryset
+        if cursor:
+            created_at, pk = decode_cursor(cursor)
+            try:
+                pk = queryset.model._meta.pk.to_python(pk)
+            except ValidationError:
+                raise InvalidCursor('Invalid cursor')
+            if self.descending:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+                )
+        # One extra row tells us whether another page exists
+        return queryset[:self.per_page + 1]
+
+    def _page(self, items: List[Any]) -> Tuple[List[Any], Optional[str]]:
+        if len(items) <= self.per_page:
+            return items, None
+        items = items[:self.per_page]
+        last = items[-1]
+        if isinstance(last, dict):
+            # .values() rows; projections always include the cursor keys
+            return items, encode_cursor(last['created_at'], last['pk'])
+        return items, encode_cursor(last.created_at, last.pk)
+
+    def get_page(self, cursor: Optional[str]) -> Tuple[List[Any], Optional[str]]:
+        """Return the rows after cursor and the cursor of the following page"""
+        return self._page(list(self._after(cursor)))
+
+    async def aget_page(self, cursor: Optional[str]) -> Tuple[List[Any], Optional[str]]:
+        """Async get_page"""
+        return self._page([item async for item in self._after(cursor)])
+
+
+def _count_key(queryset) -> str:
+    sql, params = queryset.order_by().query.sql_with_params()
+    return 'pagination:count:' + hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+
+
+def cached_count(queryset) -> int:
+    """Exact row count, reused for COUNT_CACHE_TTL seconds per query shape"""
+    key = _count_key(queryset)
+    total = cache.get(key)
+    if total is None:
+        total = queryset.count()
+        cache.set(key, total, COUNT_CACHE_TTL)
+    return total
+
+
+async def acached_count(queryset) -> int:
+    """Async cached_count"""
+    key = _count_key(queryset)
+    total = await cache.aget(key)
+    if total is None:
+        total = await queryset.acount()
+        await cache.aset(key, total, COUNT_CACHE_TTL)
+    return total
+
+
+def _cursor_paginator(queryset, per_page: int) -> CursorPaginator:
+    order_by = queryset.query.order_by
+    if order_by and order_by[0] not in ('-created_at', 'created_at'):
+        raise InvalidCursor('Cursor pagination only supports ordering by created_at')
+    descending = not order_by or order_by[0] == '-created_at'
+    return CursorPaginator(queryset, per_page, descending=descending)
+
+
+def _cursor_pagination(per_page: int, next_cursor: Optional[str]) -> Dict[str, Any]:
+    return {
+        'per_page': per_page,
+        'next_cursor': next_cursor,
+        'has_next': next_cursor is not None,
+    }
+
+
+def _wants_total(request) -> bool:
+    return request.GET.get('include_total', '').lower() in ('1', 'true')
+
+
+def paginate_queryset(request, queryset, per_page: int) -> Tuple[List[Any], Dict[str, Any]]:
+    """Paginate by ?cursor= (keyset) when given, otherwise by ?page= (offset)"""
+    if 'cursor' in request.GET:
+        paginator = _cursor_paginator(queryset, per_page)
+        items, next_cursor = paginator.get_page(request.GET.get('cursor'))
+        pagination = _cursor_pagination(per_page, next_cursor)
+        if _wants_total(request):
+            pagination['total'] = cached_count(queryset)
+        return items, pagination
+
+    page = int(request.GET.get('page', 1))
+    paginator = Paginator(queryset, per_page)
+    page_obj = paginator.get_page(page)
+    return list(page_obj), {
+        'total': paginator.count,
+        'pages': paginator.num_pages,
+        'current_page': page,
+        'per_page': per_page,
+        'has_next': page_obj.has_next(),
+        'has_previous': page_obj.has_previous(),
+    }
+
+
+async def apaginate_queryset(request, queryset, per_page: int) -> Tuple[List[Any], Dict[str, Any]]:
+    """Async paginate_queryset, with the same page clamping as Paginator.get_page"""
+    if 'cursor' in request.GET:
+        paginator = _cursor_paginator(queryset, per_page)
+        items, next_cursor = await paginator.aget_page(request.GET.get('cursor'))
+        pagination = _cursor_pagination(per_page, next_cursor)
+        if _wants_total(request):
+            pagination['total'] = await acached_count(queryset)
+        return items, pagination
+
+    page = int(request.GET.get('page', 1))
+    total = await queryset.acount()
+    num_pages = max(ceil(total / per_page), 1)
+    number = min(max(page, 1), num_pages)
+    offset = (number - 1) * per_page
+    items = [item async for item in queryset[offset:offset + per_page]]
+    return items, {
+        'total': total,
+        'pages': num_pages,
+        'current_page': page,
+        'per_page': per_page,
+        'has_next': number < num_pages,
+        'has_previous': number > 1,
+    }
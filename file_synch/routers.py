@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import DEFAULT_DB_ALIAS, connections, router
+
+LOGS_DB = 'logs'
+REPLICA_DB = 'replica'
+
+# Append-only tables that go to the LOGS_DB database when one is configured.
+# They reference the main database's rows by id only (db_constraint=False).
+LOG_MODELS = {'file_synch.synclog'}
+
+# Set by replica_reads() for the duration of a read-only request
+_replica_reads = ContextVar('file_synch_replica_reads', default=None)
+
+
+class _ReplicaReads:
+    def __init__(self):
+        self.pinned = False
+
+
+@contextmanager
+def replica_reads():
+    """Send reads inside the block to REPLICA_DB until the first write"""
+    token = _replica_reads.set(_ReplicaReads())
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def _is_log_model(model) -> bool:
+    return model._meta.label_lower in LOG_MODELS
+
+
+def log_database() -> str:
+    return LOGS_DB if LOGS_DB in connections else DEFAULT_DB_ALIAS
+
+
+class DatabaseRouter:
+    """Routes log tables to the logs database and read-only requests to the replica"""
+    
+    def db_for_read(self, model, **hints):
+        if _is_log_model(model) and LOGS_DB in connections:
+            return LOGS_DB
+        state = _replica_reads.get()
+        if state is not None and not state.pinned and REPLICA_DB in connections:
+            return REPLICA_DB
+        # Explicit, so related lookups from a log row do not follow it to LOGS_DB
+        return DEFAULT_DB_ALIAS
+    
+    def db_for_write(self, model, **hints):
+        if _is_log_model(model):
+            return log_database()
+        state = _replica_reads.get()
+        if state is not None:
+            # Read our own writes for the rest of the request
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        if _is_log_model(type(obj1)) or _is_log_model(type(obj2)):
+            return True
+        return None
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        is_log_model = f'{app_label}.{model_name}' in LOG_MODELS
+        if db == REPLICA_DB:
+            return False
+        if db == LOGS_DB:
+            return is_log_model
+        if is_log_model:
+            return db == log_database()
+        return None
+
+
+def logs_share_database() -> bool:
+    """Whether log rows can be joined to providers and files in one query"""
+    from .models import CRMProvider, SyncLog
+    return router.db_for_read(SyncLog) == router.db_for_read(CRMProvider)
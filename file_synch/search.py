@@ -0,0 +1,154 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from abc import ABC, abstractmethod
+import re
+
+# SQLite FTS5 indexes kept in step with their content tables by triggers, so
+# every write (including the sync engine's bulk writes) updates them.
+FTS_TABLES = {
+    'file_metadata_fts': {
+        'content': 'file_metadata',
+        'content_rowid': 'rowid',
+        'columns': ['file_name'],
+    },
+    'deals_fts': {
+        'content': 'deals',
+        'content_rowid': 'id',
+        'columns': ['deal_name', 'crm_deal_id'],
+    },
+}
+
+
+def install_sqlite_fts(conn=None):
+    """(Re)create the FTS5 tables and triggers and rebuild them from their content tables.
+
+    Safe to run repeatedly. Migrations that make Django rebuild file_metadata
+    or deals must reinstall the index too, since a table rebuild drops the
+    triggers and renumbers rowids; they use the frozen copy of this SQL in
+    file_synch/migrations/_search_index.py.
+    """
+    conn = conn or connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        for fts_table, spec in FTS_TABLES.items():
+            content, rowid = spec['content'], spec['content_rowid']
+            columns = ', '.join(spec['columns'])
+            new_values = ', '.join(f'new.{column}' for column in spec['columns'])
+            old_values = ', '.join(f'old.{column}' for column in spec['columns'])
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {fts_table}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {fts_table}')
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {fts_table} USING fts5({columns}, "
+                f"content='{content}', content_rowid='{rowid}', tokenize='unicode61')"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {content} BEGIN '
+                f'INSERT INTO {fts_table}(rowid, {columns}) VALUES (new.{rowid}, {new_values}); END'
+            )
+            cursor.execute(
+                f'CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {content} BEGIN '
+                f"INSERT INTO {fts_table}({fts_table}, rowid, {columns}) VALUES ('delete', old.{rowid}, {old_values}); END"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER {fts_table}_au AFTER UPDATE OF {columns} ON {content} BEGIN '
+                f"INSERT INTO {fts_table}({fts_table}, rowid, {columns}) VALUES ('delete', old.{rowid}, {old_values}); "
+                f'INSERT INTO {fts_table}(rowid, {columns}) VALUES (new.{rowid}, {new_values}); END'
+            )
+            cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+
+def uninstall_sqlite_fts(conn=None):
+    """Drop the FTS5 tables and their triggers"""
+    conn = conn or connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        for fts_table in FTS_TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {fts_table}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {fts_table}')
+
+
+class BaseSearchBackend(ABC):
+    """Filters a queryset by a search term and annotates it with search_rank (lower is better)"""
+
+    @abstractmethod
+    def search_files(self, queryset, term: str):
+        pass
+
+    @abstractmethod
+    def search_deals(self, queryset, term: str):
+        pass
+
+    def rebuild(self):
+        """Rebuild whatever index the backend keeps"""
+
+
+class ContainsSearchBackend(BaseSearchBackend):
+    """Unindexed substring search, for databases without a full-text backend"""
+
+    def search_files(self, queryset, term):
+        return queryset.filter(file_name__icontains=term).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+    def search_deals(self, queryset, term):
+        return queryset.filter(
+            Q(deal_name__icontains=term) |
+            Q(crm_deal_id__icontains=term)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """SQLite FTS5 search with bm25 ranking and prefix matching on every term"""
+
+    fallback = ContainsSearchBackend()
+
+    @staticmethod
+    def match_expression(term: str) -> str:
+        """'acme contr' -> '"acme"* "contr"*' so partial words match as you type"""
+        tokens = re.findall(r'\w+', term)
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def _search(self, queryset, fts_table, content_table, content_rowid, match):
+        ranked = queryset.annotate(search_rank=RawSQL(
+            f'SELECT rank FROM {fts_table} WHERE {fts_table} MATCH %s '
+            f'AND rowid = {content_table}.{content_rowid}',
+            [match],
+            output_field=FloatField(),
+        ))
+        return ranked.filter(pk__in=RawSQL(
+            f'SELECT {content_table}.id FROM {content_table} WHERE {content_table}.{content_rowid} IN '
+            f'(SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s)',
+            [match],
+        ))
+
+    def search_files(self, queryset, term):
+        match = self.match_expression(term)
+        if not match:
+            return self.fallback.search_files(queryset, term)
+        return self._search(queryset, 'file_metadata_fts', 'file_metadata', 'rowid', match)
+
+    def search_deals(self, queryset, term):
+        match = self.match_expression(term)
+        if not match:
+            return self.fallback.search_deals(queryset, term)
+        return self._search(queryset, 'deals_fts', 'deals', 'id', match)
+
+    def rebuild(self):
+        install_sqlite_fts()
+
+
+def get_search_backend() -> BaseSearchBackend:
+    """SEARCH_BACKEND if configured, otherwise the best backend for the database"""
+    if settings.SEARCH_BACKEND:
+        return import_string(settings.SEARCH_BACKEND)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    return ContainsSearchBackend()
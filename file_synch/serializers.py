@@ -0,0 +1,167 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+from .instrumentation import timed
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import json
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON encoding
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: application/msgpack responses
+    msgpack = None
+
+JSON_CONTENT_TYPE = 'application/json'
+MSGPACK_CONTENT_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+
+class InvalidFields(ValueError):
+    """Raised when ?fields= names a field the resource does not have"""
+
+
+class NotAcceptable(ValueError):
+    """Raised when the client only accepts formats we cannot produce"""
+
+
+def isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def megabytes(value):
+    return round(value / (1024 * 1024), 2)
+
+
+class Projection:
+    """Maps output fields to ORM paths so list endpoints can read rows with .values()"""
+
+    def __init__(self, fields: Dict[str, Tuple[str, Optional[Callable]]]):
+        self.fields = fields
+
+    def select(self, requested: Optional[str]) -> List[str]:
+        """Output fields for a ?fields=a,b,c value (all fields when empty)"""
+        if not requested:
+            return list(self.fields)
+        names = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise InvalidFields(f"Unknown field(s): {', '.join(unknown)}")
+        return names
+
+    def values(self, queryset, names: List[str]):
+        """Only fetch the columns the selected fields need, plus the cursor keys"""
+        paths = {'pk', 'created_at'}
+        paths.update(self.fields[name][0] for name in names)
+        return queryset.values(*sorted(paths))
+
+    def serialize(self, rows: Iterable[Dict[str, Any]], names: List[str]) -> List[Dict[str, Any]]:
+        fields = [(name,) + self.fields[name] for name in names]
+        data = []
+        with timed('serialize'):
+            for row in rows:
+                item = {}
+                for name, path, transform in fields:
+                    value = row[path]
+                    item[name] = transform(value) if transform else value
+                data.append(item)
+        return data
+
+
+def _deal_amount(value):
+    return float(value) if value else None
+
+
+def _optional_str(value):
+    return str(value) if value is not None else None
+
+
+FILE_PROJECTION = Projection({
+    'id': ('pk', str),
+    'deal_id': ('deal_id', None),
+    'deal_name': ('deal__deal_name', None),
+    'crm_provider': ('crm_provider__name', None),
+    'crm_file_id': ('crm_file_id', None),
+    'file_name': ('file_name', None),
+    'file_size': ('file_size', None),
+    'file_size_mb': ('file_size', megabytes),
+    'file_type': ('file_type', None),
+    'sync_status': ('sync_status', None),
+    'sync_timestamp': ('sync_timestamp', isoformat),
+    'created_at': ('created_at', isoformat),
+})
+
+DEAL_PROJECTION = Projection({
+    'id': ('pk', None),
+    'crm_provider': ('crm_provider__name', None),
+    'crm_deal_id': ('crm_deal_id', None),
+    'deal_name': ('deal_name', None),
+    'deal_amount': ('deal_amount', _deal_amount),
+    'deal_stage': ('deal_stage', None),
+    'files_count': ('files_count', None),
+    'total_file_size': ('total_file_size', None),
+    'created_at': ('created_at', isoformat),
+})
+
+SYNC_LOG_PROJECTION = Projection({
+    'id': ('pk', None),
+    'crm_provider': ('crm_provider__name', None),
+    'level': ('level', None),
+    'message': ('message', None),
+    'file_id': ('file_metadata_id', _optional_str),
+    'created_at': ('created_at', isoformat),
+})
+
+# For logs in their own database, where crm_providers cannot be joined; the
+# view swaps provider ids for names after fetching the page
+DETACHED_SYNC_LOG_PROJECTION = Projection({
+    **SYNC_LOG_PROJECTION.fields,
+    'crm_provider': ('crm_provider_id', None),
+})
+
+# The row itself is looked up separately: a delete entry has none
+CHANGE_PROJECTION = Projection({
+    'id': ('pk', None),
+    'crm_provider': ('crm_provider_id', None),
+    'entity': ('entity', None),
+    'action': ('action', None),
+    'object_id': ('object_id', None),
+    'crm_id': ('crm_id', None),
+    'changed_at': ('created_at', isoformat),
+})
+
+
+def negotiate(request) -> str:
+    """Pick the response media type from the Accept header, honouring its q-values"""
+    if not request.META.get('HTTP_ACCEPT'):
+        return JSON_CONTENT_TYPE
+    # Listed first, JSON wins ties such as */* or application/*
+    offered = [JSON_CONTENT_TYPE, *(MSGPACK_CONTENT_TYPES if msgpack is not None else ())]
+    media_type = request.get_preferred_type(offered)
+    if media_type is not None:
+        return media_type
+    raise NotAcceptable('Supported formats: application/json'
+                        + (', application/msgpack' if msgpack is not None else ''))
+
+
+def dumps_json(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+def render(request, data, status: int = 200) -> HttpResponse:
+    """Serialize data as JSON (orjson when available) or MessagePack, per the Accept header"""
+    try:
+        media_type = negotiate(request)
+    except NotAcceptable as e:
+        return HttpResponse(dumps_json({'error': str(e)}), status=406, content_type=JSON_CONTENT_TYPE)
+    with timed('serialize'):
+        if media_type == JSON_CONTENT_TYPE:
+            content = dumps_json(data)
+        else:
+            content = msgpack.packb(data, use_bin_type=True)
+    return HttpResponse(content, status=status, content_type=media_type)
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from file_synch.models import ChangeLogEntry, CRMProvider
+from datetime import timedelta
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeRecorder:
+    """Collects change log entries during a sync and inserts them in one bulk write"""
+    
+    def __init__(self, crm_provider: CRMProvider):
+        self.crm_provider = crm_provider
+        self.pending = []
+    
+    def record(self, entity: str, action: str, object_id, crm_id: str):
+        self.pending.append(ChangeLogEntry(
+            crm_provider=self.crm_provider,
+            entity=entity,
+            action=action,
+            object_id=str(object_id),
+            crm_id=crm_id,
+        ))
+    
+    def flush(self):
+        """Insert the collected entries; call inside the transaction that wrote the rows"""
+        pending, self.pending = self.pending, []
+        if pending:
+            ChangeLogEntry.objects.bulk_create(pending)
+
+
+def compact_change_log(tombstone_days: Optional[int] = None) -> Dict[str, int]:
+    """Keep only the latest entry per deal or file, and expire old delete entries.
+    
+    A consumer reading after any cursor still ends up with each object's
+    latest state. Delete entries older than tombstone_days are dropped and
+    recorded as the provider's change_log_horizon, so /api/changes/ can
+    refuse cursors that would miss them.
+    """
+    if tombstone_days is None:
+        tombstone_days = settings.CHANGE_LOG_TOMBSTONE_DAYS
+    later = ChangeLogEntry.objects.filter(
+        entity=OuterRef('entity'), object_id=OuterRef('object_id'), pk__gt=OuterRef('pk'),
+    )
+    expired = ChangeLogEntry.objects.filter(
+        action='deleted', created_at__lt=timezone.now() - timedelta(days=tombstone_days),
+    )
+    
+    with transaction.atomic():
+        superseded, _ = ChangeLogEntry.objects.filter(Exists(later)).delete()
+        for row in expired.values('crm_provider').annotate(last=Max('pk')).order_by():
+            CRMProvider.objects.filter(
+                pk=row['crm_provider'], change_log_horizon__lt=row['last'],
+            ).update(change_log_horizon=row['last'])
+        tombstones, _ = expired.delete()
+    
+    logger.info(f"Compacted change log: {superseded} superseded and {tombstones} expired delete entries removed")
+    return {'superseded': superseded, 'expired': tombstones}
@@ -0,0 +1,165 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from file_synch.instrumentation import in_crm_call
+from functools import wraps
+from typing import Any, Dict, Optional
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CRMTransientError(Exception):
+    """Raised by providers for failures worth retrying: timeouts, 429s, 5xx responses.
+    
+    retry_after carries the CRM's own hint (Retry-After header), in seconds.
+    """
+    
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CRMUnavailable(Exception):
+    """Raised instead of calling a CRM whose circuit is open"""
+    
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable; retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+TRANSIENT_ERRORS = (CRMTransientError, ConnectionError, TimeoutError)
+
+
+class CircuitBreaker:
+    """Per-account circuit breaker, kept in the cache so every worker sees it open.
+    
+    CRM_CIRCUIT_FAILURES transient errors or slow calls in a row open the
+    circuit for a cooldown that doubles, with jitter, each time it opens again.
+    Once the cooldown is over, one call is let through as a probe: success
+    closes the circuit and failure opens it again.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        prefix = f'file_synch:circuit:{name}'
+        self.failures_key = f'{prefix}:failures'
+        self.open_key = f'{prefix}:open'  # time the cooldown ends
+        self.trips_key = f'{prefix}:trips'  # times opened since last closed
+        self.probe_key = f'{prefix}:probe'
+    
+    def before_call(self) -> Dict[str, Any]:
+        """Raise CRMUnavailable while open; returns the state to pass to record_*"""
+        state = cache.get_many([self.failures_key, self.open_key, self.trips_key])
+        reopens_at = state.get(self.open_key)
+        if reopens_at is not None:
+            raise CRMUnavailable(self.name, max(reopens_at - time.time(), 1))
+        if state.get(self.trips_key) and not cache.add(self.probe_key, True, self._probe_timeout()):
+            # Half open, and another caller is already probing
+            raise CRMUnavailable(self.name, settings.CRM_CIRCUIT_COOLDOWN)
+        return state
+    
+    def record_success(self, state: Dict[str, Any], elapsed: float):
+        if elapsed > settings.CRM_CIRCUIT_SLOW_CALL_SECONDS:
+            self.record_failure(state)
+        elif state:
+            cache.delete_many([self.failures_key, self.trips_key, self.probe_key])
+            if state.get(self.trips_key):
+                logger.info(f"{self.name} circuit closed")
+    
+    def record_failure(self, state: Dict[str, Any], retry_after: Optional[float] = None):
+        """Count a transient error or slow call; retry_after opens the circuit for at least that long"""
+        cache.add(self.failures_key, 0, None)
+        failures = cache.incr(self.failures_key)
+        trips = state.get(self.trips_key) or 0
+        if retry_after is None and not trips and failures < settings.CRM_CIRCUIT_FAILURES:
+            return
+        
+        trips += 1
+        cooldown = min(settings.CRM_CIRCUIT_COOLDOWN * 2 ** (trips - 1), settings.CRM_CIRCUIT_MAX_COOLDOWN)
+        cooldown = max(random.uniform(cooldown / 2, cooldown), retry_after or 0)
+        cache.set(self.open_key, time.time() + cooldown, cooldown)
+        cache.set(self.trips_key, trips, None)
+        cache.delete_many([self.failures_key, self.probe_key])
+        logger.warning(f"{self.name} circuit opened for {cooldown:.0f}s after {failures} failed or slow call(s)")
+    
+    def reset(self):
+        cache.delete_many([self.failures_key, self.open_key, self.trips_key, self.probe_key])
+    
+    @staticmethod
+    def _probe_timeout() -> float:
+        # Long enough for the probe call; a caller that died mid-probe is forgotten
+        return settings.CRM_CIRCUIT_SLOW_CALL_SECONDS * 2
+
+
+class CallQuota:
+    """Caps an account's CRM calls per minute, counted in the cache so the cap holds across workers"""
+    
+    WINDOW = 60
+    
+    def __init__(self, name: str, per_minute: int):
+        self.name = name
+        self.per_minute = per_minute
+    
+    def acquire(self):
+        """Take a call from the current minute's quota, waiting for the next minute when it is used up"""
+        window = int(time.time() // self.WINDOW)
+        while True:
+            key = f'file_synch:quota:{self.name}:{window}'
+            cache.add(key, 0, self.WINDOW * 2)
+            if cache.incr(key) <= self.per_minute:
+                return
+            wait = (window + 1) * self.WINDOW - time.time()
+            if wait > 0:
+                logger.info(f"{self.name} used its {self.per_minute} calls this minute; waiting {wait:.0f}s")
+                # Jittered, so waiting workers do not all call at the top of the minute
+                time.sleep(wait + random.uniform(0, 1))
+            window += 1
+
+
+def retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying after error, or None to give up.
+    
+    Full-jitter exponential backoff, unless the CRM said how long to wait.
+    """
+    if not isinstance(error, TRANSIENT_ERRORS) or attempt >= settings.CRM_RETRY_ATTEMPTS:
+        return None
+    hint = getattr(error, 'retry_after', None)
+    if hint is not None:
+        return hint if hint <= settings.CRM_RETRY_MAX_DELAY else None
+    return random.uniform(0, min(settings.CRM_RETRY_BASE_DELAY * 2 ** attempt, settings.CRM_RETRY_MAX_DELAY))
+
+
+def guarded(method):
+    """Run a CRM API method behind its account's circuit breaker and call quota, retrying transient errors"""
+    @wraps(method)
+    def wrapper(service, *args, **kwargs):
+        if in_crm_call():
+            return method(service, *args, **kwargs)
+        breaker = service.circuit_breaker
+        quota = service.call_quota
+        attempt = 0
+        while True:
+            state = breaker.before_call()
+            if quota:
+                quota.acquire()
+            started = time.monotonic()
+            try:
+                result = method(service, *args, **kwargs)
+            except TRANSIENT_ERRORS as e:
+                delay = retry_delay(e, attempt)
+                hint = getattr(e, 'retry_after', None)
+                # Giving up on a CRM that said when to come back: stay away until then
+                breaker.record_failure(state, hint if delay is None else None)
+                if delay is None:
+                    raise
+                logger.warning(f"{breaker.name} call {method.__name__} failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            breaker.record_success(state, time.monotonic() - started)
+            return result
+    return wrapper
@@ -19,6 +19,16 @@ class CRMServiceFactory:
             return service_class(api_key)
         return None
     
+    @classmethod
+    def create_for_account(cls, crm_account) -> Optional[BaseCRMService]:
+        """Create the service for one CRM account, with its own key, circuit breaker and call quota"""
+        service = cls.create_service(crm_account.crm_provider.name, crm_account.get_api_key())
+        if service:
+            if crm_account.name != crm_account.DEFAULT_NAME:
+                service.account_name = crm_account.name
+            service.requests_per_minute = crm_account.requests_per_minute
+        return service
+    
     @classmethod
     def get_supported_providers(cls) -> list:
         """Get list of supported CRM providers"""
@@ -1,33 +1,125 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from array import array
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Dict, Any, Optional, Tuple
 from django.conf import settings
+import hashlib
 import logging
+import sys
+
+from file_synch.instrumentation import crm_call
+from .circuit_breaker import CallQuota, CircuitBreaker, guarded
 
 logger = logging.getLogger(__name__)
 
+# Slotted records: no per-instance __dict__, which matters when a large
+# account's listing is held in memory
+
+@dataclass(slots=True)
 class CRMFile:
-    def __init__(self, file_id: str, name: str, size: int, file_type: str, url: str, deal_id: str):
-        self.file_id = file_id
-        self.name = name
-        self.size = size
-        self.file_type = file_type
-        self.url = url
-        self.deal_id = deal_id
+    file_id: str
+    name: str
+    size: int
+    file_type: str
+    url: str
+    deal_id: str
 
+@dataclass(slots=True)
 class CRMDeal:
-    def __init__(self, deal_id: str, name: str, amount: float = None, stage: str = None):
+    deal_id: str
+    name: str
+    amount: Optional[float] = None
+    stage: Optional[str] = None
+
+class CRMFileBatch:
+    """One deal's files as parallel columns, so a listing needs no object per file"""
+    
+    __slots__ = ('deal_id', 'file_ids', 'names', 'sizes', 'file_types', 'urls')
+    
+    def __init__(self, deal_id: str):
         self.deal_id = deal_id
-        self.name = name
-        self.amount = amount
-        self.stage = stage
+        self.file_ids: List[str] = []
+        self.names: List[str] = []
+        self.sizes = array('q')
+        self.file_types: List[str] = []
+        self.urls: List[str] = []
+    
+    @classmethod
+    def from_files(cls, deal_id: str, crm_files: Iterable[CRMFile]) -> 'CRMFileBatch':
+        batch = cls(deal_id)
+        for crm_file in crm_files:
+            batch.append(crm_file.file_id, crm_file.name, crm_file.size, crm_file.file_type, crm_file.url)
+        return batch
+    
+    def append(self, file_id: str, name: str, size: int, file_type: str, url: str):
+        self.file_ids.append(file_id)
+        self.names.append(name)
+        self.sizes.append(size)
+        # A handful of distinct types; share one string per type
+        self.file_types.append(sys.intern(file_type))
+        self.urls.append(url)
+    
+    def __len__(self) -> int:
+        return len(self.file_ids)
+    
+    def digest(self) -> str:
+        """Hash of the file set: one hash per file, combined in file id order"""
+        root = hashlib.sha256()
+        for row in sorted(self.rows()):
+            root.update(hashlib.sha256('\x1f'.join(map(str, row)).encode()).digest())
+        return root.hexdigest()
+    
+    def rows(self) -> Iterator[Tuple[str, str, int, str, str]]:
+        """(file_id, name, size, file_type, url) tuples, one at a time"""
+        return zip(self.file_ids, self.names, self.sizes, self.file_types, self.urls)
+    
+    def __iter__(self) -> Iterator[CRMFile]:
+        """CRMFile records, for code that wants one object per file"""
+        for row in self.rows():
+            yield CRMFile(*row, self.deal_id)
 
 class BaseCRMService(ABC):
     """Abstract base class for CRM services for SOLID principles"""
     
+    API_METHODS = (
+        'authenticate', 'get_deals', 'get_deals_by_id', 'get_files_for_deal', 'get_file_batch_for_deal',
+        'get_files_for_deals', 'get_file_batches_for_deals', 'download_file',
+    )
+    
+    # Deals whose files one get_files_for_deals call can list; 0 when the
+    # provider has no batch endpoint and each deal's files take their own call
+    FILES_BATCH_SIZE = 0
+    
+    # Set by CRMServiceFactory.create_for_account; a named account gets its
+    # own circuit breaker, and a non-zero quota caps its calls per minute
+    account_name = ''
+    requests_per_minute = 0
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Every provider's API calls show up in the per-request metrics, and
+        # go through its circuit breaker
+        for name in cls.API_METHODS:
+            method = cls.__dict__.get(name)
+            if method is not None and not getattr(method, '__crm_call__', False):
+                setattr(cls, name, guarded(crm_call(method)))
+    
     def __init__(self, api_key: str, api_endpoint: str = None):
         self.api_key = api_key
         self.api_endpoint = api_endpoint
     
+    @property
+    def circuit_breaker(self) -> CircuitBreaker:
+        """Breaker shared by every instance of this account's service, in every worker"""
+        name = type(self).__name__
+        return CircuitBreaker(f'{name}:{self.account_name}' if self.account_name else name)
+    
+    @property
+    def call_quota(self) -> Optional[CallQuota]:
+        if not self.requests_per_minute:
+            return None
+        return CallQuota(self.circuit_breaker.name, self.requests_per_minute)
+    
     @abstractmethod
     def authenticate(self) -> bool:
         """Authenticate with CRM system"""
@@ -38,11 +130,45 @@ class BaseCRMService(ABC):
         """Get all deals from CRM"""
         pass
     
+    def get_deals_by_id(self, deal_ids: Iterable[str]) -> Dict[str, CRMDeal]:
+        """The given deals that still exist, by id; providers can fetch them individually instead"""
+        wanted = set(deal_ids)
+        return {deal.deal_id: deal for deal in self.get_deals() if deal.deal_id in wanted}
+    
     @abstractmethod
     def get_files_for_deal(self, deal_id: str) -> List[CRMFile]:
         """Get all files for a specific deal"""
         pass
     
+    def get_files_marker(self, crm_deal: CRMDeal) -> str:
+        """Cheap value that changes whenever the deal's files do; '' when the provider has none.
+        
+        Typically built from fields the deal listing already has, such as the
+        attachment count and last modified time. A full sync skips listing
+        the files of a deal whose marker has not changed since it last synced.
+        """
+        return ''
+    
+    def get_file_batch_for_deal(self, deal_id: str) -> CRMFileBatch:
+        """Files for a deal as a CRMFileBatch; providers can build one straight from the API response"""
+        return CRMFileBatch.from_files(deal_id, self.get_files_for_deal(deal_id))
+    
+    def get_files_for_deals(self, deal_ids: List[str]) -> Dict[str, List[CRMFile]]:
+        """Files for up to FILES_BATCH_SIZE deals, with an entry for each deal that still exists"""
+        return {deal_id: self.get_files_for_deal(deal_id) for deal_id in deal_ids}
+    
+    def get_file_batches_for_deals(self, deal_ids: List[str]) -> Dict[str, CRMFileBatch]:
+        """get_files_for_deals as CRMFileBatches"""
+        return {
+            deal_id: CRMFileBatch.from_files(deal_id, crm_files)
+            for deal_id, crm_files in self.get_files_for_deals(deal_ids).items()
+        }
+    
+    def file_listing_chunks(self, deal_ids: List[str]) -> List[List[str]]:
+        """deal_ids split into one chunk per get_files_for_deals call"""
+        size = self.FILES_BATCH_SIZE or 1
+        return [deal_ids[start:start + size] for start in range(0, len(deal_ids), size)]
+    
     @abstractmethod
     def download_file(self, file_url: str) -> bytes:
         """Download file content"""
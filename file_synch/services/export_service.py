@@ -0,0 +1,89 @@
+from django.db.models import F
+
+from file_synch.models import FileMetadata
+from typing import Any, Dict, Iterable, Iterator
+import csv
+import json
+import zlib
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = [
+    'id', 'deal_id', 'deal_name', 'crm_provider', 'crm_file_id', 'file_name',
+    'file_size', 'file_type', 'file_url', 'sync_status', 'sync_timestamp',
+    'created_at', 'updated_at',
+]
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def iter_file_rows(queryset, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Stream FileMetadata rows as plain dicts with a server-side cursor"""
+    rows = queryset.values(
+        'id', 'deal_id', 'crm_file_id', 'file_name', 'file_size', 'file_type',
+        'file_url', 'sync_status', 'sync_timestamp', 'created_at', 'updated_at',
+        deal_name=F('deal__deal_name'),
+        provider_name=F('crm_provider__name'),
+    )
+    for row in rows.iterator(chunk_size=chunk_size):
+        row['id'] = str(row['id'])
+        # crm_provider is the FK column's name, so the annotation can't use it
+        row['crm_provider'] = row.pop('provider_name')
+        for field in ('sync_timestamp', 'created_at', 'updated_at'):
+            if row[field] is not None:
+                row[field] = row[field].isoformat()
+        yield row
+
+
+def iter_ndjson(rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """One JSON object per line"""
+    for row in rows:
+        yield (json.dumps({field: row[field] for field in EXPORT_FIELDS}) + '\n').encode()
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller"""
+    
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """Header line followed by one CSV line per row"""
+    writer = csv.DictWriter(_Echo(), fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+    yield writer.writerow(dict(zip(EXPORT_FIELDS, EXPORT_FIELDS))).encode()
+    for row in rows:
+        yield writer.writerow(row).encode()
+
+
+def iter_gzip(chunks: Iterable[bytes], flush_every: int = 64 * 1024) -> Iterator[bytes]:
+    """Gzip a byte stream incrementally, emitting output roughly every flush_every bytes"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    pending = 0
+    for chunk in chunks:
+        pending += len(chunk)
+        data = compressor.compress(chunk)
+        if pending >= flush_every:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_files(queryset, export_format: str = 'ndjson', compress: bool = False,
+                 chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Byte stream of the queryset in the requested format"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    rows = iter_file_rows(queryset, chunk_size)
+    chunks = iter_ndjson(rows) if export_format == 'ndjson' else iter_csv(rows)
+    return iter_gzip(chunks) if compress else chunks
+
+
+def export_queryset():
+    """Base queryset for exports, in stable insertion order"""
+    return FileMetadata.objects.order_by('created_at', 'id')
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 import random
 import time
 import logging
@@ -10,6 +10,9 @@ logger = logging.getLogger(__name__)
 class HubSpotService(BaseCRMService):
     """Mock HubSpot CRM service for testing"""
     
+    # The associations batch-read endpoint lists files for many deals per call
+    FILES_BATCH_SIZE = 100
+    
     def __init__(self, api_key: str):
         super().__init__(api_key, "https://api.hubapi.com")
         self.name = "HubSpot"
@@ -35,7 +38,14 @@ class HubSpotService(BaseCRMService):
     def get_files_for_deal(self, deal_id: str) -> List[CRMFile]:
         """Mock files data for deals"""
         logger.info(f"Fetching files for deal {deal_id} from {self.name}")
-        
+        return self._mock_files(deal_id)
+    
+    def get_files_for_deals(self, deal_ids: List[str]) -> Dict[str, List[CRMFile]]:
+        """Mock files data for a batch of deals, as one associations batch read"""
+        logger.info(f"Fetching files for {len(deal_ids)} deals from {self.name}")
+        return {deal_id: self._mock_files(deal_id) for deal_id in deal_ids}
+    
+    def _mock_files(self, deal_id: str) -> List[CRMFile]:
         file_templates = [
             ("contract_v1.pdf", "pdf", 1024*500),  # 500KB
             ("proposal.docx", "docx", 1024*200),   # 200KB
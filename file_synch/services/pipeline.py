@@ -0,0 +1,177 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import copy_context
+from typing import Any, Callable, Dict, Iterable
+import threading
+import time
+
+
+class StageMeter:
+    """Items handled by one pipeline stage and the time it spent on them"""
+    
+    def __init__(self, unit: str):
+        self.unit = unit
+        self.items = 0
+        self.calls = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+    
+    def record(self, items: int, seconds: float):
+        with self._lock:
+            self.items += items
+            self.calls += 1
+            self.busy += seconds
+    
+    @contextmanager
+    def timed(self, items: int = 1):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(items, time.perf_counter() - started)
+    
+    def report(self) -> Dict[str, Any]:
+        return {
+            self.unit: self.items,
+            'seconds': round(self.busy, 3),
+            f'{self.unit}_per_second': round(self.items / self.busy, 1) if self.busy else None,
+        }
+
+
+class Prefetcher:
+    """Runs fetch(key) for each key on worker threads, ahead of the consumer.
+    
+    At most queue_size fetches are queued or done but not yet taken, so when
+    the consumer (the database writes) falls behind, fetching stops instead of
+    piling listings up in memory. take() hands results over in key order and
+    re-raises a failed fetch. With no workers, take() fetches inline.
+    """
+    
+    def __init__(self, fetch: Callable, keys: Iterable, workers: int, queue_size: int):
+        self.fetch = fetch
+        self.keys = iter(keys)
+        self.workers = max(workers, 0)
+        self.queue_size = max(queue_size, 1)
+        self.meter = StageMeter('deals')
+        self.pending = deque()
+        self.executor = None
+        self.waited = 0.0
+        self.depth_max = 0
+        self.depth_total = 0
+        self.takes = 0
+    
+    def __enter__(self):
+        if self.workers:
+            self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='crm-fetch')
+            self._fill()
+        return self
+    
+    def __exit__(self, *exc_info):
+        if self.executor:
+            # Fetches not yet started are dropped, e.g. when a sync pauses
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+    
+    def _timed_fetch(self, key):
+        with self.meter.timed(self.items_in(key)):
+            return self.fetch(key)
+    
+    def items_in(self, key) -> int:
+        return 1
+    
+    def _fill(self):
+        while len(self.pending) < self.queue_size:
+            key = next(self.keys, None)
+            if key is None:
+                return
+            # Each fetch gets a copy of the caller's context, so request
+            # metrics still count the CRM calls made on worker threads
+            future = self.executor.submit(copy_context().run, self._timed_fetch, key)
+            self.pending.append((key, future))
+    
+    def _skip_to(self, key):
+        """Drop the keys not yet submitted up to and including key, if key is among them"""
+        skipped = []
+        for upcoming in self.keys:
+            if upcoming == key:
+                return
+            skipped.append(upcoming)
+        self.keys = iter(skipped)
+    
+    def take(self, key):
+        """Fetched result for key, waiting for it if needed"""
+        if not self.executor:
+            return self._timed_fetch(key)
+        
+        # Drop fetches for keys the consumer skipped
+        while self.pending and self.pending[0][0] != key:
+            self.pending.popleft()[1].cancel()
+        if not self.pending:
+            # The consumer skipped past everything queued: fetch key inline
+            # and start prefetching the keys after it
+            self._skip_to(key)
+            try:
+                return self._timed_fetch(key)
+            finally:
+                self._fill()
+        
+        _, future = self.pending.popleft()
+        depth = future.done() + sum(pending.done() for _, pending in self.pending)
+        self.depth_max = max(self.depth_max, depth)
+        self.depth_total += depth
+        self.takes += 1
+        
+        started = time.perf_counter()
+        try:
+            return future.result()
+        finally:
+            self.waited += time.perf_counter() - started
+            self._fill()
+    
+    def report(self) -> Dict[str, Any]:
+        """Fetch throughput, and how full the queue of fetched listings ran"""
+        return {
+            **self.meter.report(),
+            'calls': self.meter.calls,
+            'workers': self.workers,
+            'queue_size': self.queue_size if self.workers else 0,
+            'queue_depth_max': self.depth_max,
+            'queue_depth_avg': round(self.depth_total / self.takes, 2) if self.takes else 0,
+            'consumer_wait_seconds': round(self.waited, 3),
+        }
+
+
+class ChunkedPrefetcher(Prefetcher):
+    """Prefetcher for fetches that serve several keys per call.
+    
+    Keys are fetched chunk_size at a time; fetch(chunk) returns {key: result}
+    and must have an entry for every key in the chunk. take() still hands
+    results over one key at a time, and a failed chunk fails each of its keys.
+    """
+    
+    def __init__(self, fetch: Callable, keys: Iterable, chunk_size: int, workers: int, queue_size: int):
+        keys = list(keys)
+        chunks = [tuple(keys[start:start + chunk_size]) for start in range(0, len(keys), chunk_size)]
+        super().__init__(fetch, chunks, workers, queue_size)
+        self.chunk_of = {key: chunk for chunk in chunks for key in chunk}
+        self.chunk = None
+        self.results = {}
+        self.error = None
+    
+    def items_in(self, key) -> int:
+        return len(key)
+    
+    def take(self, key):
+        chunk = self.chunk_of[key]
+        if chunk != self.chunk:
+            self.chunk, self.error = chunk, None
+            try:
+                self.results = super().take(chunk)
+            except Exception as e:
+                self.results, self.error = {}, e
+        if self.error is not None:
+            raise self.error
+        if key not in self.results:
+            raise LookupError(f'No listing returned for {key}')
+        return self.results[key]
@@ -0,0 +1,140 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from file_synch.models import AvailableFile, CRMAccount, CRMProvider
+from .crm_factory import CRMServiceFactory
+from .crm_providers import BaseCRMService
+from datetime import timedelta
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AvailableFilesSnapshot:
+    """Keeps a per-provider copy of the files the CRM currently offers, across its active accounts"""
+    
+    def __init__(self, crm_provider: CRMProvider, crm_service: Optional[BaseCRMService] = None):
+        self.crm_provider = crm_provider
+        self.crm_service = crm_service
+        
+        if not crm_service and crm_provider.name.lower() not in CRMServiceFactory.get_supported_providers():
+            raise ValueError(f"Unsupported CRM provider: {crm_provider.name}")
+    
+    @cached_property
+    def crm_services(self) -> List[Tuple[CRMAccount, BaseCRMService]]:
+        """One (account, service) pair per active account; looked up only when a refresh needs them"""
+        if self.crm_service:
+            return [(CRMAccount.default_for(self.crm_provider.pk), self.crm_service)]
+        return [
+            (crm_account, CRMServiceFactory.create_for_account(crm_account))
+            for crm_account in CRMAccount.active_for(self.crm_provider)
+        ]
+    
+    @property
+    def refreshed_at(self):
+        return self.crm_provider.available_files_refreshed_at
+    
+    def is_stale(self) -> bool:
+        """True when the snapshot is missing or older than AVAILABLE_FILES_TTL"""
+        if self.refreshed_at is None:
+            return True
+        return timezone.now() - self.refreshed_at > timedelta(seconds=settings.AVAILABLE_FILES_TTL)
+    
+    def refresh(self) -> int:
+        """List every deal's files from each account and swap them in as the new snapshot"""
+        logger.info(f"Refreshing available files snapshot for {self.crm_provider.name}")
+        rows = []
+        for crm_account, crm_service in self.crm_services:
+            rows.extend(self._list_files(crm_account, crm_service))
+        self._store(rows)
+        return len(rows)
+    
+    def _list_files(self, crm_account: CRMAccount, crm_service: BaseCRMService) -> List[AvailableFile]:
+        if not crm_service.authenticate():
+            raise PermissionError("CRM authentication failed")
+        
+        deals = {deal.deal_id: deal for deal in crm_service.get_deals()}
+        rows = []
+        # One call per deal, or per FILES_BATCH_SIZE deals where the CRM can batch
+        for chunk in crm_service.file_listing_chunks(list(deals)):
+            for deal_id, crm_files in crm_service.get_files_for_deals(chunk).items():
+                rows.extend(self._rows(crm_account, deals[deal_id], crm_files))
+        return rows
+    
+    async def arefresh(self) -> int:
+        """refresh() with the accounts, and each account's file listing calls, handled concurrently"""
+        logger.info(f"Refreshing available files snapshot for {self.crm_provider.name}")
+        crm_services = await sync_to_async(lambda: self.crm_services)()
+        rows = []
+        listings = (self._alist_files(crm_account, crm_service) for crm_account, crm_service in crm_services)
+        for account_rows in await asyncio.gather(*listings):
+            rows.extend(account_rows)
+        await sync_to_async(self._store)(rows)
+        return len(rows)
+    
+    async def _alist_files(self, crm_account: CRMAccount, crm_service: BaseCRMService) -> List[AvailableFile]:
+        # The CRM clients are blocking; run them on worker threads, off the event loop
+        if not await sync_to_async(crm_service.authenticate, thread_sensitive=False)():
+            raise PermissionError("CRM authentication failed")
+        
+        deals = await sync_to_async(crm_service.get_deals, thread_sensitive=False)()
+        deals = {deal.deal_id: deal for deal in deals}
+        # CRM_MAX_CONCURRENCY calls at a time per account
+        semaphore = asyncio.Semaphore(settings.CRM_MAX_CONCURRENCY)
+        get_files = sync_to_async(crm_service.get_files_for_deals, thread_sensitive=False)
+        
+        async def chunk_rows(chunk):
+            async with semaphore:
+                listings = await get_files(chunk)
+            return [row for deal_id, crm_files in listings.items() for row in self._rows(crm_account, deals[deal_id], crm_files)]
+        
+        rows = []
+        chunks = crm_service.file_listing_chunks(list(deals))
+        for batch in await asyncio.gather(*(chunk_rows(chunk) for chunk in chunks)):
+            rows.extend(batch)
+        return rows
+    
+    def _rows(self, crm_account, deal, crm_files):
+        return [AvailableFile(
+            crm_provider=self.crm_provider,
+            crm_account=crm_account,
+            crm_deal_id=deal.deal_id,
+            deal_name=deal.name,
+            crm_file_id=crm_file.file_id,
+            file_name=crm_file.name,
+            file_size=crm_file.size,
+            file_type=crm_file.file_type,
+        ) for crm_file in crm_files]
+    
+    def _store(self, rows):
+        refreshed_at = timezone.now()
+        # Readers see either the old snapshot or the new one, never a mix
+        with transaction.atomic():
+            AvailableFile.objects.filter(crm_provider=self.crm_provider).delete()
+            AvailableFile.objects.bulk_create(rows, ignore_conflicts=True)
+            CRMProvider.objects.filter(pk=self.crm_provider.pk).update(
+                available_files_refreshed_at=refreshed_at
+            )
+        self.crm_provider.available_files_refreshed_at = refreshed_at
+    
+    def refresh_in_background(self) -> bool:
+        """Queue a refresh unless one was queued within the last TTL"""
+        from file_synch.tasks import refresh_available_files_task
+        
+        lock_key = f'file_synch:available-files-refresh:{self.crm_provider.pk}'
+        if not cache.add(lock_key, True, settings.AVAILABLE_FILES_TTL):
+            return False
+        try:
+            refresh_available_files_task.delay(self.crm_provider.pk)
+        except Exception as e:
+            # Broker down: keep serving the stale snapshot, and let the next request try again
+            cache.delete(lock_key)
+            logger.error(f"Could not queue available files refresh for {self.crm_provider.name}: {str(e)}")
+            return False
+        return True
@@ -0,0 +1,182 @@
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from file_synch.models import CRMProvider, Deal, FileMetadata, FileStats
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FileStatsRecorder:
+    """Collects file_stats and deal/provider counter deltas during a sync and applies them in one pass"""
+    
+    def __init__(self, crm_provider: CRMProvider):
+        self.crm_provider = crm_provider
+        self.deltas = defaultdict(lambda: [0, 0])
+        self.deal_deltas = defaultdict(lambda: [0, 0])
+        self.deals_added = 0
+    
+    def add(self, deal_id: int, file_type: str, sync_status: str, size: int):
+        """Record a file entering the (file_type, sync_status) bucket"""
+        self._apply(deal_id, file_type, sync_status, 1, size or 0)
+    
+    def remove(self, deal_id: int, file_type: str, sync_status: str, size: int, count: int = 1):
+        """Record files (one by default) of total `size` leaving the (file_type, sync_status) bucket"""
+        self._apply(deal_id, file_type, sync_status, -count, -(size or 0))
+    
+    def add_deal(self):
+        """Record a newly created deal"""
+        self.deals_added += 1
+    
+    def remove_deals(self, count: int):
+        """Record deleted deals"""
+        self.deals_added -= count
+    
+    def _apply(self, deal_id, file_type, sync_status, count, size):
+        delta = self.deltas[(file_type, sync_status)]
+        delta[0] += count
+        delta[1] += size
+        deal_delta = self.deal_deltas[deal_id]
+        deal_delta[0] += count
+        deal_delta[1] += size
+    
+    def discard(self):
+        """Drop collected deltas whose writes were rolled back"""
+        self.discard_files()
+        self.deals_added = 0
+    
+    def discard_files(self):
+        """Drop only the file deltas, e.g. when a deal's file writes were rolled back but the deal was not"""
+        self.deltas.clear()
+        self.deal_deltas.clear()
+    
+    def flush(self):
+        """Apply the collected deltas to file_stats and the denormalized counters"""
+        pending = {key: delta for key, delta in self.deltas.items() if delta != [0, 0]}
+        deal_pending = {key: delta for key, delta in self.deal_deltas.items() if delta != [0, 0]}
+        deals_added = self.deals_added
+        self.discard()
+        if not pending and not deal_pending and not deals_added:
+            return
+        
+        with transaction.atomic():
+            for (file_type, sync_status), (count, size) in pending.items():
+                stats, _ = FileStats.objects.get_or_create(
+                    crm_provider=self.crm_provider,
+                    file_type=file_type,
+                    sync_status=sync_status,
+                )
+                FileStats.objects.filter(pk=stats.pk).update(
+                    file_count=F('file_count') + count,
+                    total_size=F('total_size') + size,
+                )
+            for deal_id, (count, size) in deal_pending.items():
+                Deal.objects.filter(pk=deal_id).update(
+                    files_count=F('files_count') + count,
+                    total_file_size=F('total_file_size') + size,
+                )
+            if deals_added:
+                CRMProvider.objects.filter(pk=self.crm_provider.pk).update(
+                    deals_count=F('deals_count') + deals_added,
+                )
+
+
+def _bump_data_generations(crm_provider: Optional[CRMProvider] = None):
+    """Invalidate cached responses and ETags after counters were rewritten without signals"""
+    providers = CRMProvider.objects.all()
+    if crm_provider:
+        providers = providers.filter(pk=crm_provider.pk)
+    providers.update(data_generation=F('data_generation') + 1)
+
+
+def rebuild_file_stats(crm_provider: Optional[CRMProvider] = None) -> int:
+    """Recompute file_stats from file_metadata; returns the number of buckets"""
+    files = FileMetadata.objects.all()
+    stats = FileStats.objects.all()
+    if crm_provider:
+        files = files.filter(crm_provider=crm_provider)
+        stats = stats.filter(crm_provider=crm_provider)
+    
+    rows = files.values('crm_provider_id', 'file_type', 'sync_status').annotate(
+        count=Count('id'),
+        size=Sum('file_size'),
+    ).order_by()
+    with transaction.atomic():
+        stats.delete()
+        _bump_data_generations(crm_provider)
+        FileStats.objects.bulk_create([
+            FileStats(
+                crm_provider_id=row['crm_provider_id'],
+                file_type=row['file_type'],
+                sync_status=row['sync_status'],
+                file_count=row['count'],
+                total_size=row['size'] or 0,
+            )
+            for row in rows
+        ])
+    return len(rows)
+
+
+def rebuild_counters(crm_provider: Optional[CRMProvider] = None) -> Dict[str, int]:
+    """Recompute deals_count, files_count and total_file_size with set-based UPDATEs"""
+    deals = Deal.objects.all()
+    providers = CRMProvider.objects.all()
+    if crm_provider:
+        deals = deals.filter(crm_provider=crm_provider)
+        providers = providers.filter(pk=crm_provider.pk)
+    
+    files = FileMetadata.objects.filter(deal=OuterRef('pk')).order_by().values('deal')
+    provider_deals = Deal.objects.filter(crm_provider=OuterRef('pk')).order_by().values('crm_provider')
+    with transaction.atomic():
+        deals_updated = deals.update(
+            files_count=Coalesce(Subquery(files.annotate(n=Count('id')).values('n')), Value(0)),
+            total_file_size=Coalesce(
+                Subquery(files.annotate(size=Sum('file_size')).values('size')),
+                Value(0),
+                output_field=IntegerField(),
+            ),
+        )
+        providers_updated = providers.update(
+            deals_count=Coalesce(Subquery(provider_deals.annotate(n=Count('id')).values('n')), Value(0)),
+        )
+        _bump_data_generations(crm_provider)
+    return {'deals': deals_updated, 'providers': providers_updated}
+
+
+def build_stats(rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fold (provider, file_type, sync_status, count, size) rows into the stats payload"""
+    stats = {
+        'total_files': 0,
+        'synced_files': 0,
+        'failed_files': 0,
+        'pending_files': 0,
+        'total_size_bytes': 0,
+        'files_by_type': {},
+        'files_by_crm': {},
+    }
+    by_type = defaultdict(int)
+    
+    for row in rows:
+        count = row['count']
+        if not count:
+            continue
+        stats['total_files'] += count
+        stats['total_size_bytes'] += row['size'] or 0
+        status_key = f"{row['sync_status']}_files"
+        if status_key in stats:
+            stats[status_key] += count
+        by_type[row['file_type']] += count
+        stats['files_by_crm'][row['provider']] = stats['files_by_crm'].get(row['provider'], 0) + count
+    
+    # Keep the FILE_TYPES order the endpoint has always used
+    for file_type, _ in FileMetadata.FILE_TYPES:
+        if by_type.get(file_type):
+            stats['files_by_type'][file_type] = by_type.pop(file_type)
+    stats['files_by_type'].update((key, value) for key, value in by_type.items() if value)
+    
+    # Calculate total size in MB
+    stats['total_size_mb'] = round(stats['total_size_bytes'] / (1024 * 1024), 2)
+    return stats
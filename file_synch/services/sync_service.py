@@ -1,92 +1,537 @@
-from CRM_Integration import settings
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Count, F, Q, Sum
 from django.utils import timezone
 
-from file_synch.models import CRMProvider, Deal, FileMetadata, SyncLog
+from file_synch.models import CRMAccount, CRMProvider, Deal, FileMetadata, SyncCheckpoint, SyncLog
+from file_synch.cache import bump_data_generation, generation_batch
+from .change_log_service import ChangeRecorder
+from .circuit_breaker import CRMUnavailable
 from .crm_factory import CRMServiceFactory
-from typing import List, Dict, Any
+from .crm_providers import BaseCRMService, CRMFileBatch
+from .pipeline import ChunkedPrefetcher, Prefetcher, StageMeter
+from .stats_service import FileStatsRecorder
+from typing import List, Dict, Any, Optional
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+STAMP_CHUNK_SIZE = 500  # ids per UPDATE, under SQLite's bound parameter limit
+
 class FileSyncService:
-    """Service for synchronizing files from CRM to database"""
+    """Service for synchronizing one CRM account's files to the database"""
     
-    def __init__(self, crm_provider: CRMProvider):
+    def __init__(self, crm_provider: CRMProvider, crm_service: Optional[BaseCRMService] = None,
+                 crm_account: Optional[CRMAccount] = None):
         self.crm_provider = crm_provider
+        # Without an account, the provider's default one, keyed from settings
+        self.crm_account = crm_account or CRMAccount.default_for(crm_provider.pk)
+        if self.crm_account.crm_provider_id != crm_provider.pk:
+            raise ValueError(f"Account {self.crm_account.name} does not belong to {crm_provider.name}")
+        self.crm_account.crm_provider = crm_provider  # logs name the account, and so its provider
         
-        api_key = settings.CRM_API_KEY 
-        self.crm_service = CRMServiceFactory.create_service(
-            crm_provider.name.lower(),
-            api_key  # Mock API key for demo
-        )
+        self.crm_service = crm_service or CRMServiceFactory.create_for_account(self.crm_account)
         
         if not self.crm_service:
             raise ValueError(f"Unsupported CRM provider: {crm_provider.name}")
+        
+        self.stats = FileStatsRecorder(crm_provider)
+        self.changes = ChangeRecorder(crm_provider)
+        self.generation = self.crm_account.sync_generation
+        self._seen_files = []
+        self._seen_deals = []
+        self.meters = {'diff': StageMeter('files'), 'write': StageMeter('files')}
     
-    def sync_all_files(self) -> Dict[str, Any]:
-        """Sync all files from CRM"""
-        logger.info(f"Starting full sync for {self.crm_provider.name}")
+    def sync_all_files(self, time_budget: Optional[float] = None, resume: bool = True,
+                       sweep_max_fraction: Optional[float] = None, verify: bool = False) -> Dict[str, Any]:
+        """Sync all files from CRM, resuming from the last saved checkpoint.
         
-        try:
-            # Authenticate with CRM
-            if not self.crm_service.authenticate():
-                raise Exception("CRM authentication failed")
-            
-            # Get all deals
-            crm_deals = self.crm_service.get_deals()
-            
-            results = {
-                'deals_processed': 0,
-                'files_synced': 0,
-                'files_updated': 0,
-                'files_failed': 0,
-                'errors': []
-            }
-            
-            for crm_deal in crm_deals:
-                try:
-                    # Create or update deal
-                    deal, created = Deal.objects.get_or_create(
-                        crm_provider=self.crm_provider,
-                        crm_deal_id=crm_deal.deal_id,
-                        defaults={
-                            'deal_name': crm_deal.name,
-                            'deal_amount': crm_deal.amount,
-                            'deal_stage': crm_deal.stage,
-                        }
+        A completed sync then deletes the provider's deals and files the CRM no
+        longer lists, unless more than sweep_max_fraction of them would go.
+        Deals whose files are unchanged since they were last written are
+        skipped; verify lists and diffs every deal regardless.
+        """
+        logger.info(f"Starting full sync for {self.crm_account}")
+        started = time.monotonic()
+        
+        with generation_batch(self.crm_provider.pk):
+            try:
+                # Authenticate with CRM
+                if not self.crm_service.authenticate():
+                    raise Exception("CRM authentication failed")
+                
+                # Get all deals
+                crm_deals = self.crm_service.get_deals()
+                
+                results = {
+                    'deals_processed': 0,
+                    'deals_skipped': 0,
+                    'files_synced': 0,
+                    'files_updated': 0,
+                    'files_failed': 0,
+                    'errors': [],
+                    'completed': False,
+                    'resumed_from': None,
+                }
+                
+                checkpoint = self._get_checkpoint() if resume else None
+                start_index = 0
+                if checkpoint:
+                    start_index = self._resume_index(crm_deals, checkpoint)
+                    results.update(checkpoint.results)
+                    results['resumed_from'] = checkpoint.last_deal_id
+                    logger.info(
+                        f"Resuming {self.crm_account} sync after deal {checkpoint.last_deal_id} "
+                        f"({start_index}/{len(crm_deals)} deals done)"
                     )
-                    
-                    if not created:
-                        # Update existing deal
-                        deal.deal_name = crm_deal.name
-                        deal.deal_amount = crm_deal.amount
-                        deal.deal_stage = crm_deal.stage
-                        deal.save()
-                    
-                    results['deals_processed'] += 1
-                    
-                    # Get files for this deal
-                    crm_files = self.crm_service.get_files_for_deal(crm_deal.deal_id)
-                    
-                    for crm_file in crm_files:
-                        file_result = self._sync_file(deal, crm_file)
-                        results[f"files_{file_result}"] += 1
+                elif not resume:
+                    self._clear_checkpoint()
+                self.generation = self._start_generation(resuming=checkpoint is not None)
+                
+                batch_size = max(settings.SYNC_BATCH_SIZE, 1)
+                if verify:
+                    Deal.objects.filter(crm_account=self.crm_account).update(files_digest='', files_marker='')
+                unchanged = self._unchanged_deals(crm_deals[start_index:])
+                # File listings are fetched on worker threads while this thread
+                # diffs and writes earlier deals; see Prefetcher for the bound
+                listings = self._listings(
+                    [crm_deal.deal_id for crm_deal in crm_deals[start_index:] if crm_deal.deal_id not in unchanged],
+                    workers=settings.SYNC_FETCH_WORKERS,
+                )
+                with listings:
+                    for batch_start in range(start_index, len(crm_deals), batch_size):
+                        batch = crm_deals[batch_start:batch_start + batch_size]
+                        for crm_deal in batch:
+                            self._sync_deal(crm_deal, results, listings, unchanged=crm_deal.deal_id in unchanged)
                         
-                except Exception as e:
-                    error_msg = f"Error processing deal {crm_deal.deal_id}: {str(e)}"
-                    logger.error(error_msg)
-                    results['errors'].append(error_msg)
-                    self._log_sync_error(error_msg)
+                        deals_completed = batch_start + len(batch)
+                        with transaction.atomic():
+                            self._stamp_seen(batch)
+                            self._save_checkpoint(batch[-1].deal_id, deals_completed, results)
+                            # The batch's deals are committed: cached responses
+                            # stay at most one checkpoint behind them
+                            bump_data_generation(self.crm_provider.pk)
+                        
+                        out_of_time = time_budget and time.monotonic() - started >= time_budget
+                        if out_of_time and deals_completed < len(crm_deals):
+                            self._report_pipeline(listings, results)
+                            self._log_sync_info(
+                                f"Sync paused at checkpoint after deal {batch[-1].deal_id} "
+                                f"({deals_completed}/{len(crm_deals)} deals). Results: {results}"
+                            )
+                            return results
+                
+                self._report_pipeline(listings, results)
+                results['sweep'] = self._sweep(results, sweep_max_fraction)
+                self._clear_checkpoint()
+                results['completed'] = True
+                self._log_sync_info(f"Sync completed. Results: {results}")
+                return results
             
-            self._log_sync_info(f"Sync completed. Results: {results}")
-            return results
+            except Exception as e:
+                error_msg = f"Sync failed: {str(e)}"
+                logger.error(error_msg)
+                self._log_sync_error(error_msg)
+                raise
+    
+    def _sync_deal(self, crm_deal, results: Dict[str, Any], listings: Optional[Prefetcher] = None,
+                   prune: bool = False, unchanged: bool = False):
+        """Sync a single deal and its files, recording the outcome in results.
+        
+        With prune, the deal's files missing from its CRM listing are deleted.
+        An unchanged deal's files are kept as they are, without listing them.
+        """
+        try:
+            deal = self._upsert_deal(crm_deal)
+            results['deals_processed'] += 1
+            if unchanged:
+                self._seen_deals.append(deal.pk)
+                results['deals_skipped'] += 1
+                return
             
+            # Get files for this deal, as columns rather than one object per file
+            if listings:
+                crm_files = listings.take(crm_deal.deal_id)
+            else:
+                crm_files = self.crm_service.get_file_batch_for_deal(crm_deal.deal_id)
+            self._sync_deal_files(deal, crm_files, results, self.crm_service.get_files_marker(crm_deal))
+            if prune:
+                results['files_removed'] += self._prune_files(deal, crm_files)
+        
+        except CRMUnavailable:
+            # Every later deal would fail the same way: stop the sync instead
+            raise
         except Exception as e:
-            error_msg = f"Sync failed: {str(e)}"
+            error_msg = f"Error processing deal {crm_deal.deal_id}: {str(e)}"
             logger.error(error_msg)
+            results['errors'].append(error_msg)
             self._log_sync_error(error_msg)
-            raise
+        finally:
+            self.stats.flush()
+            self.changes.flush()
+    
+    def _unchanged_deals(self, crm_deals: list) -> set:
+        """Ids of the deals whose files marker matches the one stored with their last complete listing"""
+        markers = {crm_deal.deal_id: self.crm_service.get_files_marker(crm_deal) for crm_deal in crm_deals}
+        if not any(markers.values()):
+            return set()
+        stored = Deal.objects.filter(crm_account=self.crm_account).exclude(files_digest='').values_list(
+            'crm_deal_id', 'files_marker',
+        )
+        return {deal_id for deal_id, marker in stored.iterator() if marker and markers.get(deal_id) == marker}
+    
+    def _listings(self, deal_ids: List[str], workers: int) -> Prefetcher:
+        """Prefetcher for these deals' file listings, batched when the provider can list many deals per call"""
+        if self.crm_service.FILES_BATCH_SIZE:
+            return ChunkedPrefetcher(
+                self.crm_service.get_file_batches_for_deals,
+                deal_ids,
+                chunk_size=self.crm_service.FILES_BATCH_SIZE,
+                workers=workers,
+                queue_size=settings.SYNC_FETCH_QUEUE_SIZE,
+            )
+        return Prefetcher(
+            self.crm_service.get_file_batch_for_deal,
+            deal_ids,
+            workers=workers,
+            queue_size=settings.SYNC_FETCH_QUEUE_SIZE,
+        )
+    
+    def _upsert_deal(self, crm_deal) -> Deal:
+        """Create the deal or update it when the CRM copy changed"""
+        deal, created = Deal.objects.get_or_create(
+            crm_account=self.crm_account,
+            crm_deal_id=crm_deal.deal_id,
+            defaults={
+                'crm_provider': self.crm_provider,
+                'deal_name': crm_deal.name,
+                'deal_amount': crm_deal.amount,
+                'deal_stage': crm_deal.stage,
+                'seen_generation': self.generation,
+            }
+        )
+        
+        if created:
+            self.stats.add_deal()
+            self.changes.record('deal', 'created', deal.pk, deal.crm_deal_id)
+        elif (deal.deal_name, deal.deal_amount, deal.deal_stage) != (crm_deal.name, crm_deal.amount, crm_deal.stage):
+            # Update existing deal
+            deal.deal_name = crm_deal.name
+            deal.deal_amount = crm_deal.amount
+            deal.deal_stage = crm_deal.stage
+            deal.save(update_fields=['deal_name', 'deal_amount', 'deal_stage', 'updated_at'])
+            self.changes.record('deal', 'updated', deal.pk, deal.crm_deal_id)
+        return deal
+    
+    def _sync_deal_files(self, deal: Deal, crm_files: CRMFileBatch, results: Dict[str, Any], marker: str = ''):
+        """Write a deal's files in bulk, falling back to one file at a time on error.
+        
+        A listing whose digest is the one stored on the deal was written in
+        full before, and its rows are only stamped as seen.
+        """
+        digest = crm_files.digest()
+        if digest == deal.files_digest:
+            self._seen_deals.append(deal.pk)
+            self._store_digest(deal, digest, marker)
+            results['files_synced'] += len(crm_files)
+            return
+        
+        try:
+            # Diff before opening the transaction, so the write lock (taken at
+            # BEGIN IMMEDIATE on SQLite) is only held for the writes themselves
+            with self.meters['diff'].timed(len(crm_files)):
+                to_create, to_update, complete = self._diff_deal_files(deal, crm_files)
+            with self.meters['write'].timed(len(to_create) + len(to_update)):
+                with transaction.atomic():
+                    self._write_deal_files(to_create, to_update)
+                    # Rows the listing dropped are left for the sweep; until
+                    # then the rows are not this listing, so no digest
+                    self._store_digest(deal, digest if complete else '', marker if complete else '')
+                    self.changes.flush()
+                    self.stats.flush()
+        except Exception as e:
+            # The deal row was committed by _upsert_deal: keep its delta
+            self.stats.discard_files()
+            logger.warning(f"Bulk write failed for deal {deal.crm_deal_id}, retrying per file: {str(e)}")
+            for crm_file in crm_files:
+                file_result = self._sync_file(deal, crm_file)
+                results[f"files_{file_result}"] += 1
+            return
+        
+        results['files_synced'] += len(crm_files) - len(to_update)
+        results['files_updated'] += len(to_update)
+    
+    def _diff_deal_files(self, deal: Deal, crm_files: CRMFileBatch):
+        """Diff CRM files against stored rows with one query.
+        
+        Returns (to_create, to_update, complete); complete is False when the
+        deal has rows the listing does not.
+        """
+        existing = {
+            file_metadata.crm_file_id: file_metadata
+            for file_metadata in FileMetadata.objects.filter(deal=deal)
+        }
+        now = timezone.now()
+        to_create, to_update = [], []
+        
+        for file_id, name, size, file_type, url in crm_files.rows():
+            file_metadata = existing.get(file_id)
+            if file_metadata is None:
+                to_create.append(FileMetadata(
+                    deal=deal,
+                    crm_provider_id=deal.crm_provider_id,
+                    crm_file_id=file_id,
+                    file_name=name,
+                    file_size=size,
+                    file_type=file_type,
+                    file_url=url,
+                    sync_status='synced',
+                    sync_timestamp=now,
+                    seen_generation=self.generation,
+                ))
+                self.stats.add(deal.pk, file_type, 'synced', size)
+                continue
+            
+            if (file_metadata.file_name, file_metadata.file_size, file_metadata.file_url) == (name, size, url):
+                self._seen_files.append(file_metadata.pk)
+                continue  # No changes needed
+            
+            self.stats.remove(deal.pk, file_metadata.file_type, file_metadata.sync_status, file_metadata.file_size)
+            file_metadata.file_name = name
+            file_metadata.file_size = size
+            file_metadata.file_url = url
+            file_metadata.sync_status = 'synced'
+            file_metadata.sync_timestamp = now
+            file_metadata.updated_at = now
+            file_metadata.seen_generation = self.generation
+            to_update.append(file_metadata)
+            self.stats.add(deal.pk, file_metadata.file_type, 'synced', file_metadata.file_size)
+        
+        return to_create, to_update, existing.keys() <= set(crm_files.file_ids)
+    
+    def _store_digest(self, deal: Deal, digest: str, marker: str):
+        if (deal.files_digest, deal.files_marker) != (digest, marker):
+            Deal.objects.filter(pk=deal.pk).update(files_digest=digest, files_marker=marker)
+            deal.files_digest, deal.files_marker = digest, marker
+    
+    def _write_deal_files(self, to_create: list, to_update: list):
+        """Write a deal's new and changed files in bulk"""
+        FileMetadata.objects.bulk_create(to_create)
+        FileMetadata.objects.bulk_update(
+            to_update,
+            ['file_name', 'file_size', 'file_url', 'sync_status', 'sync_timestamp', 'updated_at', 'seen_generation'],
+        )
+        for action, written in (('created', to_create), ('updated', to_update)):
+            for file_metadata in written:
+                self.changes.record('file', action, file_metadata.pk, file_metadata.crm_file_id)
+    
+    def _report_pipeline(self, listings: Prefetcher, results: Dict[str, Any]):
+        """Add per-stage throughput to results and log it"""
+        fetch, diff, write = listings.report(), self.meters['diff'].report(), self.meters['write'].report()
+        results['pipeline'] = {'fetch': fetch, 'diff': diff, 'write': write}
+        logger.info(
+            f"{self.crm_account} sync pipeline: fetched {fetch['deals']} deals ({fetch['calls']} calls) in {fetch['seconds']}s, "
+            f"diffed {diff['files']} files in {diff['seconds']}s, wrote {write['files']} files in {write['seconds']}s; "
+            f"fetch queue depth max {fetch['queue_depth_max']}/{fetch['queue_size']}, "
+            f"avg {fetch['queue_depth_avg']}, waited {fetch['consumer_wait_seconds']}s for listings"
+        )
+    
+    def _start_generation(self, resuming: bool) -> int:
+        """Generation this full sync stamps on what it sees; a resumed sync continues its own"""
+        accounts = CRMAccount.objects.filter(pk=self.crm_account.pk)
+        if not resuming:
+            accounts.update(sync_generation=F('sync_generation') + 1)
+        return accounts.values_list('sync_generation', flat=True).get()
+    
+    def _stamp_seen(self, crm_deals: list):
+        """Stamp a batch's deals, and the files it found unchanged, with this sync's generation"""
+        Deal.objects.filter(
+            crm_account=self.crm_account,
+            crm_deal_id__in=[crm_deal.deal_id for crm_deal in crm_deals],
+        ).update(seen_generation=self.generation)
+        self._stamp_files()
+    
+    def _stamp_files(self):
+        seen, self._seen_files = self._seen_files, []
+        for start in range(0, len(seen), STAMP_CHUNK_SIZE):
+            FileMetadata.objects.filter(pk__in=seen[start:start + STAMP_CHUNK_SIZE]).update(
+                seen_generation=self.generation,
+            )
+        # Deals whose files were skipped as unchanged: stamp all their rows
+        deals, self._seen_deals = self._seen_deals, []
+        for start in range(0, len(deals), STAMP_CHUNK_SIZE):
+            FileMetadata.objects.filter(deal_id__in=deals[start:start + STAMP_CHUNK_SIZE]).update(
+                seen_generation=self.generation,
+            )
+    
+    def _sweep(self, results: Dict[str, Any], max_fraction: Optional[float] = None) -> Dict[str, Any]:
+        """Delete the deals and files this sync's generation did not see, in one DELETE each"""
+        sweep = {'deals_removed': 0, 'files_removed': 0, 'skipped': None}
+        if results['errors']:
+            # A deal whose files could not be listed was not stamped
+            sweep['skipped'] = f"{len(results['errors'])} error(s) during sync"
+            return sweep
+        
+        if max_fraction is None:
+            max_fraction = settings.SYNC_SWEEP_MAX_FRACTION
+        unseen = Q(seen_generation__lt=self.generation)
+        stale_deals = Deal.objects.filter(unseen, crm_account=self.crm_account)
+        stale_files = FileMetadata.objects.filter(
+            unseen | Q(deal__seen_generation__lt=self.generation),
+            crm_provider=self.crm_provider,
+            deal__crm_account=self.crm_account,
+        )
+        deals = Deal.objects.filter(crm_account=self.crm_account).aggregate(
+            total=Count('pk'), stale=Count('pk', filter=unseen),
+        )
+        files = FileMetadata.objects.filter(
+            crm_provider=self.crm_provider, deal__crm_account=self.crm_account,
+        ).aggregate(
+            total=Count('pk'),
+            stale=Count('pk', filter=unseen | Q(deal__seen_generation__lt=self.generation)),
+        )
+        if not deals['stale'] and not files['stale']:
+            return sweep
+        
+        for kind, counts in (('deals', deals), ('files', files)):
+            if counts['stale'] > max_fraction * counts['total']:
+                sweep['skipped'] = (
+                    f"would remove {counts['stale']} of {counts['total']} {kind}, "
+                    f"more than the {max_fraction:.0%} limit"
+                )
+                self._log_sync_warning(f"Sweep skipped: {sweep['skipped']}")
+                return sweep
+        
+        removed = self._delete_rows(stale_files, stale_deals)
+        sweep['files_removed'], sweep['deals_removed'] = removed['files'], removed['deals']
+        
+        logger.info(
+            f"Swept {sweep['deals_removed']} deal(s) and {sweep['files_removed']} file(s) "
+            f"no longer in {self.crm_account}"
+        )
+        return sweep
+    
+    def _delete_rows(self, stale_files, stale_deals=None) -> Dict[str, int]:
+        """Delete files, and optionally deals, with one DELETE each, keeping stats and the change log in step"""
+        removed = {'files': 0, 'deals': 0}
+        with transaction.atomic():
+            for row in stale_files.values('deal_id', 'file_type', 'sync_status').annotate(
+                count=Count('pk'), size=Sum('file_size'),
+            ).order_by():
+                self.stats.remove(row['deal_id'], row['file_type'], row['sync_status'], row['size'], row['count'])
+            stale = [('file', stale_files.values_list('pk', 'crm_file_id'))]
+            if stale_deals is not None:
+                stale.append(('deal', stale_deals.values_list('pk', 'crm_deal_id')))
+            for entity, rows in stale:
+                for object_id, crm_id in rows.iterator():
+                    self.changes.record(entity, 'deleted', object_id, crm_id)
+            # _raw_delete skips the deletion collector, which would load every
+            # row to send post_delete: nothing cascades from these rows (sync
+            # logs keep their ids) and generation_batch invalidates the cache
+            removed['files'] = stale_files._raw_delete(stale_files.db)
+            if stale_deals is not None:
+                removed['deals'] = stale_deals._raw_delete(stale_deals.db)
+                self.stats.remove_deals(removed['deals'])
+            self.stats.flush()
+            self.changes.flush()
+        return removed
+    
+    def _prune_files(self, deal: Deal, crm_files: CRMFileBatch) -> int:
+        """Delete the deal's files that are missing from its CRM listing"""
+        listed = set(crm_files.file_ids)
+        stale = [
+            pk for pk, crm_file_id in FileMetadata.objects.filter(deal=deal).values_list('pk', 'crm_file_id')
+            if crm_file_id not in listed
+        ]
+        removed = 0
+        for start in range(0, len(stale), STAMP_CHUNK_SIZE):
+            chunk = FileMetadata.objects.filter(pk__in=stale[start:start + STAMP_CHUNK_SIZE])
+            removed += self._delete_rows(chunk)['files']
+        return removed
+    
+    def _get_checkpoint(self) -> Optional[SyncCheckpoint]:
+        """Return the saved checkpoint of an unfinished full sync, if any"""
+        return SyncCheckpoint.objects.filter(crm_account=self.crm_account).first()
+    
+    def _resume_index(self, crm_deals: list, checkpoint: SyncCheckpoint) -> int:
+        """Position in crm_deals right after the last checkpointed deal"""
+        for index, crm_deal in enumerate(crm_deals):
+            if crm_deal.deal_id == checkpoint.last_deal_id:
+                return index + 1
+        # The checkpointed deal is gone from the CRM; fall back to the count
+        return min(checkpoint.deals_completed, len(crm_deals))
+    
+    def _save_checkpoint(self, last_deal_id: str, deals_completed: int, results: Dict[str, Any]):
+        """Persist progress so an interrupted sync can pick up from here"""
+        SyncCheckpoint.objects.update_or_create(
+            crm_account=self.crm_account,
+            defaults={
+                'crm_provider': self.crm_provider,
+                'last_deal_id': last_deal_id,
+                'deals_completed': deals_completed,
+                'results': {key: value for key, value in results.items()
+                            if key not in ('completed', 'resumed_from', 'pipeline')},
+            }
+        )
+    
+    def _clear_checkpoint(self):
+        """Forget saved progress once a full sync has finished"""
+        SyncCheckpoint.objects.filter(crm_account=self.crm_account).delete()
+    
+    def sync_deals(self, deal_ids: List[str]) -> Dict[str, Any]:
+        """Sync only these deals, e.g. the ones CRM webhooks reported changed.
+        
+        Deals the CRM no longer has are deleted with their files, as are files
+        missing from a synced deal's listing.
+        """
+        logger.info(f"Starting targeted sync of {len(deal_ids)} deal(s) for {self.crm_account}")
+        
+        results = {
+            'deals_processed': 0,
+            'deals_removed': 0,
+            'files_synced': 0,
+            'files_updated': 0,
+            'files_removed': 0,
+            'files_failed': 0,
+            'errors': [],
+        }
+        
+        with generation_batch(self.crm_provider.pk):
+            try:
+                if not self.crm_service.authenticate():
+                    raise Exception("CRM authentication failed")
+                
+                # Stamp with the current generation, so a full sync already
+                # under way does not sweep what this one writes
+                self.generation = self._start_generation(resuming=True)
+                crm_deals = self.crm_service.get_deals_by_id(deal_ids)
+                found = [deal_id for deal_id in deal_ids if deal_id in crm_deals]
+                with self._listings(found, workers=0) as listings:
+                    for deal_id in found:
+                        self._sync_deal(crm_deals[deal_id], results, listings, prune=True)
+                self._stamp_seen(list(crm_deals.values()))
+                
+                gone = [deal_id for deal_id in deal_ids if deal_id not in crm_deals]
+                if gone:
+                    removed = self._delete_rows(
+                        FileMetadata.objects.filter(
+                            crm_provider=self.crm_provider, deal__crm_account=self.crm_account,
+                            deal__crm_deal_id__in=gone,
+                        ),
+                        Deal.objects.filter(crm_account=self.crm_account, crm_deal_id__in=gone),
+                    )
+                    results['files_removed'] += removed['files']
+                    results['deals_removed'] += removed['deals']
+                
+                self._log_sync_info(f"Targeted sync completed. Results: {results}")
+                return results
+            
+            except Exception as e:
+                error_msg = f"Targeted sync failed: {str(e)}"
+                logger.error(error_msg)
+                self._log_sync_error(error_msg)
+                raise
     
     def sync_specific_files(self, file_ids: List[str]) -> Dict[str, Any]:
         """Sync specific files by their CRM file IDs"""
@@ -99,91 +544,52 @@ class FileSyncService:
             'errors': []
         }
         
-        try:
-            if not self.crm_service.authenticate():
-                raise Exception("CRM authentication failed")
-            
-            # Get all deals first
-            crm_deals = self.crm_service.get_deals()
-            
-            for crm_deal in crm_deals:
-                crm_files = self.crm_service.get_files_for_deal(crm_deal.deal_id)
+        with generation_batch(self.crm_provider.pk):
+            try:
+                if not self.crm_service.authenticate():
+                    raise Exception("CRM authentication failed")
                 
-                for crm_file in crm_files:
-                    if crm_file.file_id in file_ids:
-                        try:
-                            # Ensure deal exists
-                            deal, _ = Deal.objects.get_or_create(
-                                crm_provider=self.crm_provider,
-                                crm_deal_id=crm_deal.deal_id,
-                                defaults={
-                                    'deal_name': crm_deal.name,
-                                    'deal_amount': crm_deal.amount,
-                                    'deal_stage': crm_deal.stage,
-                                }
-                            )
-                            
-                            file_result = self._sync_file(deal, crm_file)
-                            results[f"files_{file_result}"] += 1
-                            
-                        except Exception as e:
-                            error_msg = f"Error syncing file {crm_file.file_id}: {str(e)}"
-                            logger.error(error_msg)
-                            results['errors'].append(error_msg)
-                            results['files_failed'] += 1
-            
-            return results
+                # Get all deals first
+                crm_deals = {crm_deal.deal_id: crm_deal for crm_deal in self.crm_service.get_deals()}
+                
+                for chunk in self.crm_service.file_listing_chunks(list(crm_deals)):
+                    for deal_id, crm_files in self.crm_service.get_files_for_deals(chunk).items():
+                        for crm_file in crm_files:
+                            if crm_file.file_id in file_ids:
+                                try:
+                                    # Ensure deal exists
+                                    deal = self._upsert_deal(crm_deals[deal_id])
+                                    
+                                    file_result = self._sync_file(deal, crm_file)
+                                    results[f"files_{file_result}"] += 1
+                                
+                                except Exception as e:
+                                    error_msg = f"Error syncing file {crm_file.file_id}: {str(e)}"
+                                    logger.error(error_msg)
+                                    results['errors'].append(error_msg)
+                                    results['files_failed'] += 1
+                
+                self._stamp_files()
+                self.stats.flush()
+                self.changes.flush()
+                return results
             
-        except Exception as e:
-            error_msg = f"Selective sync failed: {str(e)}"
-            logger.error(error_msg)
-            self._log_sync_error(error_msg)
-            raise
+            except Exception as e:
+                error_msg = f"Selective sync failed: {str(e)}"
+                logger.error(error_msg)
+                self._log_sync_error(error_msg)
+                raise
     
-    @transaction.atomic
     def _sync_file(self, deal: Deal, crm_file) -> str:
         """Sync individual file"""
+        # The deal's rows no longer match a whole listing
+        self._store_digest(deal, '', '')
         try:
-            # Check if file already exists
-            file_metadata, created = FileMetadata.objects.get_or_create(
-                deal=deal,
-                crm_file_id=crm_file.file_id,
-                defaults={
-                    'file_name': crm_file.name,
-                    'file_size': crm_file.size,
-                    'file_type': crm_file.file_type,
-                    'file_url': crm_file.url,
-                    'sync_status': 'synced',
-                    'sync_timestamp': timezone.now(),
-                }
-            )
-            
-            if not created:
-                # Update existing file if changed
-                updated = False
-                if file_metadata.file_name != crm_file.name:
-                    file_metadata.file_name = crm_file.name
-                    updated = True
-                if file_metadata.file_size != crm_file.size:
-                    file_metadata.file_size = crm_file.size
-                    updated = True
-                if file_metadata.file_url != crm_file.url:
-                    file_metadata.file_url = crm_file.url
-                    updated = True
-                
-                if updated:
-                    file_metadata.sync_status = 'synced'
-                    file_metadata.sync_timestamp = timezone.now()
-                    file_metadata.save()
-                    return 'updated'
-                
-                return 'synced'  # No changes needed
-            
-            return 'synced'
-            
+            with transaction.atomic():
+                return self._write_file(deal, crm_file)
         except Exception as e:
-            # Mark file as failed
-            file_metadata, _ = FileMetadata.objects.get_or_create(
+            # Mark file as failed, outside the rolled-back atomic block
+            file_metadata, created = FileMetadata.objects.get_or_create(
                 deal=deal,
                 crm_file_id=crm_file.file_id,
                 defaults={
@@ -192,8 +598,16 @@ class FileSyncService:
                     'file_type': crm_file.file_type,
                     'file_url': crm_file.url,
                     'sync_status': 'failed',
+                    'seen_generation': self.generation,
                 }
             )
+            if created:
+                self.stats.add(deal.pk, file_metadata.file_type, 'failed', file_metadata.file_size)
+                self.changes.record('file', 'created', file_metadata.pk, file_metadata.crm_file_id)
+            elif file_metadata.sync_status != 'failed':
+                self.stats.remove(deal.pk, file_metadata.file_type, file_metadata.sync_status, file_metadata.file_size)
+                self.stats.add(deal.pk, file_metadata.file_type, 'failed', file_metadata.file_size)
+                self.changes.record('file', 'updated', file_metadata.pk, file_metadata.crm_file_id)
             file_metadata.sync_status = 'failed'
             file_metadata.save()
             
@@ -201,6 +615,55 @@ class FileSyncService:
             self._log_sync_error(error_msg, file_metadata)
             raise Exception(error_msg)
     
+    def _write_file(self, deal: Deal, crm_file) -> str:
+        """Create or update the metadata row for a CRM file"""
+        # Check if file already exists
+        file_metadata, created = FileMetadata.objects.get_or_create(
+            deal=deal,
+            crm_file_id=crm_file.file_id,
+            defaults={
+                'file_name': crm_file.name,
+                'file_size': crm_file.size,
+                'file_type': crm_file.file_type,
+                'file_url': crm_file.url,
+                'sync_status': 'synced',
+                'sync_timestamp': timezone.now(),
+                'seen_generation': self.generation,
+            }
+        )
+        
+        if created:
+            self.stats.add(deal.pk, file_metadata.file_type, 'synced', file_metadata.file_size)
+            self.changes.record('file', 'created', file_metadata.pk, file_metadata.crm_file_id)
+        else:
+            # Update existing file if changed
+            previous = (deal.pk, file_metadata.file_type, file_metadata.sync_status, file_metadata.file_size)
+            updated = False
+            if file_metadata.file_name != crm_file.name:
+                file_metadata.file_name = crm_file.name
+                updated = True
+            if file_metadata.file_size != crm_file.size:
+                file_metadata.file_size = crm_file.size
+                updated = True
+            if file_metadata.file_url != crm_file.url:
+                file_metadata.file_url = crm_file.url
+                updated = True
+            
+            if updated:
+                file_metadata.sync_status = 'synced'
+                file_metadata.sync_timestamp = timezone.now()
+                file_metadata.seen_generation = self.generation
+                file_metadata.save()
+                self.stats.remove(*previous)
+                self.stats.add(deal.pk, file_metadata.file_type, 'synced', file_metadata.file_size)
+                self.changes.record('file', 'updated', file_metadata.pk, file_metadata.crm_file_id)
+                return 'updated'
+            
+            self._seen_files.append(file_metadata.pk)
+            return 'synced'  # No changes needed
+        
+        return 'synced'
+    
     def _log_sync_info(self, message: str):
         """Log sync information"""
         SyncLog.objects.create(
@@ -209,6 +672,14 @@ class FileSyncService:
             message=message
         )
     
+    def _log_sync_warning(self, message: str):
+        """Log sync warning"""
+        SyncLog.objects.create(
+            crm_provider=self.crm_provider,
+            level='warning',
+            message=message
+        )
+    
     def _log_sync_error(self, message: str, file_metadata=None):
         """Log sync error"""
         SyncLog.objects.create(
@@ -0,0 +1,207 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from file_synch.models import CRMAccount, CRMProvider, Deal, PendingDealSync
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+CLAIM_SIZE = 500  # deals per targeted sync; the rest go in the next one
+
+
+class InvalidWebhook(ValueError):
+    """Raised when a webhook body is not a notification we understand"""
+
+
+class BaseWebhook(ABC):
+    """Checks a CRM's notification requests and extracts the deals they touch"""
+    
+    @abstractmethod
+    def parse(self, request) -> List[str]:
+        """Deal ids the notification is about; PermissionError if it fails validation"""
+        pass
+    
+    @staticmethod
+    def load(body: bytes) -> Any:
+        try:
+            return json.loads(body)
+        except ValueError:
+            raise InvalidWebhook('Invalid JSON in request body')
+
+
+class HubSpotWebhook(BaseWebhook):
+    """HubSpot webhook subscriptions, signed with the app's client secret (signature v3)"""
+    
+    MAX_AGE_MS = 5 * 60 * 1000  # HubSpot's advice: reject older requests as replays
+    
+    def verify(self, request):
+        secret = settings.HUBSPOT_WEBHOOK_SECRET
+        if not secret:
+            raise PermissionError('HubSpot webhooks are not configured')
+        timestamp = request.headers.get('X-HubSpot-Request-Timestamp', '')
+        if not timestamp.isdigit() or abs(time.time() * 1000 - int(timestamp)) > self.MAX_AGE_MS:
+            raise PermissionError('Missing or expired request timestamp')
+        
+        source = f'{request.method}{request.build_absolute_uri()}'.encode() + request.body + timestamp.encode()
+        expected = base64.b64encode(hmac.new(secret.encode(), source, hashlib.sha256).digest()).decode()
+        if not hmac.compare_digest(expected, request.headers.get('X-HubSpot-Signature-v3', '')):
+            raise PermissionError('Invalid signature')
+    
+    def parse(self, request) -> List[str]:
+        self.verify(request)
+        events = self.load(request.body)
+        if not isinstance(events, list):
+            raise InvalidWebhook('Expected a list of events')
+        
+        deal_ids = []
+        for event in events:
+            if not isinstance(event, dict) or not str(event.get('subscriptionType', '')).startswith('deal.'):
+                continue
+            # Association changes (e.g. a file attached) name the deal as fromObjectId
+            deal_id = event.get('objectId', event.get('fromObjectId'))
+            if deal_id is not None:
+                deal_ids.append(str(deal_id))
+        return deal_ids
+
+
+class ZohoWebhook(BaseWebhook):
+    """Zoho CRM notification channels, carrying the token given when the channel was enabled"""
+    
+    def parse(self, request) -> List[str]:
+        token = settings.ZOHO_WEBHOOK_TOKEN
+        if not token:
+            raise PermissionError('Zoho webhooks are not configured')
+        payload = self.load(request.body)
+        if not isinstance(payload, dict):
+            raise InvalidWebhook('Expected a notification object')
+        if not hmac.compare_digest(token, str(payload.get('token', ''))):
+            raise PermissionError('Invalid token')
+        
+        if payload.get('module') != 'Deals':
+            return []
+        return [str(deal_id) for deal_id in payload.get('ids') or []]
+
+
+WEBHOOKS = {
+    'hubspot': HubSpotWebhook,
+    'zoho': ZohoWebhook,
+}
+
+
+def _dispatch_lock(crm_provider_id: int) -> str:
+    return f'file_synch:webhook-dispatch:{crm_provider_id}'
+
+
+def schedule_dispatch(crm_provider_id: int, countdown: int):
+    """Queue a dispatch in countdown seconds, unless one is already queued by then"""
+    from file_synch.tasks import dispatch_webhook_syncs_task
+    
+    if cache.add(_dispatch_lock(crm_provider_id), True, countdown):
+        dispatch_webhook_syncs_task.apply_async((crm_provider_id,), countdown=countdown)
+
+
+def buffer_deal_events(crm_provider: CRMProvider, deal_ids: List[str],
+                       attempts: Optional[Dict[str, int]] = None) -> int:
+    """Record that these deals changed, merging with events already waiting; returns the deal count.
+    
+    attempts carries the failed targeted syncs of deals put back after one.
+    """
+    deal_ids = set(deal_ids)
+    if not deal_ids:
+        return 0
+    now = timezone.now()
+    attempts = attempts or {}
+    # Existing rows keep their first_event_at, so a burst is synced once
+    PendingDealSync.objects.bulk_create(
+        [PendingDealSync(crm_provider=crm_provider, crm_deal_id=deal_id, first_event_at=now, last_event_at=now,
+                         attempts=attempts.get(deal_id, 0))
+         for deal_id in deal_ids],
+        update_conflicts=True,
+        unique_fields=['crm_provider', 'crm_deal_id'],
+        update_fields=['last_event_at', 'attempts'] if attempts else ['last_event_at'],
+    )
+    window = settings.WEBHOOK_COALESCE_SECONDS
+    transaction.on_commit(lambda: schedule_dispatch(crm_provider.pk, window))
+    return len(deal_ids)
+
+
+def claim_settled_deals(crm_provider: CRMProvider) -> Dict[str, int]:
+    """Take the deals whose first event is at least WEBHOOK_COALESCE_SECONDS old off the buffer.
+    
+    Returns each deal's failed sync attempts so far, oldest events first.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.WEBHOOK_COALESCE_SECONDS)
+    with transaction.atomic():
+        # No-op on SQLite, where the transaction already holds the write lock
+        settled = list(
+            PendingDealSync.objects.select_for_update(skip_locked=True)
+            .filter(crm_provider=crm_provider, first_event_at__lte=cutoff)
+            .order_by('first_event_at')
+            .values_list('pk', 'crm_deal_id', 'attempts')[:CLAIM_SIZE]
+        )
+        PendingDealSync.objects.filter(pk__in=[pk for pk, _, _ in settled]).delete()
+    return {deal_id: attempts for _, deal_id, attempts in settled}
+
+
+def requeue_failed_deals(crm_provider: CRMProvider, claimed: Dict[str, int], deal_ids: List[str]) -> List[str]:
+    """Put deals whose targeted sync failed back in the buffer, dropping those out of attempts; returns the dropped"""
+    attempts = {deal_id: claimed.get(deal_id, 0) + 1 for deal_id in deal_ids}
+    dropped = sorted(deal_id for deal_id, count in attempts.items() if count >= settings.WEBHOOK_MAX_ATTEMPTS)
+    if dropped:
+        logger.error(
+            f"Giving up on {len(dropped)} {crm_provider.name} deal(s) after "
+            f"{settings.WEBHOOK_MAX_ATTEMPTS} failed webhook syncs: {', '.join(dropped)}"
+        )
+    retry = {deal_id: count for deal_id, count in attempts.items() if deal_id not in dropped}
+    buffer_deal_events(crm_provider, list(retry), retry)
+    return dropped
+
+
+def schedule_remaining(crm_provider: CRMProvider):
+    """Queue a dispatch for when the oldest deal still in the buffer settles"""
+    first = PendingDealSync.objects.filter(crm_provider=crm_provider).aggregate(
+        first=Min('first_event_at'),
+    )['first']
+    if first is None:
+        return
+    cache.delete(_dispatch_lock(crm_provider.pk))
+    settles_in = first + timedelta(seconds=settings.WEBHOOK_COALESCE_SECONDS) - timezone.now()
+    schedule_dispatch(crm_provider.pk, max(int(settles_in.total_seconds()) + 1, 1))
+
+
+def route_deals(crm_provider: CRMProvider, deal_ids: List[str]) -> List[Tuple[CRMAccount, List[str]]]:
+    """Split claimed deals between the provider's active accounts.
+    
+    A deal already stored goes to the account holding it. Notifications do
+    not say which account a new deal is in, so it goes to every account; the
+    ones without it find nothing to sync.
+    """
+    if not deal_ids:
+        return []
+    owners = defaultdict(set)
+    for deal_id, crm_account_id in Deal.objects.filter(
+        crm_provider=crm_provider, crm_deal_id__in=deal_ids,
+    ).values_list('crm_deal_id', 'crm_account_id'):
+        owners[deal_id].add(crm_account_id)
+    
+    routed = []
+    for crm_account in CRMAccount.active_for(crm_provider):
+        account_deal_ids = [
+            deal_id for deal_id in deal_ids
+            if deal_id not in owners or crm_account.pk in owners[deal_id]
+        ]
+        if account_deal_ids:
+            routed.append((crm_account, account_deal_ids))
+    return routed
@@ -0,0 +1,36 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_data_generation, generation_bumps_suppressed
+from .instrumentation import install_query_recorder
+from .models import CRMProvider, Deal, FileMetadata, SyncLog
+
+
+@receiver(post_save, sender=CRMProvider)
+def provider_changed(sender, instance, created, **kwargs):
+    if not created:
+        bump_data_generation(instance.pk)
+
+
+@receiver(post_delete, sender=CRMProvider)
+def provider_deleted(sender, instance, **kwargs):
+    # SyncLog does not cascade, it may be in another database
+    SyncLog.objects.filter(crm_provider_id=instance.pk).delete()
+
+
+@receiver([post_save, post_delete], sender=Deal)
+def deal_changed(sender, instance, **kwargs):
+    if not generation_bumps_suppressed():
+        bump_data_generation(instance.crm_provider_id)
+
+
+@receiver([post_save, post_delete], sender=FileMetadata)
+def file_changed(sender, instance, **kwargs):
+    if not generation_bumps_suppressed():
+        bump_data_generation(instance.crm_provider_id)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    install_query_recorder(connection)
@@ -1,22 +1,56 @@
-from celery import shared_task
+from celery import group, shared_task
+from django.conf import settings
+from django.core.cache import cache
+from file_synch.services.circuit_breaker import CRMUnavailable
+from file_synch.services.change_log_service import compact_change_log
+from file_synch.services.snapshot_service import AvailableFilesSnapshot
 from file_synch.services.sync_service import FileSyncService
-from .models import CRMProvider
+from file_synch.services.webhook_service import (
+    claim_settled_deals, requeue_failed_deals, route_deals, schedule_remaining,
+)
+from .models import CRMAccount, CRMProvider
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
-@shared_task(bind=True)
-def sync_files_task(self, crm_provider_id, file_ids=None):
+# acks_late: a task whose worker dies is redelivered and resumes from the
+# sync checkpoint instead of being lost.
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def sync_files_task(self, crm_provider_id, file_ids=None, time_budget=None, crm_account_id=None):
     try:
         crm_provider = CRMProvider.objects.get(id=crm_provider_id, is_active=True)
-        service = FileSyncService(crm_provider)
+        if crm_account_id is None:
+            accounts = CRMAccount.active_for(crm_provider)
+            if len(accounts) != 1:
+                # One task per account, so the provider's tenants sync in parallel
+                group(
+                    sync_files_task.s(crm_provider_id, file_ids, time_budget, crm_account_id=account.pk)
+                    for account in accounts
+                ).apply_async()
+                return {'status': 'queued', 'message': f"Sync queued for {len(accounts)} account(s)"}
+            crm_account = accounts[0]
+        else:
+            crm_account = CRMAccount.objects.get(id=crm_account_id, crm_provider=crm_provider, is_active=True)
+        service = FileSyncService(crm_provider, crm_account=crm_account)
+
+        if time_budget is None:
+            time_budget = settings.SYNC_TIME_BUDGET or None
 
         if file_ids:
             results = service.sync_specific_files(file_ids)
             message = f"Selective sync completed for {len(file_ids)} file(s)"
         else:
-            results = service.sync_all_files()
-            message = "Full sync completed"
+            results = service.sync_all_files(time_budget=time_budget)
+            if results['completed']:
+                message = "Full sync completed"
+            else:
+                # Out of time: hand the rest of the work to a fresh task
+                sync_files_task.apply_async(
+                    args=[crm_provider_id],
+                    kwargs={'time_budget': time_budget, 'crm_account_id': crm_account.pk},
+                )
+                message = "Full sync paused at checkpoint; continuation queued"
 
         return {
             'status': 'success',
@@ -28,6 +62,92 @@ def sync_files_task(self, crm_provider_id, file_ids=None):
         logger.error(f"CRM provider {crm_provider_id} not found or inactive")
         return {'status': 'error', 'message': 'CRM provider not found or inactive'}
 
+    except CRMAccount.DoesNotExist:
+        logger.error(f"CRM account {crm_account_id} not found or inactive")
+        return {'status': 'error', 'message': 'CRM account not found or inactive'}
+
+    except CRMUnavailable as e:
+        # The circuit is open: try again once it may have closed, resuming
+        # from the checkpoint. One deferred sync per account is enough.
+        countdown = math.ceil(e.retry_after)
+        if cache.add(f'file_synch:sync-deferred:{crm_account.pk}', True, countdown):
+            sync_files_task.apply_async(
+                args=[crm_provider_id],
+                kwargs={'file_ids': file_ids, 'time_budget': time_budget, 'crm_account_id': crm_account.pk},
+                countdown=countdown,
+            )
+        logger.warning(f"Sync deferred for {countdown}s: {str(e)}")
+        return {'status': 'deferred', 'message': str(e), 'retry_after': countdown}
+
     except Exception as e:
         logger.error(f"Sync failed: {str(e)}")
-        return {'status': 'error', 'message': str(e)}
\ No newline at end of file
+        return {'status': 'error', 'message': str(e)}
+
+
+@shared_task
+def refresh_available_files_task(crm_provider_id):
+    try:
+        crm_provider = CRMProvider.objects.get(id=crm_provider_id, is_active=True)
+        files = AvailableFilesSnapshot(crm_provider).refresh()
+        return {'status': 'success', 'files': files}
+
+    except CRMProvider.DoesNotExist:
+        logger.error(f"CRM provider {crm_provider_id} not found or inactive")
+        return {'status': 'error', 'message': 'CRM provider not found or inactive'}
+
+    except Exception as e:
+        logger.error(f"Available files refresh failed: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
+
+
+@shared_task
+def refresh_stale_snapshots_task():
+    """Periodic: queue a refresh for every provider whose snapshot has expired"""
+    queued = 0
+    for crm_provider in CRMProvider.objects.filter(is_active=True):
+        try:
+            snapshot = AvailableFilesSnapshot(crm_provider)
+        except ValueError:
+            continue
+        if snapshot.is_stale() and snapshot.refresh_in_background():
+            queued += 1
+    return {'status': 'success', 'queued': queued}
+
+
+@shared_task
+def compact_change_log_task():
+    """Periodic: drop superseded and expired change log entries"""
+    return {'status': 'success', **compact_change_log()}
+
+
+@shared_task
+def dispatch_webhook_syncs_task(crm_provider_id):
+    """Run one targeted sync per account for the deals whose webhook events have settled"""
+    try:
+        crm_provider = CRMProvider.objects.get(id=crm_provider_id, is_active=True)
+    except CRMProvider.DoesNotExist:
+        logger.error(f"CRM provider {crm_provider_id} not found or inactive")
+        return {'status': 'error', 'message': 'CRM provider not found or inactive'}
+
+    claimed = claim_settled_deals(crm_provider)
+    deal_ids = list(claimed)
+    results, failed, errors = {}, [], []
+    try:
+        for crm_account, account_deal_ids in route_deals(crm_provider, deal_ids):
+            try:
+                service = FileSyncService(crm_provider, crm_account=crm_account)
+                results[crm_account.name] = service.sync_deals(account_deal_ids)
+            except Exception as e:
+                logger.error(f"Webhook sync failed for {crm_account}: {str(e)}")
+                failed.extend(account_deal_ids)
+                errors.append(str(e))
+        if failed:
+            # Back into the buffer, to be retried once the window passes again,
+            # up to WEBHOOK_MAX_ATTEMPTS times
+            requeue_failed_deals(crm_provider, claimed, failed)
+    finally:
+        schedule_remaining(crm_provider)
+
+    if errors:
+        return {'status': 'error', 'message': '; '.join(errors)}
+    return {'status': 'success', 'deals': len(deal_ids), 'results': results or None}
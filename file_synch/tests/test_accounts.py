@@ -0,0 +1,138 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from unittest.mock import patch
+import json
+
+from file_synch.models import CRMAccount, CRMProvider, Deal, FileMetadata, SyncCheckpoint
+from file_synch.services.circuit_breaker import CallQuota, CRMUnavailable
+from file_synch.services.crm_factory import CRMServiceFactory
+from file_synch.services.snapshot_service import AvailableFilesSnapshot
+from file_synch.services.sync_service import FileSyncService
+from file_synch.services.webhook_service import route_deals
+from file_synch.tasks import sync_files_task
+from file_synch.tests.test_services import FakeCRMService
+
+
+@override_settings(CRM_API_KEY='global-key', CRM_PROVIDER_API_KEYS={'hubspot': 'hubspot-key'})
+class CRMAccountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.provider = CRMProvider.objects.create(name='HubSpot', api_endpoint='https://api.hubapi.com')
+        self.default = CRMAccount.default_for(self.provider.pk)
+        self.eu = CRMAccount.objects.create(crm_provider=self.provider, name='eu', api_key='eu-key')
+    
+    def test_api_keys(self):
+        self.assertEqual(self.default.get_api_key(), 'hubspot-key')
+        self.assertEqual(self.eu.get_api_key(), 'eu-key')
+        zoho = CRMProvider.objects.create(name='Zoho', api_endpoint='https://www.zohoapis.com')
+        self.assertEqual(CRMAccount.default_for(zoho.pk).get_api_key(), 'global-key')
+        
+        service = CRMServiceFactory.create_for_account(self.eu)
+        self.assertEqual(service.api_key, 'eu-key')
+        self.assertEqual(service.circuit_breaker.name, 'HubSpotService:eu')
+        self.assertEqual(CRMServiceFactory.create_for_account(self.default).circuit_breaker.name, 'HubSpotService')
+    
+    def test_accounts_synced_separately(self):
+        FileSyncService(self.provider, FakeCRMService(num_deals=3)).sync_all_files()
+        results = FileSyncService(self.provider, FakeCRMService(num_deals=2), self.eu).sync_all_files()
+        self.assertEqual(results['deals_processed'], 2)
+        # Same CRM deal ids, one row per account
+        self.assertEqual(Deal.objects.filter(crm_deal_id='deal_000').count(), 2)
+        self.assertEqual(Deal.objects.filter(crm_account=self.eu).count(), 2)
+        
+        # The eu account's sweep leaves the default account's deals alone
+        results = FileSyncService(self.provider, FakeCRMService(num_deals=1), self.eu).sync_all_files()
+        self.assertEqual(results['sweep']['deals_removed'], 1)
+        self.assertEqual(Deal.objects.filter(crm_account=self.default).count(), 3)
+        self.assertEqual(FileMetadata.objects.filter(deal__crm_account=self.default).count(), 6)
+        self.assertEqual(self.provider.accounts.get(name='eu').sync_generation, 2)
+    
+    def test_checkpoints_per_account(self):
+        service = FileSyncService(self.provider, FakeCRMService(num_deals=4), self.eu)
+        with override_settings(SYNC_BATCH_SIZE=2):
+            self.assertFalse(service.sync_all_files(time_budget=1e-9)['completed'])
+        self.assertEqual(SyncCheckpoint.objects.get().crm_account, self.eu)
+        
+        results = FileSyncService(self.provider, FakeCRMService(num_deals=4)).sync_all_files()
+        self.assertIsNone(results['resumed_from'])
+        results = FileSyncService(self.provider, FakeCRMService(num_deals=4), self.eu).sync_all_files()
+        self.assertEqual(results['resumed_from'], 'deal_001')
+    
+    def test_account_of_another_provider_rejected(self):
+        zoho = CRMProvider.objects.create(name='Zoho', api_endpoint='https://www.zohoapis.com')
+        with self.assertRaises(ValueError):
+            FileSyncService(zoho, FakeCRMService(), self.eu)
+    
+    @override_settings(CRM_CIRCUIT_FAILURES=1, CRM_RETRY_ATTEMPTS=0)
+    def test_open_circuit_isolated_to_its_account(self):
+        eu = CRMServiceFactory.create_for_account(self.eu)
+        eu.circuit_breaker.record_failure({}, retry_after=60)
+        with self.assertRaises(CRMUnavailable):
+            eu.get_deals()
+        self.assertTrue(CRMServiceFactory.create_for_account(self.default).get_deals())
+    
+    def test_task_fans_out_per_account(self):
+        with patch('file_synch.tasks.group') as group:
+            result = sync_files_task(self.provider.pk)
+        self.assertEqual(result['status'], 'queued')
+        signatures = list(group.call_args.args[0])
+        self.assertEqual({sig.kwargs['crm_account_id'] for sig in signatures}, {self.default.pk, self.eu.pk})
+        
+        self.eu.is_active = False
+        self.eu.save()
+        with patch('file_synch.services.sync_service.CRMServiceFactory.create_service',
+                   return_value=FakeCRMService(num_deals=2)):
+            result = sync_files_task(self.provider.pk)
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(Deal.objects.filter(crm_account=self.default).count(), 2)
+        self.assertEqual(sync_files_task(self.provider.pk, crm_account_id=self.eu.pk)['status'], 'error')
+    
+    def test_snapshot_keeps_each_accounts_files(self):
+        with patch('file_synch.services.snapshot_service.CRMServiceFactory.create_service',
+                   side_effect=lambda *args: FakeCRMService(num_deals=2)):
+            self.assertEqual(AvailableFilesSnapshot(self.provider).refresh(), 8)
+        self.assertEqual(self.provider.available_files.filter(crm_account=self.eu).count(), 4)
+        
+        # Files synced for the eu account are not reported synced for the default one
+        FileSyncService(self.provider, FakeCRMService(num_deals=2), self.eu).sync_all_files()
+        data = json.loads(Client().get(
+            f'/api/available-files/?crm_provider_id={self.provider.id}&is_synced=true'
+        ).content)
+        self.assertEqual(data['total_files'], 4)
+    
+    def test_webhook_deals_routed_to_their_account(self):
+        FileSyncService(self.provider, FakeCRMService(num_deals=2), self.eu).sync_all_files()
+        routed = dict(route_deals(self.provider, ['deal_000', 'new_deal']))
+        self.assertEqual(routed[self.eu], ['deal_000', 'new_deal'])
+        self.assertEqual(routed[self.default], ['new_deal'])
+
+
+class CallQuotaTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+    
+    @patch('file_synch.services.circuit_breaker.time.sleep')
+    @patch('file_synch.services.circuit_breaker.time.time', return_value=6000.0)
+    def test_waits_for_next_minute_once_used_up(self, _, sleep):
+        quota = CallQuota('HubSpotService:eu', 2)
+        quota.acquire()
+        quota.acquire()
+        sleep.assert_not_called()
+        quota.acquire()
+        sleep.assert_called_once()
+        self.assertTrue(60 <= sleep.call_args.args[0] <= 61)
+        # Other accounts have their own quota
+        CallQuota('HubSpotService:us', 2).acquire()
+        sleep.assert_called_once()
+    
+    @patch('file_synch.services.circuit_breaker.time.sleep')
+    def test_service_calls_count_against_quota(self, sleep):
+        crm_service = FakeCRMService()
+        crm_service.requests_per_minute = 1
+        with patch('file_synch.services.circuit_breaker.time.time', return_value=6000.0):
+            crm_service.get_files_for_deal('deal_000')
+            crm_service.get_files_for_deal('deal_001')
+        sleep.assert_called_once()
+        self.assertEqual(crm_service.file_calls, ['deal_000', 'deal_001'])
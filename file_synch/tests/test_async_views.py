@@ -0,0 +1,111 @@
+from asgiref.sync import async_to_sync
+from django.test import TestCase, RequestFactory
+from unittest.mock import patch
+import json
+import threading
+import time
+
+from file_synch.async_views import AsyncAvailableFilesView, AsyncDealsView, AsyncFilesView, AsyncStatsView
+from file_synch.models import CRMProvider, Deal, FileMetadata
+from file_synch.services.snapshot_service import AvailableFilesSnapshot
+from file_synch.tests.test_services import BatchingCRMService, FakeCRMService
+from file_synch.views import DealsView, FilesView, StatsView
+
+
+class SlowCRMService(FakeCRMService):
+    """FakeCRMService whose file listing blocks, recording how many calls overlap"""
+    
+    def __init__(self, *args, delay=0.05, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+    
+    def get_files_for_deal(self, deal_id):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return super().get_files_for_deal(deal_id)
+
+
+class AsyncReadViewsTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        deal = Deal.objects.create(
+            crm_provider=self.provider,
+            crm_deal_id='test_deal_001',
+            deal_name='Test Deal'
+        )
+        for i in range(3):
+            FileMetadata.objects.create(
+                deal=deal,
+                crm_file_id=f'test_file_{i}',
+                file_name=f'contract_{i}.pdf',
+                file_size=1024,
+                file_type='pdf',
+                file_url=f'https://api.test.com/files/{i}'
+            )
+    
+    def test_async_views_match_sync_views(self):
+        cases = [
+            (FilesView, AsyncFilesView, '/api/files/?per_page=2&page=2'),
+            (FilesView, AsyncFilesView, '/api/files/?per_page=2&cursor=&fields=id,file_name'),
+            (DealsView, AsyncDealsView, '/api/deals/?search=test'),
+            (StatsView, AsyncStatsView, '/api/stats/'),
+        ]
+        for sync_view, async_view, url in cases:
+            with self.subTest(url=url):
+                self.assertTrue(async_view.view_is_async)
+                expected = sync_view.as_view()(self.factory.get(url))
+                response = self._run(async_view, url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(json.loads(response.content), json.loads(expected.content))
+                self.assertEqual(response['ETag'], expected['ETag'])
+    
+    def _run(self, view, url):
+        return async_to_sync(view.as_view())(self.factory.get(url))
+    
+    def test_invalid_fields(self):
+        response = self._run(AsyncFilesView, '/api/files/?fields=nope')
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncSnapshotRefreshTest(TestCase):
+    def setUp(self):
+        self.provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+    
+    async def test_arefresh_fetches_deals_concurrently(self):
+        crm_service = SlowCRMService(num_deals=6, files_per_deal=2)
+        snapshot = AvailableFilesSnapshot(self.provider, crm_service)
+        with self.settings(CRM_MAX_CONCURRENCY=3):
+            stored = await snapshot.arefresh()
+        self.assertEqual(stored, 12)
+        self.assertEqual(crm_service.max_in_flight, 3)
+        self.assertIsNotNone(snapshot.refreshed_at)
+    
+    async def test_arefresh_batches_listings(self):
+        crm_service = BatchingCRMService(num_deals=7, files_per_deal=2)
+        stored = await AvailableFilesSnapshot(self.provider, crm_service).arefresh()
+        self.assertEqual(stored, 14)
+        self.assertEqual(sorted(map(len, crm_service.batch_calls)), [1, 3, 3])
+    
+    async def test_available_files_view(self):
+        crm_service = FakeCRMService(num_deals=2, files_per_deal=2)
+        with patch('file_synch.services.snapshot_service.CRMServiceFactory.create_service',
+                   return_value=crm_service):
+            request = RequestFactory().get(f'/api/available-files/?crm_provider_id={self.provider.id}')
+            response = await AsyncAvailableFilesView.as_view()(request)
+        data = json.loads(response.content)
+        self.assertEqual(data['total_files'], 4)
+        self.assertFalse(data['files'][0]['is_synced'])
@@ -0,0 +1,142 @@
+from django.test import TestCase, Client, override_settings
+import json
+
+from file_synch.cache import get_response_cache
+from file_synch.models import CRMProvider, Deal, FileMetadata
+from file_synch.services.stats_service import rebuild_counters, rebuild_file_stats
+from file_synch.services.sync_service import FileSyncService
+from file_synch.tests.test_services import FakeCRMService
+
+
+@override_settings(RESPONSE_CACHE_BACKEND='lru')
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.deal = Deal.objects.create(
+            crm_provider=self.provider,
+            crm_deal_id='test_deal_001',
+            deal_name='Test Deal'
+        )
+        get_response_cache().clear()
+    
+    def _create_file(self, crm_file_id):
+        FileMetadata.objects.create(
+            deal=self.deal,
+            crm_file_id=crm_file_id,
+            file_name=f'{crm_file_id}.pdf',
+            file_size=1024,
+            file_type='pdf',
+            file_url=f'https://api.test.com/files/{crm_file_id}'
+        )
+    
+    def test_cached_response_reuses_body(self):
+        first = self.client.get('/api/files/?per_page=5&page=1')
+        # Only the generation lookup runs on a cache hit
+        with self.assertNumQueries(1):
+            second = self.client.get('/api/files/?page=1&per_page=5')
+        self.assertEqual(first.content, second.content)
+    
+    def test_write_invalidates_cache(self):
+        self.client.get('/api/files/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_file('test_file_001')
+        data = json.loads(self.client.get('/api/files/').content)
+        self.assertEqual(len(data['files']), 1)
+    
+    def test_other_provider_writes_keep_cache(self):
+        other = CRMProvider.objects.create(name='Zoho', api_endpoint='https://www.zohoapis.com/crm/v2')
+        self.client.get(f'/api/stats/?crm_provider={self.provider.id}')
+        with self.captureOnCommitCallbacks(execute=True):
+            Deal.objects.create(crm_provider=other, crm_deal_id='zh_001', deal_name='Zoho Deal')
+        with self.assertNumQueries(1):
+            self.client.get(f'/api/stats/?crm_provider={self.provider.id}')
+    
+    @override_settings(SYNC_BATCH_SIZE=2)
+    def test_sync_bumps_generation_per_checkpoint(self):
+        sync_service = FileSyncService(self.provider)
+        sync_service.crm_service = FakeCRMService(num_deals=3)
+        # Two checkpoints, then once more for the sweep as the sync ends
+        with self.captureOnCommitCallbacks(execute=True):
+            sync_service.sync_all_files()
+        self.provider.refresh_from_db()
+        self.assertEqual(self.provider.data_generation, 3)
+        
+        # A paused sync has already invalidated what it committed
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertFalse(sync_service.sync_all_files(time_budget=1e-9)['completed'])
+        self.provider.refresh_from_db()
+        self.assertEqual(self.provider.data_generation, 5)
+    
+    @override_settings(RESPONSE_CACHE_BACKEND='')
+    def test_cache_disabled(self):
+        self.assertIsNone(get_response_cache())
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.deal = Deal.objects.create(
+            crm_provider=self.provider,
+            crm_deal_id='test_deal_001',
+            deal_name='Test Deal'
+        )
+    
+    def test_etag_on_list_and_stats_endpoints(self):
+        for url in ('/api/files/', '/api/deals/', '/api/stats/'):
+            response = self.client.get(url)
+            self.assertTrue(response['ETag'].startswith('"'))
+            self.assertIn('Accept', response['Vary'])
+    
+    def test_matching_etag_returns_304_without_main_query(self):
+        etag = self.client.get('/api/files/?page=1')['ETag']
+        # Only the generation lookup runs
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/files/?page=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+    
+    def test_etag_depends_on_params_and_format(self):
+        etag = self.client.get('/api/files/?page=1')['ETag']
+        self.assertNotEqual(self.client.get('/api/files/?page=2')['ETag'], etag)
+        self.assertNotEqual(
+            self.client.get('/api/files/?page=1', HTTP_ACCEPT='application/json')['ETag'], etag
+        )
+        response = self.client.get('/api/files/?page=2', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+    
+    def test_etag_differs_between_endpoints(self):
+        etag = self.client.get('/api/files/?page=1')['ETag']
+        self.assertNotEqual(self.client.get('/api/deals/?page=1')['ETag'], etag)
+        response = self.client.get('/api/deals/?page=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+    
+    def test_rebuilds_change_etag(self):
+        for rebuild, url in ((rebuild_counters, '/api/deals/'), (rebuild_file_stats, '/api/stats/')):
+            etag = self.client.get(url)['ETag']
+            rebuild()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+    
+    def test_write_changes_etag(self):
+        etag = self.client.get('/api/stats/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            FileMetadata.objects.create(
+                deal=self.deal,
+                crm_file_id='test_file_001',
+                file_name='test_file_001.pdf',
+                file_size=1024,
+                file_type='pdf',
+                file_url='https://api.test.com/files/test_file_001'
+            )
+        response = self.client.get('/api/stats/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
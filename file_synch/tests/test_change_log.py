@@ -0,0 +1,120 @@
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.utils import timezone
+from datetime import timedelta
+from io import StringIO
+import json
+
+from file_synch.models import ChangeLogEntry, CRMProvider
+from file_synch.services.change_log_service import compact_change_log
+from file_synch.services.sync_service import FileSyncService
+from file_synch.tests.test_services import FakeCRMService
+
+
+class ChangeLogTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.crm_service = FakeCRMService(num_deals=2, files_per_deal=2)
+        self.sync_service = FileSyncService(self.provider, self.crm_service)
+        self.sync_service.sync_all_files()
+    
+    def changes(self, since='', **params):
+        query = '&'.join(f'{key}={value}' for key, value in {'since': since, **params}.items())
+        response = self.client.get(f'/api/changes/?{query}')
+        return response.status_code, json.loads(response.content)
+    
+    def test_sync_writes_changes(self):
+        status, data = self.changes()
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            [(c['entity'], c['action'], c['crm_id']) for c in data['changes']],
+            [('deal', 'created', 'deal_000'), ('file', 'created', 'deal_000_file_0'), ('file', 'created', 'deal_000_file_1'),
+             ('deal', 'created', 'deal_001'), ('file', 'created', 'deal_001_file_0'), ('file', 'created', 'deal_001_file_1')],
+        )
+        self.assertEqual(data['changes'][1]['data']['file_name'], 'deal_000_doc_0.pdf')
+        self.assertEqual(data['changes'][0]['data']['deal_name'], 'Deal 0')
+        self.assertFalse(data['has_more'])
+        
+        # Nothing changed: no new entries, and the cursor stays put
+        self.sync_service.sync_all_files()
+        status, again = self.changes(data['next_cursor'])
+        self.assertEqual(again['changes'], [])
+        self.assertEqual(again['next_cursor'], data['next_cursor'])
+    
+    def test_updates_and_sweep_deletes(self):
+        cursor = self.changes()[1]['next_cursor']
+        self.crm_service.deals = self.crm_service.deals[1:]
+        get_files = self.crm_service.get_files_for_deal
+        def renamed(deal_id):
+            files = get_files(deal_id)
+            files[0].name = 'renamed.pdf'
+            return files
+        self.crm_service.get_files_for_deal = renamed
+        self.sync_service.sync_all_files(sweep_max_fraction=1.0)
+        
+        status, data = self.changes(cursor)
+        self.assertEqual(
+            [(c['entity'], c['action'], c['crm_id']) for c in data['changes']],
+            [('file', 'updated', 'deal_001_file_0'),
+             ('file', 'deleted', 'deal_000_file_0'), ('file', 'deleted', 'deal_000_file_1'),
+             ('deal', 'deleted', 'deal_000')],
+        )
+        self.assertEqual(data['changes'][0]['data']['file_name'], 'renamed.pdf')
+        self.assertIsNone(data['changes'][-1]['data'])
+    
+    def test_pages_follow_cursor(self):
+        seen = []
+        cursor = ''
+        with self.assertNumQueries(3):
+            status, data = self.changes(cursor, per_page=4)
+        while True:
+            seen += [change['id'] for change in data['changes']]
+            cursor = data['next_cursor']
+            if not data['has_more']:
+                break
+            status, data = self.changes(cursor, per_page=4)
+        self.assertEqual(seen, sorted(ChangeLogEntry.objects.values_list('pk', flat=True)))
+        self.assertEqual(self.changes('abc')[0], 400)
+    
+    def test_page_size_bounds(self):
+        self.assertEqual(self.changes(per_page='ten')[0], 400)
+        # Out of range sizes are clamped, so the cursor always moves forward
+        for per_page in (0, -5):
+            status, data = self.changes(per_page=per_page)
+            self.assertEqual(status, 200)
+            self.assertEqual(len(data['changes']), 1)
+            self.assertTrue(data['has_more'])
+    
+    def test_compaction_keeps_latest_entry_per_object(self):
+        self.crm_service.deals[0].name = 'Deal zero'
+        self.sync_service.sync_all_files()
+        self.assertEqual(ChangeLogEntry.objects.filter(entity='deal', crm_id='deal_000').count(), 2)
+        
+        self.assertEqual(compact_change_log(), {'superseded': 1, 'expired': 0})
+        entries = ChangeLogEntry.objects.filter(entity='deal', crm_id='deal_000')
+        self.assertEqual(list(entries.values_list('action', flat=True)), ['updated'])
+        
+        # Replaying from the start still yields every current row
+        status, data = self.changes()
+        self.assertEqual(len(data['changes']), 6)
+        self.assertTrue(all(change['data'] for change in data['changes']))
+    
+    def test_expired_deletions_invalidate_old_cursors(self):
+        old_cursor = self.changes(per_page=1)[1]['next_cursor']
+        self.crm_service.deals = self.crm_service.deals[1:]
+        self.sync_service.sync_all_files(sweep_max_fraction=1.0)
+        current_cursor = self.changes(old_cursor)[1]['next_cursor']
+        ChangeLogEntry.objects.filter(action='deleted').update(created_at=timezone.now() - timedelta(days=30))
+        
+        out = StringIO()
+        call_command('compact_change_log', stdout=out)
+        self.assertIn('3 expired', out.getvalue())
+        self.assertFalse(ChangeLogEntry.objects.filter(action='deleted').exists())
+        
+        self.assertEqual(self.changes(old_cursor)[0], 410)
+        self.assertEqual(self.changes(current_cursor)[0], 200)
+        self.assertEqual(self.changes()[0], 200)
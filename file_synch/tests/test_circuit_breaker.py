@@ -0,0 +1,164 @@
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from unittest.mock import patch
+import json
+import time
+
+from file_synch.checks import check_shared_cache
+from file_synch.models import CRMProvider, FileMetadata
+from file_synch.services.circuit_breaker import CRMTransientError, CRMUnavailable
+from file_synch.services.sync_service import FileSyncService
+from file_synch.tasks import sync_files_task
+from file_synch.tests.test_services import FakeCRMService
+
+real_sleep = time.sleep  # the tests patch time.sleep to skip the backoff waits
+
+
+class FlakyCRMService(FakeCRMService):
+    """Fails its file listings with the queued errors, then recovers"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failures = []
+        self.delay = 0
+    
+    def get_files_for_deal(self, deal_id):
+        if self.delay:
+            real_sleep(self.delay)
+        if self.failures:
+            raise self.failures.pop(0)
+        return super().get_files_for_deal(deal_id)
+
+
+@override_settings(CRM_CIRCUIT_FAILURES=3, CRM_CIRCUIT_COOLDOWN=60, CRM_RETRY_ATTEMPTS=2, CRM_RETRY_BASE_DELAY=1)
+class CircuitBreakerTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.crm_service = FlakyCRMService(num_deals=6)
+        self.breaker = self.crm_service.circuit_breaker
+        patcher = patch('file_synch.services.circuit_breaker.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_transient_errors_retried_with_backoff(self):
+        self.crm_service.failures = [TimeoutError('read timeout'), CRMTransientError('503')]
+        self.assertEqual(len(self.crm_service.get_files_for_deal('deal_000')), 2)
+        
+        delays = [call.args[0] for call in self.sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertTrue(0 <= delays[0] <= 1 and 0 <= delays[1] <= 2, delays)
+        # Recovered: the failure count is gone
+        self.assertIsNone(cache.get(self.breaker.failures_key))
+    
+    def test_retry_after_honored(self):
+        self.crm_service.failures = [CRMTransientError('429', retry_after=7)]
+        self.crm_service.get_files_for_deal('deal_000')
+        self.sleep.assert_called_once_with(7)
+        
+        # Too long to wait out in the worker: the circuit opens for it instead
+        self.crm_service.failures = [CRMTransientError('429', retry_after=600)]
+        with self.assertRaises(CRMTransientError):
+            self.crm_service.get_files_for_deal('deal_000')
+        with self.assertRaises(CRMUnavailable) as raised:
+            self.crm_service.get_files_for_deal('deal_000')
+        self.assertGreater(raised.exception.retry_after, 590)
+    
+    def test_other_errors_not_retried(self):
+        self.crm_service.failures = [ValueError('bad deal id')]
+        with self.assertRaises(ValueError):
+            self.crm_service.get_files_for_deal('deal_000')
+        self.sleep.assert_not_called()
+        self.assertIsNone(cache.get(self.breaker.failures_key))
+    
+    @override_settings(CRM_RETRY_ATTEMPTS=0)
+    def test_opens_after_failures_and_probes_after_cooldown(self):
+        self.crm_service.failures = [ConnectionError('reset')] * 3
+        for _ in range(3):
+            with self.assertRaises(ConnectionError):
+                self.crm_service.get_files_for_deal('deal_000')
+        calls = len(self.crm_service.file_calls)
+        with self.assertRaises(CRMUnavailable) as raised:
+            self.crm_service.get_files_for_deal('deal_000')
+        self.assertTrue(30 <= raised.exception.retry_after <= 60)
+        
+        # Cooldown over: one probe at a time, and its success closes the circuit
+        cache.delete(self.breaker.open_key)
+        self.breaker.before_call()
+        with self.assertRaises(CRMUnavailable):
+            self.breaker.before_call()
+        cache.delete(self.breaker.probe_key)
+        self.crm_service.get_files_for_deal('deal_000')
+        self.crm_service.get_files_for_deal('deal_001')
+        self.assertEqual(len(self.crm_service.file_calls), calls + 2)
+        self.assertIsNone(cache.get(self.breaker.trips_key))
+    
+    @override_settings(CRM_RETRY_ATTEMPTS=0)
+    def test_failed_probe_doubles_cooldown(self):
+        self.crm_service.failures = [ConnectionError('reset')] * 4
+        for _ in range(3):
+            with self.assertRaises(ConnectionError):
+                self.crm_service.get_files_for_deal('deal_000')
+        cache.delete(self.breaker.open_key)
+        with self.assertRaises(ConnectionError):
+            self.crm_service.get_files_for_deal('deal_000')
+        with self.assertRaises(CRMUnavailable) as raised:
+            self.crm_service.get_files_for_deal('deal_000')
+        self.assertTrue(60 <= raised.exception.retry_after <= 120)
+    
+    @override_settings(CRM_CIRCUIT_SLOW_CALL_SECONDS=0.005)
+    def test_slow_calls_open_the_circuit(self):
+        self.crm_service.delay = 0.01
+        for _ in range(3):
+            self.crm_service.get_files_for_deal('deal_000')
+        with self.assertRaises(CRMUnavailable):
+            self.crm_service.get_files_for_deal('deal_000')
+
+
+@override_settings(CRM_CIRCUIT_FAILURES=2, CRM_RETRY_ATTEMPTS=0, SYNC_FETCH_WORKERS=0)
+class CircuitBreakerSyncTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.provider = CRMProvider.objects.create(name='HubSpot', api_endpoint='https://api.hubapi.com')
+        self.crm_service = FlakyCRMService(num_deals=6)
+        self.crm_service.failures = [TimeoutError('timeout')] * 2
+    
+    def test_sync_stops_once_the_circuit_opens(self):
+        with self.assertRaises(CRMUnavailable):
+            FileSyncService(self.provider, self.crm_service).sync_all_files()
+        # Two deals failed, then no more calls for the other four
+        self.assertEqual(self.crm_service.file_calls, [])
+        self.assertFalse(FileMetadata.objects.exists())
+    
+    def test_task_reschedules_itself_once(self):
+        with patch('file_synch.services.sync_service.CRMServiceFactory.create_service',
+                   return_value=self.crm_service), \
+                patch('file_synch.tasks.sync_files_task.apply_async') as apply_async:
+            result = sync_files_task(self.provider.pk)
+            self.assertEqual(result['status'], 'deferred')
+            self.assertEqual(sync_files_task(self.provider.pk)['status'], 'deferred')
+        
+        apply_async.assert_called_once()
+        self.assertEqual(apply_async.call_args.kwargs['countdown'], result['retry_after'])
+    
+    def test_available_files_503_without_a_snapshot(self):
+        self.crm_service.circuit_breaker.record_failure({}, retry_after=120)
+        with patch('file_synch.services.snapshot_service.CRMServiceFactory.create_service',
+                   return_value=self.crm_service):
+            response = Client().get(f'/api/available-files/?crm_provider_id={self.provider.id}')
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(110 <= int(response['Retry-After']) <= 120)
+        self.assertIn('unavailable', json.loads(response.content)['error'])
+
+
+class SharedCacheCheckTest(TestCase):
+    def test_warns_about_process_local_cache(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem):
+            self.assertEqual([w.id for w in check_shared_cache(None)], ['file_synch.W001'])
+        
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                             'LOCATION': 'redis://localhost:6379/2'}}
+        with override_settings(CACHES=redis):
+            self.assertEqual(check_shared_cache(None), [])
@@ -0,0 +1,62 @@
+from django.core.management import call_command
+from django.test import TestCase, Client
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from file_synch.models import CRMProvider, Deal, FileMetadata
+
+
+class FilesExportTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.deal = Deal.objects.create(
+            crm_provider=self.provider,
+            crm_deal_id='test_deal_001',
+            deal_name='Test Deal'
+        )
+        for i, file_type in enumerate(['pdf', 'pdf', 'txt']):
+            FileMetadata.objects.create(
+                deal=self.deal,
+                crm_file_id=f'test_file_{i:03d}',
+                file_name=f'test_{i}.{file_type}',
+                file_size=1024,
+                file_type=file_type,
+                file_url=f'https://api.test.com/files/test_file_{i:03d}'
+            )
+    
+    def test_ndjson_export(self):
+        response = self.client.get('/api/files/export/?file_type=pdf')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['crm_file_id'] for row in rows], ['test_file_000', 'test_file_001'])
+        self.assertEqual(rows[0]['crm_provider'], 'HubSpot')
+        self.assertEqual(rows[0]['deal_name'], 'Test Deal')
+    
+    def test_gzip_csv_export(self):
+        response = self.client.get('/api/files/export/?format=csv&gzip=true')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[2]['file_type'], 'txt')
+    
+    def test_invalid_format(self):
+        response = self.client.get('/api/files/export/?format=xml')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_export_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'files.ndjson.gz')
+            call_command('export_files', '--gzip', '--output', path, '--file-type', 'txt', stderr=io.StringIO())
+            with gzip.open(path, 'rt') as exported:
+                rows = [json.loads(line) for line in exported]
+        self.assertEqual([row['file_name'] for row in rows], ['test_2.txt'])
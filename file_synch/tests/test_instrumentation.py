@@ -0,0 +1,87 @@
+from django.test import TestCase, Client, override_settings
+from unittest.mock import patch
+import re
+
+from file_synch.instrumentation import QueryBudgetExceeded
+from file_synch.models import CRMProvider, Deal, FileMetadata
+from file_synch.tests.test_services import FakeCRMService
+
+
+def timing(response, metric):
+    """(duration, description) of one Server-Timing metric"""
+    match = re.search(rf'{metric};dur=([\d.]+)(?:;desc="([^"]*)")?', response['Server-Timing'])
+    return float(match.group(1)), match.group(2)
+
+
+class RequestMetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        deal = Deal.objects.create(
+            crm_provider=self.provider,
+            crm_deal_id='test_deal_001',
+            deal_name='Test Deal'
+        )
+        FileMetadata.objects.create(
+            deal=deal,
+            crm_file_id='test_file_001',
+            file_name='contract.pdf',
+            file_size=1024,
+            file_type='pdf',
+            file_url='https://api.test.com/files/1'
+        )
+    
+    def test_server_timing_counts_queries(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/files/')
+        self.assertEqual(timing(response, 'db')[1], '3 queries')
+        self.assertEqual(timing(response, 'crm')[1], '0 calls')
+        self.assertGreaterEqual(timing(response, 'serialize')[0], 0)
+        self.assertGreater(timing(response, 'total')[0], 0)
+    
+    def test_crm_calls_counted(self):
+        crm_service = FakeCRMService(num_deals=3, files_per_deal=1)
+        with patch('file_synch.services.snapshot_service.CRMServiceFactory.create_service',
+                   return_value=crm_service):
+            response = self.client.get(f'/api/available-files/?crm_provider_id={self.provider.id}')
+        # authenticate, get_deals and one file listing per deal
+        self.assertEqual(timing(response, 'crm')[1], '5 calls')
+    
+    def test_structured_log_line(self):
+        with self.assertLogs('file_synch.requests', level='INFO') as logs:
+            self.client.get('/api/stats/')
+        record = logs.records[0].metrics
+        self.assertEqual(record['endpoint'], 'stats')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['db_queries'], 2)
+    
+    @override_settings(QUERY_BUDGET_ENFORCE=True, QUERY_BUDGETS={'files': 1})
+    def test_budget_enforced(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/api/files/')
+    
+    @override_settings(QUERY_BUDGETS={'files': 1})
+    def test_budget_logged_when_not_enforced(self):
+        with self.assertLogs('file_synch.requests', level='WARNING'):
+            response = self.client.get('/api/files/')
+        self.assertEqual(response.status_code, 200)
+    
+    def test_read_endpoints_within_budget(self):
+        crm_service = FakeCRMService(num_deals=2, files_per_deal=2)
+        with patch('file_synch.services.snapshot_service.CRMServiceFactory.create_service',
+                   return_value=crm_service):
+            # Build the snapshot first; the budget covers serving it
+            self.client.get(f'/api/available-files/?crm_provider_id={self.provider.id}')
+            with self.settings(QUERY_BUDGET_ENFORCE=True):
+                for url in ['/api/crm-providers/', '/api/deals/', '/api/files/?search=contract',
+                            f'/api/available-files/?crm_provider_id={self.provider.id}',
+                            '/api/sync-logs/', '/api/stats/']:
+                    with self.subTest(url=url):
+                        self.assertEqual(self.client.get(url).status_code, 200)
+    
+    async def test_async_requests_counted(self):
+        response = await self.async_client.get('/api/files/')
+        self.assertEqual(timing(response, 'db')[1], '3 queries')
@@ -78,6 +78,7 @@ class FileMetadataTest(TestCase):
         )
         self.assertEqual(file_meta.file_name, 'test.pdf')
         self.assertEqual(file_meta.sync_status, 'pending')
+        self.assertEqual(file_meta.crm_provider_id, self.provider.id)
     
     def test_unique_file_per_deal(self):
         FileMetadata.objects.create(
@@ -0,0 +1,166 @@
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, router
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, Client, override_settings
+from contextlib import contextmanager
+from io import StringIO
+from unittest.mock import patch
+import json
+import os
+import tempfile
+
+from file_synch.async_views import AsyncSyncLogsView
+from file_synch.models import CRMProvider, Deal, SyncLog
+from file_synch.routers import LOGS_DB, REPLICA_DB, replica_reads
+from file_synch.services.sync_service import FileSyncService
+from file_synch.tests.test_services import FakeCRMService
+
+
+@contextmanager
+def sqlite_database(alias, migrate=False, **options):
+    """A second SQLite database, in a temporary file, for the duration of the block"""
+    with tempfile.TemporaryDirectory() as directory:
+        connections.settings[alias] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            alias: {'ENGINE': 'django.db.backends.sqlite3',
+                    'NAME': os.path.join(directory, f'{alias}.sqlite3'), 'OPTIONS': options},
+        })[alias]
+        try:
+            if migrate:
+                call_command('migrate', database=alias, verbosity=0)
+            yield connections[alias]
+        finally:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+
+
+def log_count(alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT COUNT(*) FROM sync_logs')
+        return cursor.fetchone()[0]
+
+
+class RouterTest(TestCase):
+    def test_single_database_by_default(self):
+        self.assertEqual(router.db_for_write(SyncLog), DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_read(SyncLog), DEFAULT_DB_ALIAS)
+        self.assertTrue(router.allow_migrate_model(DEFAULT_DB_ALIAS, SyncLog))
+    
+    def test_logs_database_only_holds_logs(self):
+        with sqlite_database(LOGS_DB):
+            self.assertEqual(router.db_for_write(SyncLog), LOGS_DB)
+            self.assertEqual(router.db_for_read(Deal), DEFAULT_DB_ALIAS)
+            self.assertTrue(router.allow_migrate_model(LOGS_DB, SyncLog))
+            self.assertFalse(router.allow_migrate_model(LOGS_DB, Deal))
+            self.assertFalse(router.allow_migrate_model(DEFAULT_DB_ALIAS, SyncLog))
+    
+    def test_deleting_provider_deletes_its_logs_in_one_database(self):
+        provider = CRMProvider.objects.create(name='HubSpot', api_endpoint='https://api.hubapi.com')
+        FileSyncService(provider, FakeCRMService(num_deals=2)).sync_all_files()
+        self.assertGreater(log_count(DEFAULT_DB_ALIAS), 0)
+        provider.delete()
+        self.assertEqual(log_count(DEFAULT_DB_ALIAS), 0)
+    
+    def test_replica_reads_until_first_write(self):
+        with sqlite_database(REPLICA_DB):
+            self.assertEqual(router.db_for_read(Deal), DEFAULT_DB_ALIAS)
+            with replica_reads():
+                self.assertEqual(router.db_for_read(Deal), REPLICA_DB)
+                router.db_for_write(Deal)
+                self.assertEqual(router.db_for_read(Deal), DEFAULT_DB_ALIAS)
+            self.assertFalse(router.allow_migrate_model(REPLICA_DB, Deal))
+
+
+class LogDatabaseTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.enterClassContext(sqlite_database(LOGS_DB, migrate=True))
+        # Set here rather than on the class: the test runner would look the
+        # alias up in settings.DATABASES before it exists
+        cls.databases = {DEFAULT_DB_ALIAS, LOGS_DB}
+        super().setUpClass()
+    
+    def setUp(self):
+        self.client = Client()
+        self.provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+    
+    def sync(self):
+        sync_service = FileSyncService(self.provider, FakeCRMService(num_deals=2))
+        return sync_service.sync_all_files()
+    
+    def test_sync_logs_written_to_logs_database(self):
+        self.assertTrue(self.sync()['completed'])
+        self.assertGreater(log_count(LOGS_DB), 0)
+        self.assertEqual(log_count(DEFAULT_DB_ALIAS), 0)
+        
+        data = json.loads(self.client.get('/api/sync-logs/').content)
+        self.assertEqual(len(data['logs']), log_count(LOGS_DB))
+        self.assertEqual(data['logs'][0]['crm_provider'], 'HubSpot')
+        
+        data = json.loads(self.client.get('/api/sync-logs/?fields=message').content)
+        self.assertEqual(set(data['logs'][0]), {'message'})
+    
+    async def test_async_sync_logs_name_providers(self):
+        await SyncLog.objects.acreate(crm_provider=self.provider, level='info', message='done')
+        response = await AsyncSyncLogsView.as_view()(AsyncRequestFactory().get('/api/sync-logs/'))
+        self.assertEqual(json.loads(response.content)['logs'][0]['crm_provider'], 'HubSpot')
+    
+    def test_deleting_provider_deletes_its_logs(self):
+        self.sync()
+        self.provider.delete()
+        self.assertEqual(log_count(LOGS_DB), 0)
+
+
+class ReadReplicaTest(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.enterClassContext(sqlite_database(REPLICA_DB, init_command='PRAGMA query_only=1;'))
+        # Set here rather than on the class: the test runner would look the
+        # alias up in settings.DATABASES before it exists
+        cls.databases = {DEFAULT_DB_ALIAS, REPLICA_DB}
+        super().setUpClass()
+    
+    def setUp(self):
+        self.client = Client()
+        CRMProvider.objects.create(name='HubSpot', api_endpoint='https://api.hubapi.com')
+    
+    def test_api_reads_served_from_snapshot(self):
+        call_command('refresh_read_replica', stdout=StringIO())
+        CRMProvider.objects.create(name='Zoho', api_endpoint='https://www.zohoapis.com')
+        
+        data = json.loads(self.client.get('/api/crm-providers/').content)
+        self.assertEqual([p['name'] for p in data['providers']], ['HubSpot'])
+        
+        call_command('refresh_read_replica', stdout=StringIO())
+        data = json.loads(self.client.get('/api/crm-providers/').content)
+        self.assertEqual(len(data['providers']), 2)
+    
+    @override_settings(READ_REPLICA_PATHS=['/api/files/'])
+    def test_only_configured_paths_use_replica(self):
+        call_command('refresh_read_replica', stdout=StringIO())
+        CRMProvider.objects.create(name='Zoho', api_endpoint='https://www.zohoapis.com')
+        data = json.loads(self.client.get('/api/crm-providers/').content)
+        self.assertEqual(len(data['providers']), 2)
+    
+    def test_available_files_freshness_read_from_primary(self):
+        provider = CRMProvider.objects.get()
+        crm_service = FakeCRMService(num_deals=2)
+        with patch('file_synch.services.snapshot_service.CRMServiceFactory.create_service',
+                   return_value=crm_service):
+            # The replica is copied before the first refresh, so its
+            # snapshot timestamp stays empty
+            call_command('refresh_read_replica', stdout=StringIO())
+            url = f'/api/available-files/?crm_provider_id={provider.id}'
+            self.assertEqual(json.loads(self.client.get(url).content)['total_files'], 4)
+            calls = len(crm_service.file_calls)
+            self.assertEqual(json.loads(self.client.get(url).content)['total_files'], 4)
+        self.assertEqual(len(crm_service.file_calls), calls)
+    
+    def test_replica_is_read_only(self):
+        call_command('refresh_read_replica', stdout=StringIO())
+        with self.assertRaises(OperationalError):
+            CRMProvider.objects.using(REPLICA_DB).create(name='Zoho', api_endpoint='https://www.zohoapis.com')
+        self.assertEqual(CRMProvider.objects.using(REPLICA_DB).count(), 1)
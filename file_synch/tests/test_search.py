@@ -0,0 +1,67 @@
+from django.test import TestCase, Client, override_settings
+import json
+
+from file_synch.models import CRMProvider, Deal, FileMetadata
+from file_synch.search import SQLiteFTSBackend
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.deal = Deal.objects.create(
+            crm_provider=self.provider,
+            crm_deal_id='hs_deal_001',
+            deal_name='Acme Corp Contract'
+        )
+        Deal.objects.create(
+            crm_provider=self.provider,
+            crm_deal_id='hs_deal_002',
+            deal_name='Beta Industries License'
+        )
+        for i, name in enumerate(['contract_v1.pdf', 'contract_contract_draft.docx', 'budget.xlsx']):
+            FileMetadata.objects.create(
+                deal=self.deal,
+                crm_file_id=f'test_file_{i:03d}',
+                file_name=name,
+                file_size=1024,
+                file_type='pdf',
+                file_url=f'https://api.test.com/files/test_file_{i:03d}'
+            )
+    
+    def _file_names(self, query):
+        data = json.loads(self.client.get(f'/api/files/?{query}').content)
+        return [f['file_name'] for f in data['files']]
+    
+    def test_match_expression(self):
+        self.assertEqual(SQLiteFTSBackend.match_expression('acme co-'), '"acme"* "co"*')
+        self.assertEqual(SQLiteFTSBackend.match_expression('***'), '')
+    
+    def test_prefix_search_ranked(self):
+        self.assertEqual(
+            self._file_names('search=contr'),
+            ['contract_contract_draft.docx', 'contract_v1.pdf'],
+        )
+    
+    def test_index_follows_bulk_updates(self):
+        budget = FileMetadata.objects.get(file_name='budget.xlsx')
+        budget.file_name = 'forecast.xlsx'
+        FileMetadata.objects.bulk_update([budget], ['file_name'])
+        self.assertEqual(self._file_names('search=budget'), [])
+        self.assertEqual(self._file_names('search=fore'), ['forecast.xlsx'])
+        
+        budget.delete()
+        self.assertEqual(self._file_names('search=fore'), [])
+    
+    def test_deal_search_by_name_and_id(self):
+        data = json.loads(self.client.get('/api/deals/?search=beta ind').content)
+        self.assertEqual([d['crm_deal_id'] for d in data['deals']], ['hs_deal_002'])
+        data = json.loads(self.client.get('/api/deals/?search=hs_deal_00').content)
+        self.assertEqual(len(data['deals']), 2)
+    
+    @override_settings(SEARCH_BACKEND='file_synch.search.ContainsSearchBackend')
+    def test_contains_backend(self):
+        self.assertEqual(self._file_names('search=ntract_v'), ['contract_v1.pdf'])
@@ -1,10 +1,20 @@
+import json
+import threading
+import time
 import unittest
-from django.test import TestCase
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from unittest.mock import Mock, patch
 
 from file_synch.services.crm_factory import CRMServiceFactory
+from file_synch.services.crm_providers import BaseCRMService, CRMDeal, CRMFile, CRMFileBatch
 from file_synch.services.hubspot_service import HubSpotService
-from file_synch.models import CRMProvider
+from file_synch.services.pipeline import Prefetcher
+from file_synch.services.snapshot_service import AvailableFilesSnapshot
+from file_synch.models import CRMProvider, Deal, FileMetadata, FileStats, SyncCheckpoint, SyncLog
+from file_synch.services.stats_service import rebuild_counters, rebuild_file_stats
 from file_synch.services.sync_service import FileSyncService
 from file_synch.services.zoho_service import ZohoService
 
@@ -44,6 +54,11 @@ class HubSpotServiceTest(TestCase):
         self.assertGreater(len(files), 0)
         self.assertTrue(files[0].file_id.startswith('hs_file_'))
     
+    def test_get_files_for_deals(self):
+        listings = self.service.get_file_batches_for_deals(['hs_deal_001', 'hs_deal_002'])
+        self.assertEqual(list(listings), ['hs_deal_001', 'hs_deal_002'])
+        self.assertTrue(all(crm_file.deal_id == 'hs_deal_002' for crm_file in listings['hs_deal_002']))
+    
     def test_download_file(self):
         content = self.service.download_file('https://test.com/file')
         self.assertIsInstance(content, bytes)
@@ -85,4 +100,535 @@ class SyncServiceTest(TestCase):
         )
         
         with self.assertRaises(ValueError):
-            FileSyncService(invalid_provider)
\ No newline at end of file
+            FileSyncService(invalid_provider)
+
+
+class FakeCRMService(BaseCRMService):
+    """Deterministic in-memory CRM used to exercise the sync engine"""
+    
+    def __init__(self, num_deals=4, files_per_deal=2):
+        super().__init__('fake_key', 'https://fake.example.com')
+        self.deals = [CRMDeal(f"deal_{i:03d}", f"Deal {i}", 1000 * i, "proposal") for i in range(num_deals)]
+        self.files_per_deal = files_per_deal
+        self.file_calls = []
+    
+    def authenticate(self):
+        return True
+    
+    def get_deals(self):
+        return list(self.deals)
+    
+    def get_files_for_deal(self, deal_id):
+        self.file_calls.append(deal_id)
+        return [
+            CRMFile(f"{deal_id}_file_{i}", f"{deal_id}_doc_{i}.pdf", 1024 * (i + 1), "pdf",
+                    f"https://fake.example.com/files/{deal_id}_file_{i}", deal_id)
+            for i in range(self.files_per_deal)
+        ]
+    
+    def download_file(self, file_url):
+        return b"fake"
+
+
+class ColumnarCRMService(FakeCRMService):
+    """Returns file listings as CRMFileBatch columns only"""
+    
+    def get_files_for_deal(self, deal_id):
+        raise AssertionError('the sync engine should ask for a batch')
+    
+    def get_file_batch_for_deal(self, deal_id):
+        return CRMFileBatch.from_files(deal_id, super().get_files_for_deal(deal_id))
+
+
+class MarkedCRMService(FakeCRMService):
+    """Gives each deal a files marker, as a provider with attachment counts would"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.markers = {}
+    
+    def get_files_marker(self, crm_deal):
+        return self.markers.get(crm_deal.deal_id, 'v1')
+
+
+class BatchingCRMService(FakeCRMService):
+    """Lists files for up to three deals per call"""
+    
+    FILES_BATCH_SIZE = 3
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_calls = []
+    
+    def get_files_for_deal(self, deal_id):
+        raise AssertionError('listings should be fetched in batches')
+    
+    def get_files_for_deals(self, deal_ids):
+        self.batch_calls.append(list(deal_ids))
+        return {deal_id: FakeCRMService.get_files_for_deal(self, deal_id) for deal_id in deal_ids}
+
+
+class CRMRecordsTest(TestCase):
+    def test_records_are_slotted(self):
+        crm_file = CRMFile('f1', 'a.pdf', 10, 'pdf', 'https://x.example.com/f1', 'd1')
+        self.assertFalse(hasattr(crm_file, '__dict__'))
+        self.assertFalse(hasattr(CRMDeal('d1', 'Deal'), '__dict__'))
+        self.assertEqual(crm_file, CRMFile(file_id='f1', name='a.pdf', size=10, file_type='pdf',
+                                           url='https://x.example.com/f1', deal_id='d1'))
+    
+    def test_batch_round_trip(self):
+        crm_files = FakeCRMService().get_files_for_deal('deal_000')
+        batch = CRMFileBatch.from_files('deal_000', crm_files)
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(list(batch.sizes), [1024, 2048])
+        self.assertEqual(list(batch), crm_files)
+    
+    def test_sync_from_batches(self):
+        crm_provider = CRMProvider.objects.create(name='HubSpot', api_endpoint='https://api.hubapi.com')
+        results = FileSyncService(crm_provider, ColumnarCRMService(num_deals=3)).sync_all_files()
+        self.assertEqual(results['files_synced'], 6)
+        self.assertEqual(results['errors'], [])
+        self.assertEqual(
+            FileMetadata.objects.get(crm_file_id='deal_001_file_1').file_url,
+            'https://fake.example.com/files/deal_001_file_1',
+        )
+
+
+class SyncCheckpointTest(TestCase):
+    def setUp(self):
+        self.crm_provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.sync_service = FileSyncService(self.crm_provider)
+        self.sync_service.crm_service = FakeCRMService(num_deals=4)
+    
+    def test_full_sync_clears_checkpoint(self):
+        results = self.sync_service.sync_all_files()
+        self.assertTrue(results['completed'])
+        self.assertEqual(results['deals_processed'], 4)
+        self.assertEqual(FileMetadata.objects.count(), 8)
+        self.assertFalse(SyncCheckpoint.objects.exists())
+    
+    @override_settings(SYNC_BATCH_SIZE=1)
+    def test_time_budget_pauses_and_resumes(self):
+        results = self.sync_service.sync_all_files(time_budget=1e-9)
+        self.assertFalse(results['completed'])
+        self.assertEqual(results['deals_processed'], 1)
+        checkpoint = SyncCheckpoint.objects.get(crm_provider=self.crm_provider)
+        self.assertEqual(checkpoint.last_deal_id, 'deal_000')
+        
+        results = self.sync_service.sync_all_files()
+        self.assertTrue(results['completed'])
+        self.assertEqual(results['resumed_from'], 'deal_000')
+        self.assertEqual(results['deals_processed'], 4)
+        self.assertEqual(results['files_synced'], 8)
+        self.assertNotIn('deal_000', self.sync_service.crm_service.file_calls[1:])
+        self.assertFalse(SyncCheckpoint.objects.exists())
+    
+    def test_restart_ignores_checkpoint(self):
+        SyncCheckpoint.objects.create(
+            crm_provider=self.crm_provider, last_deal_id='deal_002', deals_completed=3
+        )
+        results = self.sync_service.sync_all_files(resume=False)
+        self.assertIsNone(results['resumed_from'])
+        self.assertEqual(results['deals_processed'], 4)
+
+
+class FileStatsTest(TestCase):
+    def setUp(self):
+        self.crm_provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.sync_service = FileSyncService(self.crm_provider)
+        self.sync_service.crm_service = FakeCRMService(num_deals=3)
+    
+    def _snapshot(self):
+        return sorted(FileStats.objects.filter(file_count__gt=0).values_list(
+            'file_type', 'sync_status', 'file_count', 'total_size'))
+    
+    def test_sync_maintains_stats_incrementally(self):
+        self.sync_service.sync_all_files()
+        
+        # The CRM resizes one of deal_000's files and drops one of deal_001's
+        crm_service = self.sync_service.crm_service
+        list_files = crm_service.get_files_for_deal
+        
+        def changed_listing(deal_id):
+            crm_files = list_files(deal_id)
+            if deal_id == 'deal_000':
+                crm_files[0].size = 1
+            elif deal_id == 'deal_001':
+                crm_files = crm_files[1:]
+            return crm_files
+        
+        crm_service.get_files_for_deal = changed_listing
+        self.sync_service.sync_all_files()
+        
+        incremental = self._snapshot()
+        self.assertEqual(incremental, [('pdf', 'synced', 5, 1 + 2048 + 2048 + 1024 + 2048)])
+        rebuild_file_stats()
+        self.assertEqual(incremental, self._snapshot())
+
+
+class DenormalizedCountersTest(TestCase):
+    def setUp(self):
+        self.crm_provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.sync_service = FileSyncService(self.crm_provider)
+        self.sync_service.crm_service = FakeCRMService(num_deals=3, files_per_deal=2)
+    
+    def _counters(self):
+        self.crm_provider.refresh_from_db()
+        deals = sorted(Deal.objects.values_list('crm_deal_id', 'files_count', 'total_file_size'))
+        return self.crm_provider.deals_count, deals
+    
+    def test_sync_keeps_counters_current(self):
+        self.sync_service.sync_all_files()
+        self.sync_service.crm_service.files_per_deal = 3
+        self.sync_service.sync_all_files()
+        
+        deals_count, deals = self._counters()
+        self.assertEqual(deals_count, 3)
+        self.assertEqual(deals[0], ('deal_000', 3, 1024 + 2048 + 3072))
+        
+        Deal.objects.update(files_count=0, total_file_size=0)
+        rebuild_counters()
+        self.assertEqual(self._counters(), (deals_count, deals))
+    
+    def test_failed_bulk_write_keeps_new_deals_counted(self):
+        with patch.object(self.sync_service, '_write_deal_files', side_effect=Exception('disk full')):
+            results = self.sync_service.sync_all_files()
+        self.assertEqual(results['files_synced'], 6)
+        
+        deals_count, deals = self._counters()
+        self.assertEqual(deals_count, 3)
+        self.assertEqual(deals[0], ('deal_000', 2, 1024 + 2048))
+        rebuild_counters()
+        self.assertEqual(self._counters(), (deals_count, deals))
+    
+    def test_unchanged_files_are_not_rewritten(self):
+        self.sync_service.sync_all_files()
+        results = self.sync_service.sync_all_files()
+        self.assertEqual(results['files_synced'], 6)
+        self.assertEqual(results['files_updated'], 0)
+    
+    def test_diff_runs_outside_the_write_transaction(self):
+        self.sync_service.sync_all_files()
+        Deal.objects.update(files_digest='')  # so the deals are diffed again
+        baseline = len(connection.atomic_blocks)
+        depths = []
+        diff = self.sync_service._diff_deal_files
+        
+        def recording_diff(*args):
+            depths.append(len(connection.atomic_blocks))
+            return diff(*args)
+        
+        with patch.object(self.sync_service, '_diff_deal_files', side_effect=recording_diff):
+            results = self.sync_service.sync_all_files()
+        self.assertEqual(depths, [baseline] * 3)
+        self.assertEqual(results['files_synced'], 6)
+
+
+class SweepTest(TestCase):
+    def setUp(self):
+        self.crm_provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.crm_service = FakeCRMService(num_deals=4, files_per_deal=2)
+        self.sync_service = FileSyncService(self.crm_provider, self.crm_service)
+        self.sync_service.sync_all_files()
+    
+    def _state(self):
+        self.crm_provider.refresh_from_db()
+        stats = sorted(FileStats.objects.filter(file_count__gt=0).values_list(
+            'file_type', 'sync_status', 'file_count', 'total_size'))
+        deals = sorted(Deal.objects.values_list('crm_deal_id', 'files_count', 'total_file_size'))
+        return self.crm_provider.deals_count, deals, stats
+    
+    def test_removed_deals_and_files_are_swept(self):
+        self.crm_service.deals = self.crm_service.deals[1:]
+        get_files = self.crm_service.get_files_for_deal
+        self.crm_service.get_files_for_deal = lambda deal_id: get_files(deal_id)[:1] if deal_id == 'deal_001' else get_files(deal_id)
+        
+        with CaptureQueriesContext(connection) as queries:
+            results = self.sync_service.sync_all_files()
+        deletes = [query['sql'].split(' WHERE ')[0] for query in queries if query['sql'].startswith('DELETE')]
+        self.assertEqual(deletes.count('DELETE FROM "file_metadata"'), 1)
+        self.assertEqual(deletes.count('DELETE FROM "deals"'), 1)
+        self.assertEqual(results['sweep'], {'deals_removed': 1, 'files_removed': 3, 'skipped': None})
+        self.assertFalse(Deal.objects.filter(crm_deal_id='deal_000').exists())
+        self.assertEqual(
+            sorted(FileMetadata.objects.filter(deal__crm_deal_id='deal_001').values_list('crm_file_id', flat=True)),
+            ['deal_001_file_0'],
+        )
+        self.assertFalse(FileMetadata.objects.filter(file_name__startswith='deal_000').exists())
+        
+        incremental = self._state()
+        self.assertEqual(incremental[0], 3)
+        rebuild_counters()
+        rebuild_file_stats()
+        self.assertEqual(incremental, self._state())
+    
+    def test_search_index_follows_sweep(self):
+        self.crm_service.deals = self.crm_service.deals[1:]
+        self.sync_service.sync_all_files()
+        data = json.loads(Client().get('/api/files/?search=deal_000_doc').content)
+        self.assertEqual(data['files'], [])
+    
+    def test_suspicious_sweep_skipped(self):
+        self.crm_service.deals = []
+        results = self.sync_service.sync_all_files()
+        self.assertIn('would remove 4 of 4 deals', results['sweep']['skipped'])
+        self.assertEqual(Deal.objects.count(), 4)
+        self.assertEqual(FileMetadata.objects.count(), 8)
+        self.assertTrue(SyncLog.objects.filter(level='warning', message__startswith='Sweep skipped').exists())
+        
+        results = self.sync_service.sync_all_files(sweep_max_fraction=1.0)
+        self.assertEqual(results['sweep']['deals_removed'], 4)
+        self.assertEqual(FileMetadata.objects.count(), 0)
+    
+    def test_sweep_skipped_after_errors(self):
+        self.crm_service.deals = self.crm_service.deals[1:]
+        with patch.object(self.crm_service, 'get_files_for_deal', side_effect=Exception('timeout')):
+            results = self.sync_service.sync_all_files()
+        self.assertEqual(results['sweep']['skipped'], '3 error(s) during sync')
+        self.assertEqual(FileMetadata.objects.count(), 8)
+    
+    @override_settings(SYNC_BATCH_SIZE=2)
+    def test_resumed_sync_keeps_its_generation(self):
+        self.crm_service.deals = self.crm_service.deals[:3]
+        results = self.sync_service.sync_all_files(time_budget=1e-9)
+        self.assertFalse(results['completed'])
+        
+        results = FileSyncService(self.crm_provider, self.crm_service).sync_all_files()
+        self.assertEqual(results['resumed_from'], 'deal_001')
+        self.assertEqual(results['sweep']['deals_removed'], 1)
+        self.assertEqual(FileMetadata.objects.count(), 6)
+
+
+class SyncPipelineTest(TestCase):
+    def setUp(self):
+        self.crm_provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.crm_service = FakeCRMService(num_deals=8)
+        self.sync_service = FileSyncService(self.crm_provider, self.crm_service)
+    
+    @override_settings(SYNC_FETCH_WORKERS=2)
+    def test_listings_fetched_concurrently(self):
+        # Neither of the first two fetches returns until both are running
+        barrier = threading.Barrier(2, timeout=5)
+        get_files = self.crm_service.get_files_for_deal
+        def get_files_together(deal_id):
+            if deal_id in ('deal_000', 'deal_001'):
+                barrier.wait()
+            return get_files(deal_id)
+        self.crm_service.get_files_for_deal = get_files_together
+        
+        results = self.sync_service.sync_all_files()
+        self.assertEqual(results['errors'], [])
+        self.assertEqual(results['files_synced'], 16)
+        self.assertEqual(FileMetadata.objects.count(), 16)
+        self.assertEqual(results['pipeline']['fetch']['deals'], 8)
+        self.assertEqual(results['pipeline']['diff']['files'], 16)
+        self.assertEqual(results['pipeline']['write']['files'], 16)
+    
+    @override_settings(SYNC_BATCH_SIZE=2)
+    def test_paused_sync_drops_prefetched_listings(self):
+        results = self.sync_service.sync_all_files(time_budget=1e-9)
+        self.assertFalse(results['completed'])
+        self.assertEqual(results['pipeline']['diff']['files'], 4)
+        self.assertNotIn('pipeline', SyncCheckpoint.objects.get(crm_provider=self.crm_provider).results)
+        
+        results = self.sync_service.sync_all_files()
+        self.assertTrue(results['completed'])
+        self.assertEqual(FileMetadata.objects.count(), 16)
+    
+    @override_settings(SYNC_FETCH_WORKERS=4, SYNC_FETCH_QUEUE_SIZE=2)
+    def test_slow_writes_stall_fetching(self):
+        written = []
+        write_files = self.sync_service._sync_deal_files
+        def slow_write(deal, crm_files, *args):
+            written.append(deal.crm_deal_id)
+            # Fetched listings never run more than the queue size ahead
+            self.assertLessEqual(len(self.crm_service.file_calls), len(written) + 2)
+            time.sleep(0.01)
+            write_files(deal, crm_files, *args)
+        self.sync_service._sync_deal_files = slow_write
+        
+        results = self.sync_service.sync_all_files()
+        self.assertEqual(written, [deal.deal_id for deal in self.crm_service.deals])
+        self.assertLessEqual(results['pipeline']['fetch']['queue_depth_max'], 2)
+        self.assertEqual(results['pipeline']['fetch']['queue_size'], 2)
+    
+    def test_failed_listing_recorded_for_its_deal(self):
+        get_files = self.crm_service.get_files_for_deal
+        def get_files_or_fail(deal_id):
+            if deal_id == 'deal_003':
+                raise Exception('timeout')
+            return get_files(deal_id)
+        self.crm_service.get_files_for_deal = get_files_or_fail
+        
+        results = self.sync_service.sync_all_files()
+        self.assertEqual(results['errors'], ['Error processing deal deal_003: timeout'])
+        self.assertEqual(results['deals_processed'], 8)
+        self.assertEqual(FileMetadata.objects.count(), 14)
+    
+    def test_prefetching_resumes_after_skipped_keys(self):
+        fetched = []
+        def fetch(key):
+            fetched.append(key)
+            return key * 10
+        with Prefetcher(fetch, range(6), workers=1, queue_size=2) as prefetcher:
+            self.assertEqual(prefetcher.take(0), 0)
+            # 1 to 3 are skipped: 4 is fetched inline, and 5 queued behind it
+            self.assertEqual(prefetcher.take(4), 40)
+            self.assertEqual([key for key, _ in prefetcher.pending], [5])
+            self.assertEqual(prefetcher.take(5), 50)
+        self.assertNotIn(3, fetched)
+        self.assertEqual(prefetcher.takes, 2)
+    
+    @override_settings(SYNC_FETCH_WORKERS=0)
+    def test_inline_fetching(self):
+        results = self.sync_service.sync_all_files()
+        self.assertEqual(results['files_synced'], 16)
+        self.assertEqual(self.crm_service.file_calls, [deal.deal_id for deal in self.crm_service.deals])
+        self.assertEqual(results['pipeline']['fetch']['queue_size'], 0)
+
+
+class BatchedListingTest(TestCase):
+    def setUp(self):
+        self.crm_provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.crm_service = BatchingCRMService(num_deals=8)
+        self.sync_service = FileSyncService(self.crm_provider, self.crm_service)
+    
+    def test_sync_lists_files_in_batches(self):
+        results = self.sync_service.sync_all_files()
+        self.assertEqual(results['errors'], [])
+        self.assertEqual(results['files_synced'], 16)
+        self.assertEqual(sorted(self.crm_service.batch_calls), [
+            ['deal_000', 'deal_001', 'deal_002'], ['deal_003', 'deal_004', 'deal_005'], ['deal_006', 'deal_007'],
+        ])
+        self.assertEqual(results['pipeline']['fetch']['deals'], 8)
+        self.assertEqual(results['pipeline']['fetch']['calls'], 3)
+    
+    def test_failed_batch_fails_its_deals(self):
+        get_files = self.crm_service.get_files_for_deals
+        def get_files_or_fail(deal_ids):
+            if 'deal_003' in deal_ids:
+                raise Exception('timeout')
+            # A deal missing from the response is an error, not an empty listing
+            return {deal_id: files for deal_id, files in get_files(deal_ids).items() if deal_id != 'deal_007'}
+        self.crm_service.get_files_for_deals = get_files_or_fail
+        
+        results = self.sync_service.sync_all_files()
+        self.assertEqual(results['errors'], [
+            'Error processing deal deal_003: timeout',
+            'Error processing deal deal_004: timeout',
+            'Error processing deal deal_005: timeout',
+            'Error processing deal deal_007: No listing returned for deal_007',
+        ])
+        self.assertEqual(FileMetadata.objects.count(), 8)
+    
+    def test_targeted_and_selective_syncs_batch(self):
+        self.sync_service.sync_deals(['deal_000', 'deal_004', 'deal_005'])
+        self.assertEqual(self.crm_service.batch_calls, [['deal_000', 'deal_004', 'deal_005']])
+        
+        self.crm_service.batch_calls.clear()
+        results = self.sync_service.sync_specific_files(['deal_001_file_0'])
+        self.assertEqual(results['files_synced'], 1)
+        self.assertEqual(len(self.crm_service.batch_calls), 3)
+    
+    def test_snapshot_refresh_batches(self):
+        self.assertEqual(AvailableFilesSnapshot(self.crm_provider, self.crm_service).refresh(), 16)
+        self.assertEqual(len(self.crm_service.batch_calls), 3)
+    
+    def test_falls_back_to_one_call_per_deal(self):
+        crm_service = FakeCRMService(num_deals=4)
+        self.assertEqual(crm_service.file_listing_chunks(['a', 'b']), [['a'], ['b']])
+        AvailableFilesSnapshot(self.crm_provider, crm_service).refresh()
+        self.assertEqual(crm_service.file_calls, ['deal_000', 'deal_001', 'deal_002', 'deal_003'])
+
+
+class DealDigestTest(TestCase):
+    def setUp(self):
+        self.crm_provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.crm_service = MarkedCRMService(num_deals=4, files_per_deal=2)
+        self.sync_service = FileSyncService(self.crm_provider, self.crm_service)
+        self.sync_service.sync_all_files()
+        self.crm_service.file_calls.clear()
+    
+    def test_unchanged_markers_skip_listing(self):
+        results = self.sync_service.sync_all_files()
+        self.assertEqual(self.crm_service.file_calls, [])
+        self.assertEqual(results['deals_skipped'], 4)
+        self.assertEqual(results['sweep']['files_removed'], 0)
+        self.assertEqual(FileMetadata.objects.count(), 8)
+    
+    def test_changed_marker_lists_the_deal(self):
+        self.crm_service.markers['deal_001'] = 'v2'
+        self.crm_service.files_per_deal = 3
+        
+        results = self.sync_service.sync_all_files()
+        self.assertEqual(self.crm_service.file_calls, ['deal_001'])
+        self.assertEqual(results['deals_skipped'], 3)
+        self.assertEqual(results['files_synced'], 3)
+        self.assertEqual(FileMetadata.objects.filter(deal__crm_deal_id='deal_001').count(), 3)
+        self.assertEqual(Deal.objects.get(crm_deal_id='deal_001').files_marker, 'v2')
+    
+    def test_same_listing_is_not_diffed(self):
+        sync_service = FileSyncService(self.crm_provider, FakeCRMService(num_deals=4, files_per_deal=2))
+        results = sync_service.sync_all_files()
+        self.assertEqual(results['deals_skipped'], 0)
+        self.assertEqual(results['files_synced'], 8)
+        self.assertEqual(results['pipeline']['diff']['files'], 0)
+        self.assertEqual(results['sweep']['files_removed'], 0)
+    
+    def test_rows_left_for_the_sweep_clear_the_digest(self):
+        self.crm_service.markers['deal_000'] = 'v2'
+        get_files = self.crm_service.get_files_for_deal
+        self.crm_service.get_files_for_deal = lambda deal_id: get_files(deal_id)[:1]
+        self.sync_service.sync_all_files(sweep_max_fraction=0.0)
+        self.assertEqual(Deal.objects.get(crm_deal_id='deal_000').files_digest, '')
+        
+        # Not skipped while the dropped file is still there
+        results = self.sync_service.sync_all_files()
+        self.assertEqual(results['deals_skipped'], 3)
+        self.assertEqual(results['sweep']['files_removed'], 1)
+        self.sync_service.sync_all_files()
+        self.assertNotEqual(Deal.objects.get(crm_deal_id='deal_000').files_digest, '')
+        self.assertEqual(self.sync_service.sync_all_files()['deals_skipped'], 4)
+    
+    def test_selective_sync_clears_the_digest(self):
+        self.sync_service.sync_specific_files(['deal_002_file_0'])
+        self.assertEqual(Deal.objects.get(crm_deal_id='deal_002').files_digest, '')
+        results = self.sync_service.sync_all_files()
+        self.assertEqual(results['deals_skipped'], 3)
+    
+    def test_verify_lists_every_deal(self):
+        results = self.sync_service.sync_all_files(verify=True)
+        self.assertEqual(results['deals_skipped'], 0)
+        self.assertEqual(len(self.crm_service.file_calls), 4)
+
+
+class SQLiteConnectionTest(TestCase):
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite only')
+    def test_connection_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            # 1 = NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_BUSY_TIMEOUT * 1000)
@@ -1,8 +1,17 @@
-from django.test import TestCase, Client
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from io import StringIO
+import base64
 import json
 
-from file_synch.models import CRMProvider, Deal, FileMetadata
+from file_synch.models import CRMProvider, Deal, FileMetadata, SyncLog
+from file_synch.services.stats_service import rebuild_file_stats
+from file_synch.services.sync_service import FileSyncService
+from file_synch.tests.test_services import FakeCRMService
+from unittest.mock import Mock, patch
 
 class APIViewsTest(TestCase):
     def setUp(self):
@@ -24,6 +33,15 @@ class APIViewsTest(TestCase):
         self.assertIn('providers', data)
         self.assertEqual(len(data['providers']), 1)
     
+    def test_list_endpoints_read_precomputed_counters(self):
+        CRMProvider.objects.create(name='Zoho', api_endpoint='https://www.zohoapis.com/crm/v2')
+        # The data generation lookup (for the ETag) plus the list itself
+        with self.assertNumQueries(2):
+            self.client.get('/api/crm-providers/')
+        # Plus one count for the page-number pagination
+        with self.assertNumQueries(3):
+            self.client.get('/api/deals/')
+    
     def test_deals_endpoint(self):
         response = self.client.get('/api/deals/')
         self.assertEqual(response.status_code, 200)
@@ -70,6 +88,28 @@ class APIViewsTest(TestCase):
         # Check for async task response instead of 'results'
         self.assertIn('task_id', data)
         self.assertEqual(data['message'], 'Sync task has been queued')
+    
+    def test_sync_all_providers_endpoint(self):
+        zoho = CRMProvider.objects.create(name='Zoho', api_endpoint='https://www.zohoapis.com/crm/v2')
+        CRMProvider.objects.create(name='Inactive', api_endpoint='https://x.com', is_active=False)
+        with patch('file_synch.views.group') as group:
+            group.return_value.apply_async.return_value = Mock(id='group-1', results=[Mock(id='a'), Mock(id='b')])
+            response = self.client.post(
+                '/api/sync/',
+                json.dumps({'all_providers': True}),
+                content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data['group_id'], 'group-1')
+        self.assertEqual(data['task_ids'], ['a', 'b'])
+        
+        # One sync per active provider's default account
+        signatures = list(group.call_args.args[0])
+        self.assertEqual([sig.task for sig in signatures], ['file_synch.tasks.sync_files_task'] * 2)
+        self.assertEqual(sorted(sig.args[0] for sig in signatures), [self.provider.id, zoho.id])
+        self.assertTrue(all(sig.kwargs['crm_account_id'] for sig in signatures))
+    
     def test_available_files_endpoint(self):
         response = self.client.get(f'/api/available-files/?crm_provider_id={self.provider.id}')
         self.assertEqual(response.status_code, 200)
@@ -82,4 +122,269 @@ class APIViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         data = json.loads(response.content)
         self.assertIn('total_files', data)
-        self.assertIn('files_by_type', data)
\ No newline at end of file
+        self.assertIn('files_by_type', data)
+
+class CursorPaginationTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.deal = Deal.objects.create(
+            crm_provider=self.provider,
+            crm_deal_id='test_deal_001',
+            deal_name='Test Deal'
+        )
+        for i in range(5):
+            FileMetadata.objects.create(
+                deal=self.deal,
+                crm_file_id=f'test_file_{i:03d}',
+                file_name=f'test_{i}.pdf',
+                file_size=1024,
+                file_type='pdf',
+                file_url=f'https://api.test.com/files/test_file_{i:03d}'
+            )
+    
+    def test_walk_files_with_cursor(self):
+        seen = []
+        url = '/api/files/?per_page=2&cursor='
+        while True:
+            data = json.loads(self.client.get(url).content)
+            seen.extend(f['id'] for f in data['files'])
+            self.assertNotIn('total', data['pagination'])
+            if not data['pagination']['next_cursor']:
+                break
+            url = f"/api/files/?per_page=2&cursor={data['pagination']['next_cursor']}"
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+    
+    def test_cursor_with_total(self):
+        response = self.client.get('/api/deals/?cursor=&include_total=true')
+        data = json.loads(response.content)
+        self.assertEqual(data['pagination']['total'], 1)
+        self.assertFalse(data['pagination']['has_next'])
+    
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/sync-logs/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+        
+        # Well-formed, but its id is not one of the model's
+        cursor = base64.urlsafe_b64encode(json.dumps(['2024-01-01T00:00:00+00:00', 'not-a-pk']).encode()).decode()
+        for url in ('/api/files/', '/api/deals/', '/api/sync-logs/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(f'{url}?cursor={cursor}').status_code, 400)
+    
+    def test_order_by_allow_list(self):
+        data = json.loads(self.client.get('/api/files/?order_by=-file_size&per_page=2').content)
+        self.assertEqual(len(data['files']), 2)
+        for order_by in ('file_url', 'deal__crm_provider__name', '?'):
+            with self.subTest(order_by=order_by):
+                response = self.client.get(f'/api/files/?order_by={order_by}')
+                self.assertEqual(response.status_code, 400)
+    
+    def test_cursor_requires_created_at_ordering(self):
+        response = self.client.get('/api/files/?cursor=&order_by=file_name')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_page_mode_still_available(self):
+        data = json.loads(self.client.get('/api/files/?per_page=2&page=2').content)
+        self.assertEqual(len(data['files']), 2)
+        self.assertEqual(data['pagination']['total'], 5)
+        self.assertEqual(data['pagination']['current_page'], 2)
+
+
+class StatsViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.deal = Deal.objects.create(
+            crm_provider=self.provider,
+            crm_deal_id='test_deal_001',
+            deal_name='Test Deal'
+        )
+        for i, (file_type, status) in enumerate([('pdf', 'synced'), ('pdf', 'failed'), ('txt', 'pending')]):
+            FileMetadata.objects.create(
+                deal=self.deal,
+                crm_file_id=f'test_file_{i:03d}',
+                file_name=f'test_{i}.{file_type}',
+                file_size=1024 * 1024,
+                file_type=file_type,
+                file_url=f'https://api.test.com/files/test_file_{i:03d}',
+                sync_status=status,
+            )
+    
+    def test_stats_single_query(self):
+        # The data generation lookup (for the ETag) plus one grouped query
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/stats/')
+        data = json.loads(response.content)
+        self.assertEqual(data['total_files'], 3)
+        self.assertEqual(data['synced_files'], 1)
+        self.assertEqual(data['failed_files'], 1)
+        self.assertEqual(data['pending_files'], 1)
+        self.assertEqual(data['total_size_mb'], 3.0)
+        self.assertEqual(data['files_by_type'], {'pdf': 2, 'txt': 1})
+        self.assertEqual(data['files_by_crm'], {'HubSpot': 3})
+    
+    def test_stats_from_table_matches_aggregate(self):
+        rebuild_file_stats()
+        expected = json.loads(self.client.get('/api/stats/').content)
+        with override_settings(STATS_FROM_TABLE=True):
+            data = json.loads(self.client.get(f'/api/stats/?crm_provider={self.provider.id}').content)
+        self.assertEqual(data, expected)
+
+
+class AvailableFilesSnapshotTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.crm_service = FakeCRMService(num_deals=3, files_per_deal=2)
+        patcher = patch(
+            'file_synch.services.snapshot_service.CRMServiceFactory.create_service',
+            return_value=self.crm_service,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = f'/api/available-files/?crm_provider_id={self.provider.id}'
+    
+    def test_snapshot_built_once(self):
+        data = json.loads(self.client.get(self.url).content)
+        self.assertEqual(data['total_files'], 6)
+        self.assertFalse(data['snapshot']['stale'])
+        calls = len(self.crm_service.file_calls)
+        
+        # A fresh snapshot is served without touching the CRM, in constant queries
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        self.assertEqual(len(self.crm_service.file_calls), calls)
+    
+    def test_is_synced_and_filters(self):
+        sync_service = FileSyncService(self.provider)
+        sync_service.crm_service = FakeCRMService(num_deals=1, files_per_deal=2)
+        sync_service.sync_all_files()
+        
+        data = json.loads(self.client.get(self.url + '&is_synced=true').content)
+        self.assertEqual(data['total_files'], 2)
+        self.assertTrue(all(f['is_synced'] for f in data['files']))
+        
+        data = json.loads(self.client.get(self.url + '&deal_id=deal_002&per_page=1').content)
+        self.assertEqual(data['total_files'], 2)
+        self.assertEqual(len(data['files']), 1)
+        self.assertFalse(data['files'][0]['is_synced'])
+    
+    @override_settings(AVAILABLE_FILES_TTL=0)
+    def test_stale_snapshot_refreshes_in_background(self):
+        self.client.get(self.url)
+        with patch('file_synch.tasks.refresh_available_files_task.delay') as delay:
+            data = json.loads(self.client.get(self.url).content)
+        self.assertTrue(data['snapshot']['stale'])
+        delay.assert_called_once_with(self.provider.id)
+    
+    @override_settings(AVAILABLE_FILES_TTL=60)
+    def test_stale_snapshot_served_when_refresh_cannot_be_queued(self):
+        self.client.get(self.url)
+        CRMProvider.objects.filter(pk=self.provider.pk).update(
+            available_files_refreshed_at=timezone.now() - timedelta(minutes=5))
+        with patch('file_synch.tasks.refresh_available_files_task.delay',
+                   side_effect=ConnectionError('broker unreachable')) as delay:
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(json.loads(response.content)['snapshot']['stale'])
+            # The lock was released, so the next request queues the refresh again
+            self.client.get(self.url)
+        self.assertEqual(delay.call_count, 2)
+
+
+class LeanSerializationTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.provider = CRMProvider.objects.create(
+            name='HubSpot',
+            api_endpoint='https://api.hubapi.com'
+        )
+        self.deal = Deal.objects.create(
+            crm_provider=self.provider,
+            crm_deal_id='test_deal_001',
+            deal_name='Test Deal'
+        )
+        self.file = FileMetadata.objects.create(
+            deal=self.deal,
+            crm_file_id='test_file_001',
+            file_name='test.pdf',
+            file_size=1024 * 1024,
+            file_type='pdf',
+            file_url='https://api.test.com/files/test_file_001'
+        )
+    
+    def test_full_file_payload(self):
+        data = json.loads(self.client.get('/api/files/').content)
+        self.assertEqual(data['files'][0], {
+            'id': str(self.file.id),
+            'deal_id': self.deal.id,
+            'deal_name': 'Test Deal',
+            'crm_provider': 'HubSpot',
+            'crm_file_id': 'test_file_001',
+            'file_name': 'test.pdf',
+            'file_size': 1024 * 1024,
+            'file_size_mb': 1.0,
+            'file_type': 'pdf',
+            'sync_status': 'pending',
+            'sync_timestamp': None,
+            'created_at': self.file.created_at.isoformat(),
+        })
+    
+    def test_sparse_fieldsets(self):
+        data = json.loads(self.client.get('/api/files/?fields=file_name,file_size_mb').content)
+        self.assertEqual(data['files'], [{'file_name': 'test.pdf', 'file_size_mb': 1.0}])
+        response = self.client.get('/api/deals/?fields=deal_name,nope')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_sync_logs_without_per_row_queries(self):
+        for i in range(5):
+            SyncLog.objects.create(crm_provider=self.provider, level='error', message=f'boom {i}', file_metadata=self.file)
+        with self.assertNumQueries(2):
+            data = json.loads(self.client.get('/api/sync-logs/').content)
+        self.assertEqual(data['logs'][0]['file_id'], str(self.file.id))
+    
+    def test_msgpack_negotiation(self):
+        with patch('file_synch.serializers.msgpack', None):
+            response = self.client.get('/api/files/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 406)
+        
+        packer = Mock()
+        packer.packb.return_value = b'\x81'
+        with patch('file_synch.serializers.msgpack', packer):
+            response = self.client.get('/api/deals/', HTTP_ACCEPT='application/msgpack, application/json;q=0.5')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(response.content, b'\x81')
+        
+        # q-values rank the types, whatever order they are listed in
+        with patch('file_synch.serializers.msgpack', packer):
+            response = self.client.get('/api/deals/', HTTP_ACCEPT='application/msgpack;q=0.5, application/json')
+            self.assertEqual(response['Content-Type'], 'application/json')
+            # JSON's own q-value applies, not the wildcard's
+            response = self.client.get('/api/deals/', HTTP_ACCEPT='application/json;q=0.2, application/*')
+            self.assertEqual(response['Content-Type'], 'application/msgpack')
+            response = self.client.get('/api/deals/', HTTP_ACCEPT='application/json;q=0, application/x-msgpack')
+            self.assertEqual(response['Content-Type'], 'application/x-msgpack')
+
+
+class ExplainQueriesTest(TestCase):
+    def test_every_query_shape_is_index_backed(self):
+        out = StringIO()
+        call_command('explain_queries', fail=True, stdout=out)
+        self.assertIn('0 query shape(s) flagged', out.getvalue())
+    
+    def test_plan_parsing(self):
+        from file_synch.management.commands.explain_queries import Command
+        plan = '2 0 0 SCAN file_metadata\n5 0 0 USE TEMP B-TREE FOR ORDER BY'
+        self.assertEqual(Command()._issues('sqlite', plan), ['full scan of file_metadata', 'sort without an index'])
+        plan = '4 0 0 SEARCH file_metadata USING INDEX file_metada_sync_st_2105c9_idx (sync_status=?)'
+        self.assertEqual(Command()._issues('sqlite', plan), [])
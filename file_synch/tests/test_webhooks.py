@@ -0,0 +1,139 @@
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.utils import timezone
+from datetime import timedelta
+from unittest.mock import patch
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from file_synch.models import ChangeLogEntry, CRMProvider, Deal, FileMetadata, PendingDealSync
+from file_synch.services.sync_service import FileSyncService
+from file_synch.tasks import dispatch_webhook_syncs_task
+from file_synch.tests.test_services import FakeCRMService
+
+SECRET = 'hubspot-client-secret'
+
+
+@override_settings(HUBSPOT_WEBHOOK_SECRET=SECRET, ZOHO_WEBHOOK_TOKEN='zoho-token', WEBHOOK_COALESCE_SECONDS=30)
+class WebhookTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.hubspot = CRMProvider.objects.create(name='HubSpot', api_endpoint='https://api.hubapi.com')
+        self.zoho = CRMProvider.objects.create(name='Zoho', api_endpoint='https://www.zohoapis.com')
+        patcher = patch('file_synch.tasks.dispatch_webhook_syncs_task.apply_async')
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def post_hubspot(self, events, secret=SECRET, timestamp=None):
+        body = json.dumps(events).encode()
+        timestamp = str(timestamp or int(time.time() * 1000))
+        source = b'POSThttp://testserver/api/webhooks/hubspot/' + body + timestamp.encode()
+        signature = base64.b64encode(hmac.new(secret.encode(), source, hashlib.sha256).digest()).decode()
+        return self.client.post(
+            '/api/webhooks/hubspot/', body, content_type='application/json',
+            HTTP_X_HUBSPOT_SIGNATURE_V3=signature, HTTP_X_HUBSPOT_REQUEST_TIMESTAMP=timestamp,
+        )
+    
+    def test_hubspot_signature_checked(self):
+        events = [{'subscriptionType': 'deal.propertyChange', 'objectId': 101}]
+        self.assertEqual(self.post_hubspot(events, secret='wrong').status_code, 401)
+        stale = int((time.time() - 600) * 1000)
+        self.assertEqual(self.post_hubspot(events, timestamp=stale).status_code, 401)
+        self.assertFalse(PendingDealSync.objects.exists())
+        
+        response = self.post_hubspot(events + [{'subscriptionType': 'contact.creation', 'objectId': 7}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'deals_queued': 1})
+        self.assertEqual(PendingDealSync.objects.get().crm_deal_id, '101')
+    
+    def test_zoho_token_checked(self):
+        notification = {'module': 'Deals', 'ids': ['z1', 'z2'], 'operation': 'update'}
+        response = self.client.post('/api/webhooks/zoho/', {**notification, 'token': 'nope'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post('/api/webhooks/zoho/', {**notification, 'token': 'zoho-token'},
+                                    content_type='application/json')
+        self.assertEqual(json.loads(response.content), {'deals_queued': 2})
+        self.assertEqual(set(PendingDealSync.objects.values_list('crm_deal_id', flat=True)), {'z1', 'z2'})
+        self.assertEqual(self.client.post('/api/webhooks/zoho/', 'not json',
+                                          content_type='application/json').status_code, 400)
+    
+    @override_settings(ZOHO_WEBHOOK_TOKEN='')
+    def test_unconfigured_webhook_rejected(self):
+        response = self.client.post('/api/webhooks/zoho/', {'module': 'Deals', 'ids': ['z1'], 'token': ''},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.client.post('/api/webhooks/salesforce/').status_code, 404)
+    
+    def test_burst_coalesced_per_deal(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(5):
+                self.post_hubspot([{'subscriptionType': 'deal.propertyChange', 'objectId': 101},
+                                   {'subscriptionType': 'deal.associationChange', 'fromObjectId': 101, 'toObjectId': 9}])
+            self.post_hubspot([{'subscriptionType': 'deal.creation', 'objectId': 102}])
+        
+        self.assertEqual(PendingDealSync.objects.count(), 2)
+        self.apply_async.assert_called_once_with((self.hubspot.pk,), countdown=30)
+
+
+class TargetedSyncTest(TestCase):
+    def setUp(self):
+        self.provider = CRMProvider.objects.create(name='HubSpot', api_endpoint='https://api.hubapi.com')
+        self.crm_service = FakeCRMService(num_deals=3, files_per_deal=2)
+        FileSyncService(self.provider, self.crm_service).sync_all_files()
+        self.crm_service.file_calls.clear()
+    
+    def test_sync_deals_touches_only_those_deals(self):
+        self.crm_service.deals[1].name = 'Renamed'
+        get_files = self.crm_service.get_files_for_deal
+        self.crm_service.get_files_for_deal = lambda deal_id: get_files(deal_id)[:1]
+        self.crm_service.deals = self.crm_service.deals[1:]
+        
+        results = FileSyncService(self.provider, self.crm_service).sync_deals(['deal_000', 'deal_001'])
+        self.assertEqual(self.crm_service.file_calls, ['deal_001'])
+        self.assertEqual(results['deals_processed'], 1)
+        self.assertEqual(results['deals_removed'], 1)
+        self.assertEqual(results['files_removed'], 3)
+        self.assertEqual(Deal.objects.get(crm_deal_id='deal_001').deal_name, 'Renamed')
+        self.assertFalse(Deal.objects.filter(crm_deal_id='deal_000').exists())
+        # deal_002 was not in the notification: left alone
+        self.assertEqual(FileMetadata.objects.filter(deal__crm_deal_id='deal_002').count(), 2)
+        self.assertEqual(ChangeLogEntry.objects.filter(action='deleted').count(), 4)
+        self.assertEqual(Deal.objects.get(crm_deal_id='deal_001').files_count, 1)
+    
+    @override_settings(WEBHOOK_COALESCE_SECONDS=30)
+    def test_dispatch_syncs_settled_deals_and_requeues_the_rest(self):
+        now = timezone.now()
+        PendingDealSync.objects.create(crm_provider=self.provider, crm_deal_id='deal_000',
+                                       first_event_at=now - timedelta(seconds=40), last_event_at=now)
+        PendingDealSync.objects.create(crm_provider=self.provider, crm_deal_id='deal_001',
+                                       first_event_at=now - timedelta(seconds=10), last_event_at=now)
+        
+        with patch('file_synch.services.sync_service.CRMServiceFactory.create_service',
+                   return_value=self.crm_service), \
+                patch('file_synch.tasks.dispatch_webhook_syncs_task.apply_async') as apply_async:
+            result = dispatch_webhook_syncs_task(self.provider.pk)
+        
+        self.assertEqual(result['deals'], 1)
+        self.assertEqual(self.crm_service.file_calls, ['deal_000'])
+        self.assertEqual(list(PendingDealSync.objects.values_list('crm_deal_id', flat=True)), ['deal_001'])
+        countdown = apply_async.call_args.kwargs['countdown']
+        self.assertTrue(15 <= countdown <= 21, countdown)
+    
+    @override_settings(WEBHOOK_COALESCE_SECONDS=0, WEBHOOK_MAX_ATTEMPTS=2)
+    def test_failing_deal_dropped_after_max_attempts(self):
+        PendingDealSync.objects.create(crm_provider=self.provider, crm_deal_id='deal_000',
+                                       first_event_at=timezone.now(), last_event_at=timezone.now())
+        
+        with patch('file_synch.tasks.FileSyncService.sync_deals', side_effect=Exception('CRM says no')), \
+                patch('file_synch.tasks.dispatch_webhook_syncs_task.apply_async'):
+            self.assertEqual(dispatch_webhook_syncs_task(self.provider.pk)['status'], 'error')
+            self.assertEqual(PendingDealSync.objects.get().attempts, 1)
+            
+            with self.assertLogs('file_synch.services.webhook_service', 'ERROR'):
+                dispatch_webhook_syncs_task(self.provider.pk)
+        self.assertFalse(PendingDealSync.objects.exists())
@@ -1,12 +1,32 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if settings.ASYNC_READ_VIEWS:
+    from . import async_views as read_views
+    CRMProvidersView = read_views.AsyncCRMProvidersView
+    DealsView = read_views.AsyncDealsView
+    FilesView = read_views.AsyncFilesView
+    AvailableFilesView = read_views.AsyncAvailableFilesView
+    SyncLogsView = read_views.AsyncSyncLogsView
+    StatsView = read_views.AsyncStatsView
+else:
+    CRMProvidersView = views.CRMProvidersView
+    DealsView = views.DealsView
+    FilesView = views.FilesView
+    AvailableFilesView = views.AvailableFilesView
+    SyncLogsView = views.SyncLogsView
+    StatsView = views.StatsView
+
 urlpatterns = [
-    path('api/crm-providers/', views.CRMProvidersView.as_view(), name='crm-providers'),
-    path('api/deals/', views.DealsView.as_view(), name='deals'),
-    path('api/files/', views.FilesView.as_view(), name='files'),
-    path('api/available-files/', views.AvailableFilesView.as_view(), name='available-files'),
+    path('api/crm-providers/', CRMProvidersView.as_view(), name='crm-providers'),
+    path('api/deals/', DealsView.as_view(), name='deals'),
+    path('api/files/', FilesView.as_view(), name='files'),
+    path('api/files/export/', views.FilesExportView.as_view(), name='files-export'),
+    path('api/available-files/', AvailableFilesView.as_view(), name='available-files'),
     path('api/sync/', views.SyncView.as_view(), name='sync'),
-    path('api/sync-logs/', views.SyncLogsView.as_view(), name='sync-logs'),
-    path('api/stats/', views.StatsView.as_view(), name='stats'),
-]
\ No newline at end of file
+    path('api/webhooks/<str:provider>/', views.CRMWebhookView.as_view(), name='crm-webhook'),
+    path('api/sync-logs/', SyncLogsView.as_view(), name='sync-logs'),
+    path('api/stats/', StatsView.as_view(), name='stats'),
+    path('api/changes/', views.ChangesView.as_view(), name='changes'),
+]
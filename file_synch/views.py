@@ -1,36 +1,63 @@
 
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.db.models import Q, Count, Avg
-from django.core.paginator import Paginator
+from django.db.models import Count, Exists, F, Max, OuterRef, Sum
+from celery import group
 
-from CRM_Integration import settings
-from file_synch.services.crm_factory import CRMServiceFactory
+from django.conf import settings
+from file_synch.services.circuit_breaker import CRMUnavailable
+from file_synch.services.export_service import EXPORT_FORMATS, export_files, export_queryset
+from file_synch.services.snapshot_service import AvailableFilesSnapshot
+from file_synch.services.stats_service import build_stats
 from file_synch.services.sync_service import FileSyncService
+from file_synch.services.webhook_service import WEBHOOKS, InvalidWebhook, buffer_deal_events
 from file_synch.tasks import sync_files_task
-from .models import CRMProvider, Deal, FileMetadata, SyncLog
+from .pagination import InvalidCursor, paginate_queryset
+from .cache import cache_response
+from .filters import InvalidOrdering, file_ordering, filter_files
+from .routers import logs_share_database
+from .search import get_search_backend
+from .serializers import (
+    CHANGE_PROJECTION, DEAL_PROJECTION, DETACHED_SYNC_LOG_PROJECTION, FILE_PROJECTION, SYNC_LOG_PROJECTION,
+    InvalidFields, render,
+)
+from .models import AvailableFile, ChangeLogEntry, CRMAccount, CRMProvider, Deal, FileMetadata, FileStats, SyncLog
 
 import json
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
+MAX_CHANGES_PER_PAGE = 1000
+
+def crm_unavailable_response(error: CRMUnavailable) -> JsonResponse:
+    """503 telling the client when the CRM's circuit may close again"""
+    response = JsonResponse({'error': str(error)}, status=503)
+    response['Retry-After'] = str(math.ceil(error.retry_after))
+    return response
+
 @method_decorator(csrf_exempt, name='dispatch')
 class CRMProvidersView(View):
     """API endpoint for CRM providers"""
     
-    def get(self, request):
-        """List all CRM providers"""
-        providers = CRMProvider.objects.all()
-        data = [{
+    @staticmethod
+    def provider_data(p):
+        return {
             'id': p.id,
             'name': p.name,
             'api_endpoint': p.api_endpoint,
             'is_active': p.is_active,
-            'deals_count': p.deal_set.count(),
-        } for p in providers]
+            'deals_count': p.deals_count,
+        }
+    
+    @cache_response('crm-providers')
+    def get(self, request):
+        """List all CRM providers"""
+        providers = CRMProvider.objects.all()
+        data = [self.provider_data(p) for p in providers]
         
         return JsonResponse({'providers': data})
 
@@ -38,116 +65,97 @@ class CRMProvidersView(View):
 class DealsView(View):
     """API endpoint for deals"""
     
-    def get(self, request):
-        """List deals with optional filtering"""
+    def get_rows(self, request):
+        """Projected deal rows matching the request's filters, and the selected fields"""
         crm_provider_id = request.GET.get('crm_provider')
         search = request.GET.get('search', '')
-        page = int(request.GET.get('page', 1))
-        per_page = int(request.GET.get('per_page', 20))
+        fields = DEAL_PROJECTION.select(request.GET.get('fields'))
         
-        queryset = Deal.objects.select_related('crm_provider').all()
+        queryset = Deal.objects.all()
         
         if crm_provider_id:
             queryset = queryset.filter(crm_provider_id=crm_provider_id)
         
         if search:
-            queryset = queryset.filter(
-                Q(deal_name__icontains=search) |
-                Q(crm_deal_id__icontains=search)
-            )
-        
-        queryset = queryset.annotate(files_count=Count('files'))
-        queryset = queryset.order_by('-created_at')
-        paginator = Paginator(queryset, per_page)
-        page_obj = paginator.get_page(page)
-        
-        data = [{
-            'id': deal.id,
-            'crm_provider': deal.crm_provider.name,
-            'crm_deal_id': deal.crm_deal_id,
-            'deal_name': deal.deal_name,
-            'deal_amount': float(deal.deal_amount) if deal.deal_amount else None,
-            'deal_stage': deal.deal_stage,
-            'files_count': deal.files_count,
-            'created_at': deal.created_at.isoformat(),
-        } for deal in page_obj]
+            queryset = get_search_backend().search_deals(queryset, search)
+        
+        if search and 'cursor' not in request.GET:
+            # Best matches first
+            queryset = queryset.order_by('search_rank', '-created_at')
+        else:
+            queryset = queryset.order_by('-created_at')
+        return DEAL_PROJECTION.values(queryset, fields), fields
+    
+    @cache_response('deals')
+    def get(self, request):
+        """List deals with optional filtering"""
+        per_page = int(request.GET.get('per_page', 20))
         
-        return JsonResponse({
-            'deals': data,
-            'pagination': {
-                'total': paginator.count,
-                'pages': paginator.num_pages,
-                'current_page': page,
-                'per_page': per_page,
-                'has_next': page_obj.has_next(),
-                'has_previous': page_obj.has_previous(),
-            }
+        try:
+            rows, fields = self.get_rows(request)
+            page_items, pagination = paginate_queryset(request, rows, per_page)
+        except (InvalidFields, InvalidCursor) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        return render(request, {
+            'deals': DEAL_PROJECTION.serialize(page_items, fields),
+            'pagination': pagination,
         })
 
 @method_decorator(csrf_exempt, name='dispatch')
 class FilesView(View):
 
-    def get(self, request):
-        deal_id = request.GET.get('deal_id')
-        crm_provider_id = request.GET.get('crm_provider')
-        file_type = request.GET.get('file_type')
-        sync_status = request.GET.get('sync_status')
+    def get_rows(self, request):
+        """Projected file rows matching the request's filters, and the selected fields"""
         search = request.GET.get('search', '')
-        page = int(request.GET.get('page', 1))
-        per_page = int(request.GET.get('per_page', 20))
-        
-        queryset = FileMetadata.objects.select_related('deal__crm_provider').all()
-        
-        # Apply filters
-        if deal_id:
-            queryset = queryset.filter(deal_id=deal_id)
+        fields = FILE_PROJECTION.select(request.GET.get('fields'))
         
-        if crm_provider_id:
-            queryset = queryset.filter(deal__crm_provider_id=crm_provider_id)
-        
-        if file_type:
-            queryset = queryset.filter(file_type=file_type)
-        
-        if sync_status:
-            queryset = queryset.filter(sync_status=sync_status)
-        
-        if search:
-            queryset = queryset.filter(file_name__icontains=search)
+        queryset = filter_files(FileMetadata.objects.all(), request.GET)
         
         # Ordering
-        order_by = request.GET.get('order_by', '-created_at')
-        queryset = queryset.order_by(order_by)
-        
-        paginator = Paginator(queryset, per_page)
-        page_obj = paginator.get_page(page)
-        
-        data = [{
-            'id': str(file.id),
-            'deal_id': file.deal.id,
-            'deal_name': file.deal.deal_name,
-            'crm_provider': file.deal.crm_provider.name,
-            'crm_file_id': file.crm_file_id,
-            'file_name': file.file_name,
-            'file_size': file.file_size,
-            'file_size_mb': round(file.file_size / (1024 * 1024), 2),
-            'file_type': file.file_type,
-            'sync_status': file.sync_status,
-            'sync_timestamp': file.sync_timestamp.isoformat() if file.sync_timestamp else None,
-            'created_at': file.created_at.isoformat(),
-        } for file in page_obj]
+        if search and 'order_by' not in request.GET and 'cursor' not in request.GET:
+            # Best matches first
+            queryset = queryset.order_by('search_rank', '-created_at')
+        else:
+            queryset = queryset.order_by(file_ordering(request.GET.get('order_by', '-created_at')))
+        return FILE_PROJECTION.values(queryset, fields), fields
+    
+    @cache_response('files')
+    def get(self, request):
+        per_page = int(request.GET.get('per_page', 20))
         
-        return JsonResponse({
-            'files': data,
-            'pagination': {
-                'total': paginator.count,
-                'pages': paginator.num_pages,
-                'current_page': page,
-                'per_page': per_page,
-                'has_next': page_obj.has_next(),
-                'has_previous': page_obj.has_previous(),
-            }
+        try:
+            rows, fields = self.get_rows(request)
+            page_items, pagination = paginate_queryset(request, rows, per_page)
+        except (InvalidFields, InvalidOrdering, InvalidCursor) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        return render(request, {
+            'files': FILE_PROJECTION.serialize(page_items, fields),
+            'pagination': pagination,
         })
 
+class FilesExportView(View):
+    """Streaming export of file metadata as NDJSON or CSV"""
+    
+    def get(self, request):
+        """Stream every file matching the FilesView filters in one response"""
+        export_format = request.GET.get('format', 'ndjson')
+        compress = request.GET.get('gzip', '').lower() in ('1', 'true')
+        
+        if export_format not in EXPORT_FORMATS:
+            return JsonResponse({'error': f'format must be one of: {", ".join(EXPORT_FORMATS)}'}, status=400)
+        
+        queryset = filter_files(export_queryset(), request.GET)
+        response = StreamingHttpResponse(
+            export_files(queryset, export_format, compress),
+            content_type=EXPORT_FORMATS[export_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="files.{export_format}"'
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        return response
+
 @method_decorator(csrf_exempt, name='dispatch')
 class SyncView(View):
     """API endpoint for file synchronization"""
@@ -159,6 +167,9 @@ class SyncView(View):
             crm_provider_id = data.get('crm_provider_id')
             file_ids = data.get('file_ids', [])  # Optional: specific files to sync
             
+            if data.get('all_providers'):
+                return self._sync_all_providers()
+            
             if not crm_provider_id:
                 return JsonResponse({'error': 'crm_provider_id is required'}, status=400)
             
@@ -187,21 +198,64 @@ class SyncView(View):
                 'message': 'Sync task has been queued',
                 'task_id': task.id
             })
-           
-            
+        
+        
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON in request body'}, status=400)
         except Exception as e:
             logger.error(f"Sync failed: {str(e)}")
             return JsonResponse({'error': str(e)}, status=500)
+    
+    def _sync_all_providers(self):
+        """Queue a full sync for every active provider's accounts as one Celery group"""
+        providers = list(CRMProvider.objects.filter(is_active=True))
+        if not providers:
+            return JsonResponse({'error': 'No active CRM providers'}, status=404)
+        
+        # One task per account, so tenants of the same CRM sync in parallel too
+        accounts = [account for provider in providers for account in CRMAccount.active_for(provider)]
+        result = group(
+            sync_files_task.s(account.crm_provider_id, crm_account_id=account.pk) for account in accounts
+        ).apply_async()
+        return JsonResponse({
+            'message': f'Sync tasks have been queued for {len(accounts)} account(s) of {len(providers)} provider(s)',
+            'group_id': result.id,
+            'task_ids': [task.id for task in result.results],
+        })
+
+@method_decorator(csrf_exempt, name='dispatch')
+class CRMWebhookView(View):
+    """Receives HubSpot and Zoho change notifications and queues targeted syncs"""
+    
+    def post(self, request, provider):
+        """Validate the notification and buffer its deals; the sync runs later, in Celery"""
+        webhook_class = WEBHOOKS.get(provider)
+        if webhook_class is None:
+            return JsonResponse({'error': 'Unsupported CRM provider'}, status=404)
+        
+        try:
+            crm_provider = CRMProvider.objects.get(name__iexact=provider, is_active=True)
+        except CRMProvider.DoesNotExist:
+            return JsonResponse({'error': 'CRM provider not found or inactive'}, status=404)
+        
+        try:
+            deal_ids = webhook_class().parse(request)
+        except PermissionError as e:
+            logger.warning(f"Rejected {provider} webhook: {str(e)}")
+            return JsonResponse({'error': str(e)}, status=401)
+        except InvalidWebhook as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        return JsonResponse({'deals_queued': buffer_deal_events(crm_provider, deal_ids)})
 
 @method_decorator(csrf_exempt, name='dispatch')
 class AvailableFilesView(View):
     """API endpoint to list available files from CRM without syncing"""
     
     def get(self, request):
-        """List all available files from CRM"""
+        """List available files from the provider's CRM snapshot"""
         crm_provider_id = request.GET.get('crm_provider_id')
+        per_page = int(request.GET.get('per_page', 100))
         
         if not crm_provider_id:
             return JsonResponse({'error': 'crm_provider_id is required'}, status=400)
@@ -212,72 +266,105 @@ class AvailableFilesView(View):
             return JsonResponse({'error': 'CRM provider not found or inactive'}, status=404)
         
         try:
-            api_key = settings.CRM_API_KEY 
-            crm_service = CRMServiceFactory.create_service(
-                crm_provider.name.lower(),
-                api_key
-            )
-            
-            if not crm_service:
-                return JsonResponse({'error': 'Unsupported CRM provider'}, status=400)
-            
-            # Authenticate
-            if not crm_service.authenticate():
-                return JsonResponse({'error': 'CRM authentication failed'}, status=401)
-            
-            # Get all deals and their files
-            crm_deals = crm_service.get_deals()
-            all_files = []
-            
-            for deal in crm_deals:
-                crm_files = crm_service.get_files_for_deal(deal.deal_id)
-                for crm_file in crm_files:
-                    # Check if file is already synced
-                    try:
-                        db_deal = Deal.objects.get(
-                            crm_provider=crm_provider,
-                            crm_deal_id=deal.deal_id
-                        )
-                        is_synced = FileMetadata.objects.filter(
-                            deal=db_deal,
-                            crm_file_id=crm_file.file_id
-                        ).exists()
-                    except Deal.DoesNotExist:
-                        is_synced = False
-                    
-                    all_files.append({
-                        'crm_file_id': crm_file.file_id,
-                        'file_name': crm_file.name,
-                        'file_size': crm_file.size,
-                        'file_size_mb': round(crm_file.size / (1024 * 1024), 2),
-                        'file_type': crm_file.file_type,
-                        'deal_id': deal.deal_id,
-                        'deal_name': deal.name,
-                        'is_synced': is_synced
-                    })
-            
-            return JsonResponse({
-                'crm_provider': crm_provider.name,
-                'files': all_files,
-                'total_files': len(all_files)
-            })
-            
+            snapshot = AvailableFilesSnapshot(crm_provider)
+        except ValueError:
+            return JsonResponse({'error': 'Unsupported CRM provider'}, status=400)
+        
+        try:
+            if snapshot.refreshed_at is None or request.GET.get('refresh', '').lower() in ('1', 'true'):
+                # Nothing to serve yet: build the snapshot inline
+                snapshot.refresh()
+            elif snapshot.is_stale():
+                snapshot.refresh_in_background()
+        except PermissionError:
+            return JsonResponse({'error': 'CRM authentication failed'}, status=401)
+        except CRMUnavailable as e:
+            # Serve the snapshot we have, marked stale, while the CRM is down
+            if snapshot.refreshed_at is None:
+                return crm_unavailable_response(e)
         except Exception as e:
             logger.error(f"Error fetching available files: {str(e)}")
             return JsonResponse({'error': str(e)}, status=500)
+        
+        try:
+            page_items, pagination = paginate_queryset(
+                request, self.get_queryset(request, crm_provider), per_page)
+        except InvalidCursor as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        return JsonResponse(self.build_response(crm_provider, snapshot, page_items, pagination))
+    
+    def get_queryset(self, request, crm_provider):
+        """The provider's snapshot rows matching the request's filters"""
+        deal_id = request.GET.get('deal_id')
+        file_type = request.GET.get('file_type')
+        is_synced = request.GET.get('is_synced')
+        search = request.GET.get('search', '')
+        
+        # Sync state for the whole page comes from one correlated EXISTS,
+        # matched within the account the snapshot row was listed from
+        queryset = AvailableFile.objects.filter(crm_provider=crm_provider).annotate(
+            is_synced=Exists(FileMetadata.objects.filter(
+                crm_provider=crm_provider,
+                deal__crm_account_id=OuterRef('crm_account_id'),
+                deal__crm_deal_id=OuterRef('crm_deal_id'),
+                crm_file_id=OuterRef('crm_file_id'),
+            ))
+        )
+        
+        if deal_id:
+            queryset = queryset.filter(crm_deal_id=deal_id)
+        
+        if file_type:
+            queryset = queryset.filter(file_type=file_type)
+        
+        if is_synced:
+            queryset = queryset.filter(is_synced=is_synced.lower() in ('1', 'true'))
+        
+        if search:
+            queryset = queryset.filter(file_name__icontains=search)
+        
+        return queryset.order_by('created_at', 'id')
+    
+    def build_response(self, crm_provider, snapshot, page_items, pagination):
+        all_files = [{
+            'crm_file_id': available.crm_file_id,
+            'file_name': available.file_name,
+            'file_size': available.file_size,
+            'file_size_mb': round(available.file_size / (1024 * 1024), 2),
+            'file_type': available.file_type,
+            'deal_id': available.crm_deal_id,
+            'deal_name': available.deal_name,
+            'is_synced': available.is_synced,
+        } for available in page_items]
+        
+        return {
+            'crm_provider': crm_provider.name,
+            'files': all_files,
+            'total_files': pagination.get('total'),
+            'pagination': pagination,
+            'snapshot': {
+                'refreshed_at': snapshot.refreshed_at.isoformat(),
+                'stale': snapshot.is_stale(),
+            },
+        }
 
 @method_decorator(csrf_exempt, name='dispatch')
 class SyncLogsView(View):
     """API endpoint for sync logs"""
     
-    def get(self, request):
-        """List sync logs"""
+    @staticmethod
+    def projection():
+        return SYNC_LOG_PROJECTION if logs_share_database() else DETACHED_SYNC_LOG_PROJECTION
+    
+    def get_rows(self, request):
+        """Projected log rows matching the request's filters, and the selected fields"""
         crm_provider_id = request.GET.get('crm_provider')
         level = request.GET.get('level')
-        page = int(request.GET.get('page', 1))
-        per_page = int(request.GET.get('per_page', 50))
+        projection = self.projection()
+        fields = projection.select(request.GET.get('fields'))
         
-        queryset = SyncLog.objects.select_related('crm_provider').all()
+        queryset = SyncLog.objects.all()
         
         if crm_provider_id:
             queryset = queryset.filter(crm_provider_id=crm_provider_id)
@@ -286,68 +373,159 @@ class SyncLogsView(View):
             queryset = queryset.filter(level=level)
         
         queryset = queryset.order_by('-created_at')
+        return projection.values(queryset, fields), fields
+    
+    @staticmethod
+    def name_providers(page_items, names):
+        """Replace the provider ids of detached log rows with provider names"""
+        for row in page_items:
+            row['crm_provider_id'] = names.get(row['crm_provider_id'])
+    
+    def provider_names(self, page_items, fields):
+        if self.projection() is SYNC_LOG_PROJECTION or 'crm_provider' not in fields:
+            return
+        provider_ids = {row['crm_provider_id'] for row in page_items}
+        self.name_providers(page_items, dict(
+            CRMProvider.objects.filter(pk__in=provider_ids).values_list('pk', 'name')
+        ))
+    
+    def get(self, request):
+        """List sync logs"""
+        per_page = int(request.GET.get('per_page', 50))
         
-        paginator = Paginator(queryset, per_page)
-        page_obj = paginator.get_page(page)
-        
-        data = [{
-            'id': log.id,
-            'crm_provider': log.crm_provider.name,
-            'level': log.level,
-            'message': log.message,
-            'file_id': str(log.file_metadata.id) if log.file_metadata else None,
-            'created_at': log.created_at.isoformat(),
-        } for log in page_obj]
-        
-        return JsonResponse({
-            'logs': data,
-            'pagination': {
-                'total': paginator.count,
-                'pages': paginator.num_pages,
-                'current_page': page,
-                'per_page': per_page,
-                'has_next': page_obj.has_next(),
-                'has_previous': page_obj.has_previous(),
-            }
+        try:
+            rows, fields = self.get_rows(request)
+            page_items, pagination = paginate_queryset(request, rows, per_page)
+        except (InvalidFields, InvalidCursor) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        self.provider_names(page_items, fields)
+        
+        return render(request, {
+            'logs': self.projection().serialize(page_items, fields),
+            'pagination': pagination,
         })
 
 class StatsView(View):
     """API endpoint for statistics"""
     
+    def get_rows(self, request):
+        """(provider, file_type, sync_status, count, size) rows for build_stats"""
+        crm_provider_id = request.GET.get('crm_provider')
+        
+        if settings.STATS_FROM_TABLE:
+            # Maintained incrementally by the sync engine
+            rows = FileStats.objects.values(
+                'file_type', 'sync_status',
+                provider=F('crm_provider__name'),
+                count=F('file_count'),
+                size=F('total_size'),
+            )
+            if crm_provider_id:
+                rows = rows.filter(crm_provider_id=crm_provider_id)
+        else:
+            # One grouped aggregate instead of a query per status and type
+            files = FileMetadata.objects.all()
+            if crm_provider_id:
+                files = files.filter(crm_provider_id=crm_provider_id)
+            rows = files.values('file_type', 'sync_status', provider=F('crm_provider__name')).annotate(
+                count=Count('id'),
+                size=Sum('file_size'),
+            ).order_by()
+        return rows
+    
+    @cache_response('stats')
     def get(self, request):
         """Get sync statistics"""
+        return JsonResponse(build_stats(self.get_rows(request)))
+
+
+class ChangesView(View):
+    """Feed of the deals and files the sync engine created, updated or deleted"""
+    
+    # entity: (model, projection of the current row)
+    ENTITIES = {
+        'deal': (Deal, DEAL_PROJECTION),
+        'file': (FileMetadata, FILE_PROJECTION),
+    }
+    
+    @staticmethod
+    def parse_since(value) -> int:
+        """Change log id a ?since= cursor points at; 0 reads from the start"""
+        if not value:
+            return 0
+        if not value.isdigit():
+            raise InvalidCursor('Invalid cursor')
+        return int(value)
+    
+    def get_entries(self, request, since: int):
+        """Change log rows after since, oldest first"""
         crm_provider_id = request.GET.get('crm_provider')
         
-        base_files = FileMetadata.objects.select_related('deal__crm_provider')
+        queryset = ChangeLogEntry.objects.filter(pk__gt=since)
         
         if crm_provider_id:
-            base_files = base_files.filter(deal__crm_provider_id=crm_provider_id)
-        
-        stats = {
-            'total_files': base_files.count(),
-            'synced_files': base_files.filter(sync_status='synced').count(),
-            'failed_files': base_files.filter(sync_status='failed').count(),
-            'pending_files': base_files.filter(sync_status='pending').count(),
-            'total_size_bytes': sum(base_files.values_list('file_size', flat=True)),
-            'files_by_type': {},
-            'files_by_crm': {},
-        }
-        
-        # Calculate total size in MB
-        stats['total_size_mb'] = round(stats['total_size_bytes'] / (1024 * 1024), 2)
+            queryset = queryset.filter(crm_provider_id=crm_provider_id)
         
-        # Files by type
-        for choice in FileMetadata.FILE_TYPES:
-            file_type = choice[0]
-            count = base_files.filter(file_type=file_type).count()
-            if count > 0:
-                stats['files_by_type'][file_type] = count
+        return CHANGE_PROJECTION.values(queryset.order_by('pk'), list(CHANGE_PROJECTION.fields))
+    
+    def missed_deletions(self, request, since: int) -> bool:
+        """True when compaction dropped delete entries after since"""
+        if not since:
+            # Reading from the start replays every object's latest state
+            return False
+        providers = CRMProvider.objects.all()
+        if request.GET.get('crm_provider'):
+            providers = providers.filter(pk=request.GET['crm_provider'])
+        horizon = providers.aggregate(horizon=Max('change_log_horizon'))['horizon']
+        return since < (horizon or 0)
+    
+    def current_rows(self, page_items):
+        """Current fields of the page's created and updated rows, one query per entity"""
+        rows = {}
+        for entity, (model, projection) in self.ENTITIES.items():
+            object_ids = {row['object_id'] for row in page_items
+                          if row['entity'] == entity and row['action'] != 'deleted'}
+            if not object_ids:
+                continue
+            fields = list(projection.fields)
+            found = projection.values(model.objects.filter(pk__in=object_ids).order_by(), fields)
+            for data in projection.serialize(found, fields):
+                rows[entity, str(data['id'])] = data
+        return rows
+    
+    def get(self, request):
+        """Changes after ?since=, with the current fields of each changed row"""
+        try:
+            per_page = max(1, min(int(request.GET.get('per_page', 100)), MAX_CHANGES_PER_PAGE))
+        except ValueError:
+            return JsonResponse({'error': 'per_page must be an integer'}, status=400)
+        crm_provider_id = request.GET.get('crm_provider')
         
-        # Files by CRM provider
-        crm_stats = base_files.values('deal__crm_provider__name').annotate(
-            count=Count('id')
-        )
-        for stat in crm_stats:
-            stats['files_by_crm'][stat['deal__crm_provider__name']] = stat['count']
+        if crm_provider_id and not crm_provider_id.isdigit():
+            return JsonResponse({'error': 'crm_provider must be an id'}, status=400)
+        try:
+            since = self.parse_since(request.GET.get('since'))
+        except InvalidCursor as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
-        return JsonResponse(stats)
+        if self.missed_deletions(request, since):
+            return JsonResponse({
+                'error': 'Cursor predates compacted deletions; read again from since=0',
+            }, status=410)
+        
+        # One extra row tells us whether more changes are waiting
+        page_items = list(self.get_entries(request, since)[:per_page + 1])
+        has_more = len(page_items) > per_page
+        page_items = page_items[:per_page]
+        rows = self.current_rows(page_items)
+        
+        changes = CHANGE_PROJECTION.serialize(page_items, list(CHANGE_PROJECTION.fields))
+        for change in changes:
+            change['data'] = rows.get((change['entity'], change['object_id']))
+        
+        return render(request, {
+            'changes': changes,
+            # Poll with this even when nothing changed
+            'next_cursor': str(page_items[-1]['pk']) if page_items else str(since),
+            'has_more': has_more,
+        })